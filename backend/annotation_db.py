@@ -0,0 +1,118 @@
+"""
+Read-only indexed stores for gene_db.json and transcript_db.json.
+
+Compile the JSON files once:
+    python -m backend.annotation_db data/
+
+This writes data/gene_db.sqlite and data/transcript_db.sqlite, each a
+key -> JSON record table with a primary-key index. Lookups decode only the
+requested record, and the files are opened immutable and memory-mapped so
+every Streamlit session, process and replica shares the same OS pages
+instead of holding its own parsed copy.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+DATABASES = ("gene_db", "transcript_db")
+MMAP_SIZE = 1 << 30
+
+
+def compile_json_db(json_path: Union[str, Path], db_path: Union[str, Path]) -> int:
+    """Compile a JSON object of {key: record} into an indexed SQLite file; returns the record count."""
+    json_path, db_path = Path(json_path), Path(db_path)
+    with open(json_path, "r") as file:
+        records = json.load(file)
+
+    # A private temporary file per compile, so concurrent compiles never touch each other's file.
+    fd, tmp_name = tempfile.mkstemp(dir=db_path.parent, prefix=db_path.name + ".", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    tmp_path.chmod(0o644)  # mkstemp makes it owner-only; other processes read the compiled file
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute("CREATE TABLE records (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+        conn.executemany(
+            "INSERT INTO records (key, value) VALUES (?, ?)",
+            ((str(key), json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+             for key, value in records.items())
+        )
+        conn.commit()
+        conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    conn.close()
+    # Readers never see a half-written file.
+    os.replace(tmp_path, db_path)
+    return len(records)
+
+
+class AnnotationStore:
+    """Read-only lookup of JSON records by key in a compiled SQLite file."""
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"{self.db_path} not found, compile it with `python -m backend.annotation_db`")
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default=None) -> Optional[Dict]:
+        row = self._connection().execute("SELECT value FROM records WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def __getitem__(self, key: str) -> Dict:
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __contains__(self, key: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM records WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate over every (key, record); for building derived indexes."""
+        for key, value in self._connection().execute("SELECT key, value FROM records"):
+            yield key, json.loads(value)
+
+
+def open_annotation_store(data_dir: Union[str, Path], name: str) -> AnnotationStore:
+    """Open data_dir/<name>.sqlite, compiling it from <name>.json first if it is missing or stale."""
+    data_dir = Path(data_dir)
+    json_path = data_dir / f"{name}.json"
+    db_path = data_dir / f"{name}.sqlite"
+    if json_path.exists() and (not db_path.exists() or db_path.stat().st_mtime < json_path.stat().st_mtime):
+        compile_json_db(json_path, db_path)
+    return AnnotationStore(db_path)
+
+
+def main():
+    data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parent.parent / "data"
+    for name in DATABASES:
+        json_path = data_dir / f"{name}.json"
+        if not json_path.exists():
+            print(f"Skipping {name}: {json_path} not found")
+            continue
+        count = compile_json_db(json_path, data_dir / f"{name}.sqlite")
+        print(f"Compiled {count} records from {json_path} into {data_dir / f'{name}.sqlite'}")
+
+
+if __name__ == "__main__":
+    main()
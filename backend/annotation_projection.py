@@ -0,0 +1,160 @@
+"""
+Prune variant annotations to the fields a prompt uses and serialise them compactly.
+
+The annotation service returns every transcript consequence with all of its
+fields. The prompts only reason about the picked consequence, population
+frequencies, in-silico predictions, the consequence terms and HGVS, so
+`serialize_annotation(annotation, "acmg")` keeps just those and dumps them
+without indentation. Schemas are plain dicts in SCHEMAS and can be extended
+per template.
+"""
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Union
+
+# Fields of the variant itself.
+VARIANT_FIELDS = [
+    "input", "id", "assembly_name", "seq_region_name", "start", "end",
+    "allele_string", "variant_class", "most_severe_consequence",
+]
+# Fields of a transcript consequence.
+CONSEQUENCE_FIELDS = [
+    "gene_id", "gene_symbol", "transcript_id", "biotype", "strand", "canonical", "mane_select",
+    "consequence_terms", "impact", "hgvsc", "hgvsp", "hgvsg", "exon", "intron",
+    "cdna_position", "cds_position", "protein_start", "protein_end", "amino_acids", "codons",
+]
+# Known colocated variants: dbSNP/ClinVar ids and significance, and frequencies.
+COLOCATED_FIELDS = ["id", "allele_string", "clin_sig", "clin_sig_allele", "frequencies"]
+# Plugin and custom fields are matched by (lowercase) prefix.
+FREQUENCY_PREFIXES = ["gnomad", "exac", "topmed", "1kg", "af", "max_af", "minor_allele"]
+SCORE_PREFIXES = [
+    "sift", "polyphen", "cadd", "revel", "spliceai", "ada_", "rf_", "dbscsnv", "alphamissense",
+    "primateai", "bayesdel", "metarnn", "clinpred", "mutationtaster", "phylop", "gerp", "phastcons",
+]
+LOF_PREFIXES = ["lof", "nmd", "loftee"]
+
+SCHEMAS = {
+    "acmg": {
+        "variant_fields": VARIANT_FIELDS,
+        "consequence_fields": CONSEQUENCE_FIELDS,
+        "consequence_prefixes": FREQUENCY_PREFIXES + SCORE_PREFIXES + LOF_PREFIXES,
+        "colocated_fields": COLOCATED_FIELDS,
+    },
+    "pvs1": {
+        "variant_fields": VARIANT_FIELDS,
+        "consequence_fields": CONSEQUENCE_FIELDS,
+        "consequence_prefixes": FREQUENCY_PREFIXES + LOF_PREFIXES + ["spliceai", "ada_", "rf_", "dbscsnv"],
+        "colocated_fields": ["id", "clin_sig", "frequencies"],
+    },
+}
+
+# Consequence terms of each class the ACMG prompt composer prunes for.
+CONSEQUENCE_CLASSES = {
+    "null": {"transcript_ablation", "stop_gained", "frameshift_variant", "splice_donor_variant",
+             "splice_acceptor_variant", "start_lost"},
+    "inframe": {"inframe_insertion", "inframe_deletion", "stop_lost"},
+    "missense": {"missense_variant"},
+    "synonymous": {"synonymous_variant", "stop_retained_variant", "start_retained_variant"},
+}
+
+
+def pick_consequence(consequences: List[Dict]) -> Optional[Dict]:
+    """The consequence flagged `pick`, else the MANE/canonical one, else the first."""
+    if not consequences:
+        return None
+    for flag in ("pick", "mane_select", "canonical"):
+        for consequence in consequences:
+            if consequence.get(flag) not in (None, 0, "", False):
+                return consequence
+    return consequences[0]
+
+
+def consequence_class(annotation: Dict) -> str:
+    """
+    "null", "inframe", "missense" or "synonymous" when the picked consequence
+    falls in exactly one class of CONSEQUENCE_CLASSES and is not near a splice
+    site; "other" otherwise, e.g. missense_variant with splice_region_variant.
+    """
+    picked = pick_consequence(annotation.get("transcript_consequences") or [])
+    terms = set((picked or {}).get("consequence_terms") or [annotation.get("most_severe_consequence")])
+    classes = [name for name, class_terms in CONSEQUENCE_CLASSES.items() if terms & class_terms]
+    if len(classes) != 1:
+        return "other"
+    if classes[0] != "null" and any("splice" in str(term) for term in terms):
+        return "other"
+    return classes[0]
+
+
+def inheritance_mode(annotation: Dict) -> Optional[str]:
+    """
+    "dominant" or "recessive" when every autosomal inheritance mode given in
+    the annotation (fields named like "inheritance" or "moi", on the variant
+    or the picked consequence) agrees; None when absent, mixed or X-linked.
+    """
+    records = [annotation, pick_consequence(annotation.get("transcript_consequences") or []) or {}]
+    values = []
+    for record in records:
+        for key, value in record.items():
+            if "inheritance" in key.lower() or key.lower() == "moi":
+                values.extend(value if isinstance(value, list) else re.split(r"[;,&|/]", str(value)))
+    modes = set()
+    for value in values:
+        value = str(value).strip().lower()
+        if not value:
+            continue
+        if value == "ad" or ("dominant" in value and "x-linked" not in value):
+            modes.add("dominant")
+        elif value == "ar" or ("recessive" in value and "x-linked" not in value):
+            modes.add("recessive")
+        else:
+            modes.add("other")
+    return modes.pop() if len(modes) == 1 and "other" not in modes else None
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _select(record: Dict, fields: Iterable[str], prefixes: Iterable[str] = ()) -> Dict:
+    fields = set(fields)
+    prefixes = tuple(prefixes)
+    return {
+        key: value for key, value in record.items()
+        if not _is_empty(value) and (key in fields or key.lower().startswith(prefixes))
+    }
+
+
+def project_annotation(annotation: Dict, schema: Union[str, Dict] = "acmg") -> Dict:
+    """Copy of `annotation` reduced to the fields of `schema` and the picked consequence."""
+    if isinstance(schema, str):
+        schema = SCHEMAS[schema]
+    projected = _select(annotation, schema["variant_fields"], schema.get("variant_prefixes", ()))
+
+    picked = pick_consequence(annotation.get("transcript_consequences") or [])
+    if picked is not None:
+        projected["transcript_consequence"] = _select(
+            picked, schema["consequence_fields"], schema.get("consequence_prefixes", ())
+        )
+    elif annotation.get("intergenic_consequences"):
+        projected["intergenic_consequence"] = _select(
+            annotation["intergenic_consequences"][0], schema["consequence_fields"]
+        )
+
+    colocated = [
+        _select(variant, schema["colocated_fields"])
+        for variant in annotation.get("colocated_variants") or []
+    ]
+    colocated = [variant for variant in colocated if set(variant) - {"allele_string"}]
+    if colocated:
+        projected["colocated_variants"] = colocated
+    return projected
+
+
+def compact_json(data) -> str:
+    """JSON without indentation or separator padding."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def serialize_annotation(annotation: Dict, schema: Union[str, Dict] = "acmg") -> str:
+    """Projected annotation as compact JSON, ready for a prompt."""
+    return compact_json(project_annotation(annotation, schema))
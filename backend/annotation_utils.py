@@ -0,0 +1,271 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ANNOTATION_API_URL = os.environ.get("ANNOTATION_API_URL", "http://localhost:5001/annotate")
+ANNOTATION_BATCH_URL = os.environ.get("ANNOTATION_BATCH_URL", ANNOTATION_API_URL + "_batch")
+ANNOTATION_CACHE_PATH = Path(os.environ.get(
+    "ANNOTATION_CACHE_PATH",
+    Path(__file__).resolve().parent.parent / "data/cache/annotations.sqlite"
+))
+
+_VARIANT_RE = re.compile(r"^(?:chr)?([0-9XYMT]+)[-:_\s]+(\d+)[-:_\s]+([ACGTN]+)[-:_>\s]+([ACGTN]+)$", re.IGNORECASE)
+
+
+def normalize_variant(position: str) -> str:
+    """Canonical chr-bp-ref-alt form, e.g. "17:43045712 g>a" -> "chr17-43045712-G-A"."""
+    match = _VARIANT_RE.match(position.strip())
+    if match is None:
+        raise ValueError(f"Invalid variant {position!r}, expected chr-bp-ref-alt")
+    chrom, pos, ref, alt = match.groups()
+    chrom = chrom.upper()
+    return f"chr{'M' if chrom == 'MT' else chrom}-{int(pos)}-{ref.upper()}-{alt.upper()}"
+
+
+class AnnotationCache:
+    """On-disk cache of annotation results keyed by genome version and normalised variant."""
+
+    def __init__(self, path: Union[str, Path], max_age_seconds: float = 90 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS annotations (
+                genome_version TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (genome_version, variant)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, genome_version: str, variants: List[str]) -> Dict[str, str]:
+        """Cached result JSON of each variant that has a fresh entry."""
+        found = {}
+        oldest = time.time() - self.max_age_seconds
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for i in range(0, len(variants), 500):
+                chunk = variants[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT variant, result FROM annotations WHERE genome_version = ? AND created_at >= ? "
+                    f"AND variant IN ({','.join('?' * len(chunk))})",
+                    (genome_version, oldest, *chunk)
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, genome_version: str, results: Dict[str, str]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO annotations (genome_version, variant, result, created_at) VALUES (?, ?, ?, ?)",
+                ((genome_version, variant, result, now) for variant, result in results.items())
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM annotations")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+
+class AnnotationClient:
+    """
+    Client of the variant annotation API.
+
+    Requests share a keep-alive connection pool and have connect/read
+    timeouts. `annotate_many` deduplicates the variants, answers what it can
+    from an in-memory LRU and the on-disk cache, and sends the rest in
+    batches of `batch_size` to the batch endpoint. When the service has no
+    batch endpoint it falls back to concurrent single-variant requests.
+    Variants are normalised only for deduplication and the caches; the
+    service receives them as they were given.
+    """
+
+    def __init__(self,
+                 url: str = ANNOTATION_API_URL,
+                 batch_url: Optional[str] = ANNOTATION_BATCH_URL,
+                 timeout: Tuple[float, float] = (5.0, 60.0),
+                 batch_size: int = 50,
+                 max_workers: int = 8,
+                 memory_size: int = 2048,
+                 cache: Optional[AnnotationCache] = None):
+        self.url = url
+        self.batch_url = batch_url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.memory_size = memory_size
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def annotate(self, genome_version: str, position: str) -> Dict:
+        """Annotation of one variant; raises requests.exceptions.RequestException or ValueError on failure."""
+        results, errors = self.annotate_many(genome_version, [position])
+        if errors:
+            raise next(iter(errors.values()))
+        return next(iter(results.values()))
+
+    def annotate_many(self, genome_version: str, positions: Iterable[str]) -> Tuple[Dict[str, Dict], Dict[str, Exception]]:
+        """
+        Annotate many variants. Returns (results, errors), both keyed by the
+        positions as given, so one bad variant does not fail the others.
+        """
+        results, errors = {}, {}
+        variants = {}
+        for position in positions:
+            try:
+                variants.setdefault(normalize_variant(position), []).append(position)
+            except ValueError as e:
+                errors[position] = e
+
+        found = self._from_memory(genome_version, variants)
+        missing = [variant for variant in variants if variant not in found]
+        if missing and self.cache is not None:
+            cached = {variant: json.loads(result)
+                      for variant, result in self.cache.get_many(genome_version, missing).items()}
+            self._remember(genome_version, cached)
+            found.update(cached)
+            missing = [variant for variant in missing if variant not in cached]
+
+        if missing:
+            # Sent in the first form given, as the service has always received them.
+            fetched, failed = self._fetch(
+                genome_version, {variant: variants[variant][0].strip() for variant in missing}
+            )
+            self._remember(genome_version, fetched)
+            if self.cache is not None and fetched:
+                self.cache.put_many(genome_version, {
+                    variant: json.dumps(annotation, ensure_ascii=False, separators=(",", ":"))
+                    for variant, annotation in fetched.items()
+                })
+            found.update(fetched)
+            for variant, error in failed.items():
+                for position in variants[variant]:
+                    errors[position] = error
+
+        for variant, annotation in found.items():
+            for position in variants[variant]:
+                results[position] = annotation
+        return results, errors
+
+    def _from_memory(self, genome_version: str, variants: Iterable[str]) -> Dict[str, Dict]:
+        found = {}
+        with self._lock:
+            for variant in variants:
+                key = (genome_version, variant)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[variant] = self._memory[key]
+        return found
+
+    def _remember(self, genome_version: str, annotations: Dict[str, Dict]):
+        with self._lock:
+            for variant, annotation in annotations.items():
+                self._memory[(genome_version, variant)] = annotation
+                self._memory.move_to_end((genome_version, variant))
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _fetch(self, genome_version: str, variants: Dict[str, str]) -> Tuple[Dict[str, Dict], Dict[str, Exception]]:
+        """Fetch {normalised variant: position to send}; results and errors are keyed by the normalised variant."""
+        items = list(variants.items())
+        batches = [dict(items[i:i + self.batch_size]) for i in range(0, len(items), self.batch_size)]
+        fetched, failed = {}, {}
+        with ThreadPoolExecutor(min(self.max_workers, len(batches))) as executor:
+            for batch_fetched, batch_failed in executor.map(lambda batch: self._fetch_batch(genome_version, batch), batches):
+                fetched.update(batch_fetched)
+                failed.update(batch_failed)
+        return fetched, failed
+
+    def _fetch_batch(self, genome_version: str, variants: Dict[str, str]) -> Tuple[Dict[str, Dict], Dict[str, Exception]]:
+        if self.batch_url and len(variants) > 1:
+            try:
+                response = self.session.post(
+                    self.batch_url,
+                    json={"genome_version": genome_version, "positions": list(variants.values())},
+                    timeout=self.timeout
+                )
+                if response.status_code in (404, 405):
+                    self.batch_url = None  # the service only has the single-variant endpoint
+                else:
+                    response.raise_for_status()
+                    results = response.json()["results"]
+                    fetched = {variant: _decode_result(results[position])
+                               for variant, position in variants.items() if position in results}
+                    failed = {variant: ValueError(f"No annotation returned for {variant}")
+                              for variant in variants if variant not in fetched}
+                    return fetched, failed
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                return {}, {variant: e for variant in variants}
+
+        fetched, failed = {}, {}
+        with ThreadPoolExecutor(min(self.max_workers, len(variants))) as executor:
+            outcomes = executor.map(lambda position: self._fetch_one(genome_version, position), variants.values())
+            for variant, outcome in zip(variants, outcomes):
+                if isinstance(outcome, Exception):
+                    failed[variant] = outcome
+                else:
+                    fetched[variant] = outcome
+        return fetched, failed
+
+    def _fetch_one(self, genome_version: str, position: str) -> Union[Dict, Exception]:
+        """Annotation of one variant, or the exception instead of raising it."""
+        try:
+            response = self.session.post(
+                self.url,
+                json={"genome_version": genome_version, "position": position},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return _decode_result(response.json()["result"])
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            return e
+
+
+def _decode_result(result) -> Dict:
+    # The single-variant endpoint returns the annotation as a JSON string.
+    return json.loads(result) if isinstance(result, str) else result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_annotation_client() -> AnnotationClient:
+    """Process-wide annotation client with the on-disk cache (disabled by ANNOTATION_CACHE_DISABLED)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = None if os.environ.get("ANNOTATION_CACHE_DISABLED") else AnnotationCache(ANNOTATION_CACHE_PATH)
+            _client = AnnotationClient(cache=cache)
+        return _client
+
+
+def get_variant_annotation(genome_version, position):
+    """Query the annotation API; raises requests.exceptions.RequestException or ValueError on failure."""
+    return get_annotation_client().annotate(genome_version, position)
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+class ArticleCache:
+    """
+    On-disk cache of PMC articles keyed by PMCID.
+
+    Both the raw HTML and the parsed article data are stored, the latter tagged
+    with the parser version that produced it so a parser change only costs a
+    re-parse of the cached HTML, not a new download. Entries expire after
+    `ttl_seconds` and the least recently used ones are evicted once the stored
+    payloads exceed `max_bytes`.
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: float = 30 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                pmcid TEXT PRIMARY KEY,
+                html BLOB,
+                article_data BLOB,
+                parser_version INTEGER,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_accessed ON articles (accessed_at)")
+        self._conn.commit()
+
+    def lookup(self, pmcid: str, parser_version: int) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Return (html, article_data) for a PMCID.
+
+        article_data is None when it was produced by a different parser version,
+        in which case the cached HTML can be re-parsed. Both are None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT html, article_data, parser_version, created_at FROM articles WHERE pmcid = ?",
+                (pmcid,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            html_blob, data_blob, cached_version, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM articles WHERE pmcid = ?", (pmcid,))
+                self._conn.commit()
+                return None, None
+            self._conn.execute("UPDATE articles SET accessed_at = ? WHERE pmcid = ?", (now, pmcid))
+            self._conn.commit()
+
+        if data_blob is not None and cached_version == parser_version:
+            return None, json.loads(zlib.decompress(data_blob))
+        html = zlib.decompress(html_blob).decode("utf-8") if html_blob is not None else None
+        return html, None
+
+    def put(self, pmcid: str, html: Optional[str], article_data: Optional[Dict] = None,
+            parser_version: Optional[int] = None):
+        """Store the HTML and/or parsed data of an article, then enforce the size bound."""
+        now = time.time()
+        html_blob = zlib.compress(html.encode("utf-8"), 1) if html is not None else None
+        data_blob = None
+        if article_data is not None:
+            data_blob = zlib.compress(json.dumps(article_data, ensure_ascii=False).encode("utf-8"), 1)
+        size = len(html_blob or b"") + len(data_blob or b"")
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO articles (pmcid, html, article_data, parser_version, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(pmcid) DO UPDATE SET
+                    html = COALESCE(excluded.html, articles.html),
+                    article_data = excluded.article_data,
+                    parser_version = excluded.parser_version,
+                    size = LENGTH(COALESCE(excluded.html, articles.html, X''))
+                         + LENGTH(COALESCE(excluded.article_data, X'')),
+                    created_at = excluded.created_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (pmcid, html_blob, data_blob, parser_version, size, now, now)
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries and trim the cache to `max_bytes`."""
+        with self._lock:
+            self._evict_locked(time.time())
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached article."""
+        with self._lock:
+            self._conn.execute("DELETE FROM articles")
+            self._conn.commit()
+
+    def _evict_locked(self, now: float):
+        self._conn.execute("DELETE FROM articles WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM articles").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for pmcid, size in self._conn.execute("SELECT pmcid, size FROM articles ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((pmcid,))
+            total -= size
+        self._conn.executemany("DELETE FROM articles WHERE pmcid = ?", evicted)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
@@ -0,0 +1,287 @@
+import re
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_FEATURES = 'lxml'
+except ImportError:
+    DEFAULT_FEATURES = 'html.parser'
+
+PMID_HREF = re.compile(r'pubmed\.ncbi\.nlm\.nih\.gov/\d+')
+SECTION_ID = re.compile(r'^sec\d+')
+SECTION_HEADINGS = ('h2', 'h3', 'h4', 'h5')
+TABLE_HEADINGS = ('h3', 'h4')
+FIGURE_HEADINGS = ('h3', 'h4', 'h5')
+ACK_HEADINGS = ('h2', 'h3')
+
+
+def parse_article_html(html: str, pmcid: str, features: Optional[str] = None) -> Dict:
+    """
+    Parse a PMC article page into article data in a single traversal.
+
+    Produces the same article_data as PubMedExtractor.parse_html_legacy, but
+    every anchor (title, abstract, sections, tables, figures, references,
+    acknowledgments) is located in one walk over the tree and sections are
+    read in place instead of being serialized and re-parsed.
+    """
+    soup = BeautifulSoup(html, features or DEFAULT_FEATURES)
+    return _ArticleWalker().run(soup, pmcid)
+
+
+def table_to_markdown(table_elem) -> str:
+    """Convert HTML table to Markdown format."""
+    rows = []
+    header_row = []
+
+    # Extract headers
+    thead = table_elem.find('thead')
+    if thead:
+        header_row = [cell.get_text(strip=True) for cell in thead.find_all('td')]
+
+    # Extract body rows
+    tbody = table_elem.find('tbody')
+    if tbody:
+        for tr in tbody.find_all('tr'):
+            row = [cell.get_text(strip=True) for cell in tr.find_all('td')]
+            rows.append(row)
+
+    # Determine max width of each column
+    col_widths = [max(len(str(cell)) for cell in column)
+                  for column in zip(header_row, *rows)]
+
+    # Create Markdown table
+    md_lines = []
+
+    # Header row
+    if header_row:
+        header_line = "| " + " | ".join(
+            f"{header:{width}}" for header, width in zip(header_row, col_widths)
+        ) + " |"
+        md_lines.append(header_line)
+
+        # Separator line
+        separator_line = "| " + " | ".join(
+            "-" * width for width in col_widths
+        ) + " |"
+        md_lines.append(separator_line)
+
+    # Data rows
+    for row in rows:
+        row_line = "| " + " | ".join(
+            f"{str(cell):{width}}" for cell, width in zip(row, col_widths)
+        ) + " |"
+        md_lines.append(row_line)
+
+    return "\n".join(md_lines)
+
+
+class _Scope:
+    """An open element whose first matching descendants are still being looked for."""
+    __slots__ = ('tag', 'heading', 'caption', 'table', 'items')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.heading = None
+        self.caption = None
+        self.table = None
+        self.items = []
+
+
+class _ArticleWalker:
+    def __init__(self):
+        self.pmid_link = None
+        self.hgroup = None
+        self.abstract = None
+        self.keywords = None
+        self.ref_list = None
+        self.ack = None
+        self.sections: List[_Scope] = []
+        self.tables: List[_Scope] = []
+        self.figures: List[_Scope] = []
+        self._open_abstract: List[_Scope] = []
+        self._open_ref_list: List[_Scope] = []
+        self._open_ack: List[_Scope] = []
+        self._open_sections: List[_Scope] = []
+        self._open_tables: List[_Scope] = []
+        self._open_figures: List[_Scope] = []
+
+    def run(self, soup, pmcid):
+        self._walk(soup)
+
+        # Texts are read in the same order as the legacy parser because the
+        # abstract and acknowledgments headings are removed from the tree.
+        article_data = {
+            "pmcid": pmcid,
+            "pmid": self.pmid_link.text.strip() if self.pmid_link else "",
+            "title": self.hgroup.text.strip() if self.hgroup else "",
+            "abstract": self._abstract_text(),
+            "keywords": self._keywords_text(),
+            "sections": self._section_records(),
+            "figures": self._figure_records(),
+            "tables": self._table_records(),
+            "references": self._reference_texts(),
+            "acknowledgments": self._ack_text(),
+        }
+        return article_data
+
+    def _walk(self, parent):
+        for child in parent.contents:
+            if isinstance(child, Tag):
+                self._visit(child)
+
+    def _visit(self, tag):
+        name = tag.name
+        classes = tag.get('class') or ()
+        pushed = []
+
+        if name == 'section':
+            if self.abstract is None and 'abstract' in classes:
+                self.abstract = _Scope(tag)
+                pushed.append((self._open_abstract, self.abstract))
+            if self.keywords is None and 'kwd-group' in classes:
+                self.keywords = tag
+            if self.ref_list is None and 'ref-list' in classes:
+                self.ref_list = _Scope(tag)
+                pushed.append((self._open_ref_list, self.ref_list))
+            if self.ack is None and 'ack' in classes:
+                self.ack = _Scope(tag)
+                pushed.append((self._open_ack, self.ack))
+            section_id = tag.get('id')
+            if section_id is not None and SECTION_ID.search(section_id):
+                scope = _Scope(tag)
+                self.sections.append(scope)
+                pushed.append((self._open_sections, scope))
+            if 'tw' in classes:
+                scope = _Scope(tag)
+                self.tables.append(scope)
+                pushed.append((self._open_tables, scope))
+        elif name == 'figure':
+            if 'fig' in classes:
+                scope = _Scope(tag)
+                self.figures.append(scope)
+                pushed.append((self._open_figures, scope))
+        elif name == 'a':
+            if self.pmid_link is None:
+                href = tag.get('href')
+                if href is not None and PMID_HREF.search(href):
+                    self.pmid_link = tag
+        elif name == 'hgroup':
+            if self.hgroup is None:
+                self.hgroup = tag
+        elif name == 'p':
+            for scope in self._open_sections:
+                scope.items.append(tag)
+        elif name == 'li':
+            if self._open_ref_list:
+                self.ref_list.items.append(tag)
+        elif name == 'figcaption':
+            for scope in self._open_figures:
+                if scope.caption is None:
+                    scope.caption = tag
+        elif name == 'div':
+            if 'caption' in classes:
+                for scope in self._open_tables:
+                    if scope.caption is None:
+                        scope.caption = tag
+        elif name == 'table':
+            if 'content' in classes:
+                for scope in self._open_tables:
+                    if scope.table is None:
+                        scope.table = tag
+        elif name in SECTION_HEADINGS:
+            self._match_heading(tag, name, classes)
+
+        # Scopes only become open for their descendants, never for the tag itself.
+        for stack, scope in pushed:
+            stack.append(scope)
+        self._walk(tag)
+        for stack, _ in pushed:
+            stack.pop()
+
+    def _match_heading(self, tag, name, classes):
+        if name == 'h2' and self._open_abstract and self.abstract.heading is None:
+            self.abstract.heading = tag
+        if 'pmc_sec_title' in classes:
+            for scope in self._open_sections:
+                if scope.heading is None:
+                    scope.heading = tag
+            if name in ACK_HEADINGS and self._open_ack and self.ack.heading is None:
+                self.ack.heading = tag
+        if 'obj_head' in classes:
+            if name in TABLE_HEADINGS:
+                for scope in self._open_tables:
+                    if scope.heading is None:
+                        scope.heading = tag
+            if name in FIGURE_HEADINGS:
+                for scope in self._open_figures:
+                    if scope.heading is None:
+                        scope.heading = tag
+
+    def _abstract_text(self):
+        if self.abstract is None:
+            return ""
+        # Remove the "Abstract" heading
+        if self.abstract.heading is not None:
+            self.abstract.heading.decompose()
+        return self.abstract.tag.get_text(strip=True)
+
+    def _keywords_text(self):
+        if self.keywords is None:
+            return ""
+        return self.keywords.get_text(strip=True).replace("Keywords:", "").strip()
+
+    def _section_records(self):
+        sections = []
+        paragraph_texts = {}
+        for scope in self.sections:
+            title = scope.heading.text.strip() if scope.heading is not None else ""
+            texts = []
+            for p in scope.items:
+                key = id(p)
+                if key not in paragraph_texts:
+                    paragraph_texts[key] = p.get_text(strip=True)
+                texts.append(paragraph_texts[key])
+            content = "\n".join(texts)
+            if title or content:
+                sections.append({
+                    "title": title,
+                    "content": content
+                })
+        return sections
+
+    def _table_records(self):
+        tables = []
+        for scope in self.tables:
+            if scope.table is None:
+                continue
+            tables.append({
+                "title": scope.heading.get_text(strip=True) if scope.heading is not None else "",
+                "caption": scope.caption.get_text(strip=True) if scope.caption is not None else "",
+                "markdown": table_to_markdown(scope.table)
+            })
+        return tables
+
+    def _figure_records(self):
+        figures = []
+        for scope in self.figures:
+            figures.append({
+                "id": scope.tag.get('id', ''),
+                "title": scope.heading.text.strip() if scope.heading is not None else "",
+                "caption": scope.caption.get_text(strip=True) if scope.caption is not None else ""
+            })
+        return figures
+
+    def _reference_texts(self):
+        if self.ref_list is None:
+            return []
+        return [' '.join(li.get_text(strip=True).split()) for li in self.ref_list.items]
+
+    def _ack_text(self):
+        if self.ack is None:
+            return ""
+        if self.ack.heading is not None:
+            self.ack.heading.decompose()  # Remove heading from content
+        return self.ack.tag.get_text(strip=True)
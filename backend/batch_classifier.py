@@ -0,0 +1,305 @@
+"""
+Headless batch ACMG classification of the variants in a VCF or TSV file.
+
+Usage:
+    python -m backend.batch_classifier variants.vcf --output results.jsonl \
+        --genome-version hg38 --model claude --template Kavin
+
+Annotations are fetched in batches of `--annotation-batch-size` variants with
+`--annotation-workers` parallel requests (and served from the annotation
+cache on reruns), and the LLM calls run on `--llm-workers` threads. Each result is appended to the
+output (JSONL, or TSV when the file name ends in .tsv) as soon as it is done.
+The output doubles as the checkpoint: rerunning the same command skips the
+variants that already have a successful result, so a crashed run resumes
+without calling the LLM again for them.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Set
+
+from dotenv import load_dotenv
+
+from backend.annotation_projection import consequence_class, inheritance_mode, serialize_annotation
+from backend.annotation_utils import get_annotation_client
+from backend.llm_utils import extract_classification, run_prompt
+from backend.prompts import ACMG_CLASSIFIER_TEMPLATE, ACMG_CLASSIFIER_COMPLETE_TEMPLATE, compose_acmg_classifier_template
+
+PROMPT_TEMPLATES = {
+    "Ben": ACMG_CLASSIFIER_TEMPLATE,
+    "Kavin": ACMG_CLASSIFIER_COMPLETE_TEMPLATE,
+}
+OUTPUT_FIELDS = ["genome_version", "variant", "model", "template", "status", "classification", "response", "error"]
+
+root_path = Path(__file__).resolve().parent.parent
+
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def read_variants(path: Path) -> List[str]:
+    """
+    Read chr-bp-ref-alt variants from a VCF (multi-allelic sites split) or a TSV.
+    Malformed rows are passed on as they are, so the run records them as
+    failed variants instead of stopping.
+    """
+    with _open_text(path) as handle:
+        first_line = handle.readline()
+        handle.seek(0)
+        if first_line.startswith("##fileformat=VCF") or ".vcf" in path.name:
+            variants = list(_read_vcf(handle))
+        else:
+            variants = list(_read_tsv(handle))
+    # Keep the input order but classify each variant once.
+    return list(dict.fromkeys(variants))
+
+
+def _format_variant(chrom: str, pos: str, ref: str, alt: str) -> str:
+    chrom = chrom[3:] if chrom.lower().startswith("chr") else chrom
+    return f"chr{chrom}-{pos}-{ref.upper()}-{alt.upper()}"
+
+
+def _read_vcf(handle) -> Iterator[str]:
+    for line in handle:
+        if line.startswith("#") or not line.strip():
+            continue
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 5:
+            # Passed on as is so it is recorded as a failed variant.
+            print(f"Malformed VCF line: {line.strip()[:80]!r}")
+            yield line.strip()
+            continue
+        chrom, pos, _, ref, alts = fields[:5]
+        for alt in alts.split(","):
+            if alt in (".", "*") or alt.startswith("<"):
+                continue  # no call, spanning deletion or symbolic allele
+            yield _format_variant(chrom, pos, ref, alt)
+
+
+def _read_tsv(handle) -> Iterator[str]:
+    reader = csv.DictReader(handle, delimiter="\t")
+    columns = {name.lower().lstrip("#"): name for name in reader.fieldnames or []}
+    for row in reader:
+        if "variant" in columns or "position" in columns:
+            value = (row[columns.get("variant") or columns["position"]] or "").strip()
+            if not value:
+                continue
+            fields = value.replace(":", "-").split("-")
+        else:
+            fields = [row[columns[name]] for name in ("chrom", "pos", "ref", "alt")]
+            value = "-".join(field or "" for field in fields)
+        if len(fields) != 4 or not all(field and field.strip() for field in fields):
+            # Passed on as is so it is recorded as a failed variant.
+            print(f"Malformed variant row: {value!r}")
+            yield value
+            continue
+        yield _format_variant(*(field.strip() for field in fields))
+
+
+class ResultWriter:
+    """Append results to a JSONL or TSV file, flushing after every record."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.is_tsv = path.suffix == ".tsv"
+        if path.exists():
+            if self.is_tsv:
+                self._drop_partial_row()
+            else:
+                self._drop_partial_line()
+        write_header = self.is_tsv and (not path.exists() or path.stat().st_size == 0)
+        self.handle = open(path, "a", newline="")
+        if self.is_tsv:
+            self.writer = csv.DictWriter(self.handle, fieldnames=OUTPUT_FIELDS, delimiter="\t")
+            if write_header:
+                self.writer.writeheader()
+                self.handle.flush()
+
+    def _drop_partial_line(self):
+        """Cut off a last JSONL line left unparseable by a crash mid-write, so appends start on a clean line."""
+        with open(self.path, "rb+") as handle:
+            data = handle.read()
+            start = data.rstrip(b"\n").rfind(b"\n") + 1
+            last_line = data[start:].strip()
+            if not last_line:
+                return
+            try:
+                json.loads(last_line)
+            except ValueError:
+                print(f"Dropping an incomplete record at the end of {self.path}: {last_line[:80]!r}")
+                handle.truncate(start)
+                return
+            if not data.endswith(b"\n"):
+                handle.write(b"\n")
+
+    def _drop_partial_row(self):
+        """Cut off a last TSV row left incomplete by a crash mid-write; rows may span lines in quoted fields."""
+        with open(self.path, "r+", newline="") as handle:
+            text = handle.read()
+            consumed = 0
+
+            def lines():
+                nonlocal consumed
+                for line in io.StringIO(text, newline=""):
+                    consumed += len(line)
+                    yield line
+
+            complete = 0
+            try:
+                for row in csv.reader(lines(), delimiter="\t"):
+                    if len(row) == len(OUTPUT_FIELDS) and text[consumed - 1] in "\r\n":
+                        complete = consumed
+            except csv.Error:
+                pass  # an unterminated quoted field at the end
+            if complete < len(text):
+                print(f"Dropping an incomplete row at the end of {self.path}: {text[complete:][:80]!r}")
+                handle.truncate(len(text[:complete].encode(handle.encoding)))
+
+    def _read_jsonl(self, handle) -> Iterator[Dict]:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"Skipping unreadable line {number} of {self.path}")
+
+    def completed(self) -> Set[tuple]:
+        """Keys of the records already written with status "ok"."""
+        done = set()
+        with open(self.path, "r", newline="") as handle:
+            records = csv.DictReader(handle, delimiter="\t") if self.is_tsv else self._read_jsonl(handle)
+            for record in records:
+                if record.get("status") == "ok":
+                    done.add(_record_key(record))
+        return done
+
+    def write(self, record: Dict):
+        if self.is_tsv:
+            self.writer.writerow(record)
+        else:
+            self.handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.handle.flush()
+
+    def close(self):
+        self.handle.close()
+
+
+def _record_key(record: Dict) -> tuple:
+    return (record["genome_version"], record["variant"], record["model"], record["template"])
+
+
+def classify_variants(variants: List[str],
+                      output: Path,
+                      genome_version: str = "hg38",
+                      llm_alias: str = "claude",
+                      template: str = "Ben",
+                      annotation_workers: int = 4,
+                      annotation_batch_size: int = 50,
+                      llm_workers: int = 4) -> Dict[str, int]:
+    """Annotate and classify `variants`, appending results to `output`; returns status counts."""
+    prompt_template = PROMPT_TEMPLATES[template]
+    writer = ResultWriter(output)
+    done = writer.completed()
+    todo = [variant for variant in variants
+            if (genome_version, variant, llm_alias, template) not in done]
+    counts = {"skipped": len(variants) - len(todo), "ok": 0, "error": 0}
+    print(f"{len(todo)} variants to classify, {counts['skipped']} already done")
+
+    def base_record(variant):
+        return {"genome_version": genome_version, "variant": variant, "model": llm_alias,
+                "template": template, "status": "", "classification": "", "response": "", "error": ""}
+
+    def classify(variant, annotation_data):
+        record = base_record(variant)
+        variant_template = prompt_template
+        if template == "Kavin":
+            variant_template = compose_acmg_classifier_template(
+                consequence_class(annotation_data), inheritance_mode(annotation_data)
+            )
+        response = run_prompt(
+            llm_alias,
+            variant_template,
+            {
+                'annotation': serialize_annotation(annotation_data, "acmg"),
+                'genetic_variant': variant
+            }
+        )
+        record.update(status="ok", response=response, classification=extract_classification(response) or "")
+        return record
+
+    def fail(variant, error):
+        record = base_record(variant)
+        record.update(status="error", error=error)
+        writer.write(record)
+        counts["error"] += 1
+
+    client = get_annotation_client()
+    batches = [todo[i:i + annotation_batch_size] for i in range(0, len(todo), annotation_batch_size)]
+    try:
+        with ThreadPoolExecutor(annotation_workers) as annotation_pool, ThreadPoolExecutor(llm_workers) as llm_pool:
+            pending = {annotation_pool.submit(client.annotate_many, genome_version, batch): ("annotate", batch)
+                       for batch in batches}
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, item = pending.pop(future)
+                    if stage == "annotate":
+                        try:
+                            annotations, errors = future.result()
+                        except Exception as e:
+                            annotations, errors = {}, {variant: e for variant in item}
+                        for variant, error in errors.items():
+                            fail(variant, f"annotate: {error}")
+                        for variant, annotation_data in annotations.items():
+                            pending[llm_pool.submit(classify, variant, annotation_data)] = ("classify", variant)
+                        continue
+                    variant = item
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        fail(variant, f"{stage}: {e}")
+                        continue
+                    writer.write(result)
+                    counts["ok"] += 1
+                    print(f"{variant}: {result['classification'] or 'no classification found'}")
+    finally:
+        writer.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help="VCF (optionally .gz) or TSV with variant or CHROM/POS/REF/ALT columns")
+    parser.add_argument("--output", type=Path, required=True, help="Results file, .jsonl or .tsv")
+    parser.add_argument("--genome-version", choices=["hg19", "hg38"], default="hg38")
+    parser.add_argument("--model", choices=["claude", "chatgpt", "kimi", "doubao"], default="claude")
+    parser.add_argument("--template", choices=sorted(PROMPT_TEMPLATES), default="Ben")
+    parser.add_argument("--annotation-workers", type=int, default=4)
+    parser.add_argument("--annotation-batch-size", type=int, default=50)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    load_dotenv(root_path / '.env')
+    counts = classify_variants(
+        read_variants(args.input),
+        args.output,
+        genome_version=args.genome_version,
+        llm_alias=args.model,
+        template=args.template,
+        annotation_workers=args.annotation_workers,
+        annotation_batch_size=args.annotation_batch_size,
+        llm_workers=args.llm_workers
+    )
+    print(f"Done: {counts['ok']} classified, {counts['error']} failed, {counts['skipped']} skipped")
+
+
+if __name__ == "__main__":
+    main()
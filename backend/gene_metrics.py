@@ -0,0 +1,171 @@
+"""
+Columnar constraint metrics for the genes in gene_db.
+
+    table = open_gene_metric_table("data")
+    panel = table.filter((table["pLI"] > 0.9) & (table["HI_Score_ClinGen"] == 3))
+    metrics = table.join(gene_ids)          # columns aligned to gene_ids
+    table.pvs1_mask(), table.pp2_mask(), table.bp1_mask()
+
+Each metric is a float64 NumPy array (NaN when the gene has no value), next
+to arrays of NCBI gene ids and symbols, so queries over the whole panel are
+vectorised instead of looping over the nested gene records. Metrics are
+found by name anywhere in a record's nested dicts.
+
+Compile the table once after updating gene_db.json:
+    python -m backend.gene_metrics data/
+"""
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from backend.annotation_db import open_annotation_store
+
+METRICS = ("pLI", "oe_lof_upper", "syn_z", "mis_z", "HI_Score_ClinGen", "TS_Score_ClinGen")
+SYMBOL_KEYS = ("symbol", "gene_symbol", "Symbol")
+
+# Thresholds for the gene-level ACMG preconditions.
+PLI_LOF_INTOLERANT = 0.9
+LOEUF_LOF_INTOLERANT = 0.35
+MIS_Z_CONSTRAINED = 3.09
+HI_SUFFICIENT_EVIDENCE = 3
+
+
+def _find_value(record, key: str):
+    """First value stored under `key` (case-insensitive) anywhere in nested dicts and lists."""
+    key = key.lower()
+    stack = [record]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for name, value in item.items():
+                if name.lower() == key and not isinstance(value, (dict, list)):
+                    return value
+            stack.extend(reversed([value for value in item.values() if isinstance(value, (dict, list))]))
+        elif isinstance(item, list):
+            stack.extend(reversed([value for value in item if isinstance(value, (dict, list))]))
+    return None
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan  # missing, "NA" or a free-text ClinGen call
+
+
+class GeneMetricTable:
+    """Constraint metrics of many genes as parallel NumPy arrays."""
+
+    def __init__(self, gene_ids: Sequence[str], symbols: Sequence[str], columns: Dict[str, np.ndarray]):
+        self.gene_ids = np.asarray(gene_ids, dtype=str)
+        self.symbols = np.asarray(symbols, dtype=str)
+        self.columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        self._id_order = np.argsort(self.gene_ids)
+        self._symbol_order = np.argsort(self.symbols)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, Dict]], metrics: Sequence[str] = METRICS) -> "GeneMetricTable":
+        """Build from (gene id, record) pairs, e.g. `gene_db.items()`."""
+        gene_ids, symbols = [], []
+        values = {name: [] for name in metrics}
+        for gene_id, record in records:
+            gene_ids.append(str(gene_id))
+            symbol = next((record[key] for key in SYMBOL_KEYS if record.get(key)), None)
+            symbols.append(str(symbol or _find_value(record, "symbol") or ""))
+            for name in metrics:
+                values[name].append(_to_float(_find_value(record, name)))
+        return cls(gene_ids, symbols, values)
+
+    def __len__(self):
+        return len(self.gene_ids)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def filter(self, mask: np.ndarray) -> "GeneMetricTable":
+        """Table of the genes selected by a boolean mask."""
+        return GeneMetricTable(
+            self.gene_ids[mask], self.symbols[mask],
+            {name: values[mask] for name, values in self.columns.items()}
+        )
+
+    def indices(self, keys: Sequence[str], by: str = "gene_id") -> np.ndarray:
+        """Row of each gene id (or symbol, with by="symbol"); -1 where unknown."""
+        values, order = (self.gene_ids, self._id_order) if by == "gene_id" else (self.symbols, self._symbol_order)
+        keys = np.asarray(keys, dtype=str)
+        if not len(values):
+            return np.full(len(keys), -1)
+        position = np.clip(np.searchsorted(values, keys, sorter=order), 0, len(values) - 1)
+        rows = order[position]
+        return np.where(values[rows] == keys, rows, -1)
+
+    def join(self, keys: Sequence[str], by: str = "gene_id", columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Metric columns aligned to `keys`, NaN for unknown genes."""
+        rows = self.indices(keys, by=by)
+        found = rows >= 0
+        joined = {}
+        for name in columns or self.columns:
+            values = np.full(len(rows), np.nan)
+            values[found] = self.columns[name][rows[found]]
+            joined[name] = values
+        return joined
+
+    def pvs1_mask(self) -> np.ndarray:
+        """Genes where loss of function is an established disease mechanism."""
+        return (
+            (self.columns["HI_Score_ClinGen"] == HI_SUFFICIENT_EVIDENCE)
+            | (self.columns["pLI"] >= PLI_LOF_INTOLERANT)
+            | (self.columns["oe_lof_upper"] < LOEUF_LOF_INTOLERANT)
+        )
+
+    def pp2_mask(self) -> np.ndarray:
+        """Genes with a low rate of benign missense variation (missense constrained)."""
+        return self.columns["mis_z"] >= MIS_Z_CONSTRAINED
+
+    def bp1_mask(self) -> np.ndarray:
+        """Genes where truncating rather than missense variants cause disease."""
+        return self.pvs1_mask() & ~self.pp2_mask()
+
+    def rows(self, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        """Selected genes as a list of dicts, for display."""
+        table = self if mask is None else self.filter(mask)
+        return [
+            {"gene_id": str(gene_id), "symbol": str(symbol),
+             **{name: None if np.isnan(values[i]) else float(values[i]) for name, values in table.columns.items()}}
+            for i, (gene_id, symbol) in enumerate(zip(table.gene_ids, table.symbols))
+        ]
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, gene_ids=self.gene_ids, symbols=self.symbols,
+                 **{f"metric_{name}": values for name, values in self.columns.items()})
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "GeneMetricTable":
+        with np.load(path) as data:
+            columns = {name[len("metric_"):]: data[name] for name in data.files if name.startswith("metric_")}
+            return cls(data["gene_ids"], data["symbols"], columns)
+
+
+def open_gene_metric_table(data_dir: Union[str, Path]) -> GeneMetricTable:
+    """Load data_dir/gene_metrics.npz, rebuilding it from gene_db first if it is missing or stale."""
+    data_dir = Path(data_dir)
+    gene_db = open_annotation_store(data_dir, "gene_db")
+    path = data_dir / "gene_metrics.npz"
+    if path.exists() and path.stat().st_mtime >= gene_db.db_path.stat().st_mtime:
+        return GeneMetricTable.load(path)
+    table = GeneMetricTable.from_records(gene_db.items())
+    table.save(path)
+    return table
+
+
+def main():
+    data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parent.parent / "data"
+    table = open_gene_metric_table(data_dir)
+    print(f"{len(table)} genes, {int(table.pvs1_mask().sum())} meet the PVS1 gene-level precondition, "
+          f"{int(table.pp2_mask().sum())} PP2, {int(table.bp1_mask().sum())} BP1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+def template_version(prompt_template: str) -> str:
+    """Short content hash identifying a prompt template."""
+    return hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+
+class LLMResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses.
+
+    All chains run at temperature 0, so a (model, prompt template, inputs)
+    triple always gets the same answer and can be replayed. Each entry also
+    records the model id and template version it was produced with. Entries
+    older than `max_age_seconds` expire and the least recently used ones are
+    evicted once the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 max_bytes: int = 256 * 1024 * 1024,
+                 max_age_seconds: float = 30 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                template_version TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_id: str, prompt_template: str, inputs: Dict) -> str:
+        """Hash of the model id, the prompt template and the input variables."""
+        payload = json.dumps(
+            {"model": model_id, "template": prompt_template, "inputs": inputs},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return response
+
+    def put(self, key: str, response: str, model_id: str, prompt_template: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (key, model_id, template_version, response, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, model_id, template_version(prompt_template), response,
+                 len(response.encode("utf-8")), now, now)
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries and trim the cache to `max_bytes`."""
+        with self._lock:
+            self._evict_locked(time.time())
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def _evict_locked(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
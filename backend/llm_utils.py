@@ -1,43 +1,238 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
+import asyncio
+import contextlib
+import httpx
 import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from langchain.callbacks import StreamingStdOutCallbackHandler
-#from langchain.callbacks import StreamlitCallbackHandler
-from langchain_community.callbacks.streamlit import StreamlitCallbackHandler
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage
 
-def get_llm(llm_alias):
+from backend.llm_cache import LLMResponseCache
+from backend.prompts import PROMPT_PARTS, PUBMED_ACMG_CHUNK_READER_TEMPLATE, PUBMED_ACMG_REDUCE_TEMPLATE
+from backend.rate_limiter import RateLimitScheduler
+from backend.token_estimator import TOKEN_CALIBRATION_PATH, TokenCalibration, TokenEstimator, split_by_token_budget
+
+# Article tokens per call in chunked mode, leaving room for the template and the answer.
+CHUNK_TOKEN_BUDGETS = {
+    "chatgpt": 90000,
+    "claude": 120000,
+    "kimi": 90000,
+    "doubao": 20000,
+}
+
+# Seconds before an LLM request is abandoned.
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 120))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 10))
+# Keep-alive connections pooled per endpoint, shared by all models behind it.
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+ARK_API_BASE = "https://ark.cn-beijing.volces.com/api/v3"
+
+_llm_registry = {}
+_http_clients = {}
+# Compiled (prompt, chain) per (model, template).
+_chain_registry = {}
+_registry_lock = threading.Lock()
+_warm_up_started = False
+
+# On-disk cache of temperature-0 responses; set LLM_CACHE_DISABLED to bypass it.
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / "data/cache/llm_responses.sqlite")
+)
+_response_cache = None
+
+# Request and token budgets per model; retries happen in the scheduler, so the
+# SDK clients are built with max_retries=0.
+PROVIDER_LIMITS = {
+    "chatgpt": {"requests_per_minute": 500, "tokens_per_minute": 200000, "max_concurrency": 16},
+    "claude": {"requests_per_minute": 50, "tokens_per_minute": 80000, "max_concurrency": 8},
+    "kimi": {"requests_per_minute": 300, "tokens_per_minute": 300000, "max_concurrency": 16},
+    "doubao": {"requests_per_minute": 300, "tokens_per_minute": 300000, "max_concurrency": 16},
+}
+# Completion tokens charged up front until the provider reports the real usage.
+EXPECTED_OUTPUT_TOKENS = 1500
+# Context window (prompt and answer together) and longest answer per model.
+MODEL_LIMITS = {
+    "chatgpt": {"context_tokens": 128000, "output_tokens": 16384},
+    "claude": {"context_tokens": 200000, "output_tokens": 8192},
+    "kimi": {"context_tokens": 128000, "output_tokens": 4096},
+    "doubao": {"context_tokens": 32768, "output_tokens": 4096},
+}
+# Models with a larger context window a prompt may be moved to, smallest first.
+CONTEXT_FALLBACKS = {
+    "doubao": ["kimi", "chatgpt", "claude"],
+    "kimi": ["claude"],
+    "chatgpt": ["claude"],
+    "claude": [],
+}
+_schedulers = {}
+# Prompt token estimates are calibrated per model from the usage the
+# providers report; set TOKEN_CALIBRATION_DISABLED to use the plain heuristic.
+_token_estimator = None
+
+def _get_http_clients(api_base):
+    """Return the (sync, async) httpx clients for an endpoint, creating them once per process."""
+    if api_base not in _http_clients:
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=300
+        )
+        timeout = httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        _http_clients[api_base] = (
+            httpx.Client(limits=limits, timeout=timeout),
+            httpx.AsyncClient(limits=limits, timeout=timeout)
+        )
+    return _http_clients[api_base]
+
+def _build_llm(llm_alias):
     """Initialize LLM based on model name."""
     if llm_alias == "chatgpt":
         llm_name = "gpt-4o-mini"
+        http_client, http_async_client = _get_http_clients(OPENAI_API_BASE)
         return ChatOpenAI(
             temperature=0.0,
             model=llm_name,
-            streaming=True
+            streaming=True,
+            stream_usage=True,
+            timeout=LLM_REQUEST_TIMEOUT,
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
     elif llm_alias == "claude":
         llm_name = "claude-3-5-sonnet-20241022"
         from langchain_anthropic import ChatAnthropic
+        # The Anthropic SDK keeps its own connection pool per client, which
+        # is reused because the client is built once per process.
         return ChatAnthropic(
             temperature=0.0,
             model=llm_name,
-            streaming=True
+            streaming=True,
+            default_request_timeout=LLM_REQUEST_TIMEOUT,
+            max_retries=0
         )
     elif llm_alias == "doubao":
         llm_name = "ep-20240821102124-nl9ck"
+        http_client, http_async_client = _get_http_clients(ARK_API_BASE)
         return ChatOpenAI(temperature = 0.0, 
             model=llm_name,
             openai_api_key=os.environ["ARK_API_KEY"],
-            openai_api_base="https://ark.cn-beijing.volces.com/api/v3")
+            openai_api_base=ARK_API_BASE,
+            # Usage is only streamed by default from api.openai.com.
+            stream_usage=True,
+            timeout=LLM_REQUEST_TIMEOUT,
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client)
     elif llm_alias == "kimi":
         llm_name = "ep-20241203161719-mpv8s"
+        http_client, http_async_client = _get_http_clients(ARK_API_BASE)
         return ChatOpenAI(temperature = 0.0, 
             model=llm_name,
             openai_api_key=os.environ["ARK_API_KEY"],
-            openai_api_base="https://ark.cn-beijing.volces.com/api/v3")
+            openai_api_base=ARK_API_BASE,
+            # Usage is only streamed by default from api.openai.com.
+            stream_usage=True,
+            timeout=LLM_REQUEST_TIMEOUT,
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client)
     else:
         raise ValueError(f"Unsupported LLM: {llm_alias}")
 
+def get_llm(llm_alias):
+    """Return the process-wide LLM client for an alias, building it on first use."""
+    llm = _llm_registry.get(llm_alias)
+    if llm is None:
+        with _registry_lock:
+            llm = _llm_registry.get(llm_alias)
+            if llm is None:
+                llm = _build_llm(llm_alias)
+                _llm_registry[llm_alias] = llm
+    return llm
+
+def compile_prompt(llm_alias, prompt_template):
+    """
+    Build the chat prompt of a template for a model.
+
+    Templates registered in PROMPT_PARTS send their static guidance as a
+    system message ahead of the variable part. For Anthropic it is marked
+    with cache_control so repeated requests read it from the prompt cache;
+    OpenAI caches a stable prefix on its own. Both only cache prefixes of
+    PROMPT_CACHE_MIN_TOKENS or more.
+    """
+    parts = PROMPT_PARTS.get(prompt_template)
+    if parts is None:
+        return ChatPromptTemplate.from_template(prompt_template)
+    system, human = parts
+    if llm_alias == "claude":
+        system_message = SystemMessage(content=[
+            {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+        ])
+    else:
+        system_message = SystemMessage(content=system)
+    return ChatPromptTemplate.from_messages([system_message, ("human", human)])
+
+def get_chain(llm_alias, prompt_template):
+    """
+    Return the process-wide (prompt, chain) of a template for a model, compiling it on first use.
+
+    The chain yields message chunks; `chunk_text` turns them into text. It
+    has no output parser because closing a stream that runs through one
+    reads the rest of the answer, so an abandoned answer would not stop.
+    """
+    key = (llm_alias, prompt_template)
+    compiled = _chain_registry.get(key)
+    if compiled is None:
+        prompt = compile_prompt(llm_alias, prompt_template)
+        chain = prompt | get_llm(llm_alias)
+        with _registry_lock:
+            compiled = _chain_registry.setdefault(key, (prompt, chain))
+    return compiled
+
+def chunk_text(chunk):
+    """Text of a streamed message chunk, whose content is a string or a list of content blocks."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in chunk.content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+def warm_up_llms(llm_aliases=("chatgpt", "claude", "kimi", "doubao"), ping=True):
+    """
+    Build the LLM clients and, with `ping`, send each a one-token request so
+    DNS, TLS and the SDK are set up before the first real request.
+    Models whose API keys are missing are skipped.
+    """
+    for llm_alias in llm_aliases:
+        try:
+            llm = get_llm(llm_alias)
+            if ping:
+                llm.bind(max_tokens=1).invoke("ping")
+        except Exception as e:
+            print(f"Warm-up of {llm_alias} failed: {e}")
+
+def warm_up_llms_in_background(**kwargs):
+    """Run warm_up_llms once per process in a daemon thread."""
+    global _warm_up_started
+    with _registry_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up_llms, kwargs=kwargs, daemon=True).start()
+
 def hello_world(llm_alias, prompt):
     from IPython.display import display, Markdown
     
@@ -55,101 +250,504 @@ def hello_world(llm_alias, prompt):
     return response
 
 
-def generate_gene_description(llm_alias, prompt_template, phenotype, molecular_genetics):
-    """Generate description using specified LLM with streaming response."""
+def get_scheduler(llm_alias):
+    """Return the process-wide rate-limit scheduler of a model."""
+    with _registry_lock:
+        if llm_alias not in _schedulers:
+            _schedulers[llm_alias] = RateLimitScheduler(llm_alias, **PROVIDER_LIMITS[llm_alias])
+    return _schedulers[llm_alias]
 
-    # Initialize LLM
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Collect the input and total token usage reported by the provider."""
+
+    def __init__(self):
+        self.input_tokens = None
+        self.total_tokens = None
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.input_tokens = usage.get("input_tokens")
+                    self.total_tokens = usage.get("total_tokens")
+                    return
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        self.input_tokens = token_usage.get("prompt_tokens")
+        self.total_tokens = token_usage.get("total_tokens")
+
+def get_token_estimator():
+    """Return the process-wide token estimator, calibrated from recorded usage."""
+    global _token_estimator
+    with _registry_lock:
+        if _token_estimator is None:
+            calibration = None
+            if not os.environ.get("TOKEN_CALIBRATION_DISABLED"):
+                calibration = TokenCalibration(TOKEN_CALIBRATION_PATH)
+            _token_estimator = TokenEstimator(calibration=calibration)
+    return _token_estimator
+
+def _model_id(llm_alias):
     llm = get_llm(llm_alias)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    
-    # Create chain with streaming
-    chain = prompt | llm | StrOutputParser()
-    
-    # Generate response with streaming
-    response = chain.invoke(
+    return f"{llm_alias}:{getattr(llm, 'model_name', None) or getattr(llm, 'model', '')}"
+
+class PromptTooLargeError(ValueError):
+    """A prompt that does not fit the context window of the model, or of any model it may be moved to."""
+
+    def __init__(self, llm_alias, prompt_tokens, prompt_token_limit):
+        self.llm_alias = llm_alias
+        self.prompt_tokens = prompt_tokens
+        self.prompt_token_limit = prompt_token_limit
+        super().__init__(
+            f"The prompt is about {prompt_tokens} tokens, but {llm_alias} accepts at most "
+            f"{prompt_token_limit} while leaving room for its answer. "
+            f"Shorten the input or choose a model with a larger context window."
+        )
+
+def prompt_token_limit(llm_alias, output_tokens=EXPECTED_OUTPUT_TOKENS):
+    """Prompt tokens a model accepts while leaving room for an answer of `output_tokens`."""
+    limits = MODEL_LIMITS[llm_alias]
+    return limits["context_tokens"] - min(output_tokens, limits["output_tokens"])
+
+def compact_text(text):
+    """Drop trailing spaces, collapse runs of spaces and tabs, and keep at most one blank line."""
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def preflight(llm_alias, prompt, inputs, reroute=False):
+    """
+    Check a prompt against the context window before anything is sent.
+
+    The rendered prompt is estimated with the safety margin. When it does
+    not fit, the inputs are compacted; when it still does not fit, it is
+    rejected with PromptTooLargeError, or, only if the caller opts in with
+    `reroute`, moved to the first model of CONTEXT_FALLBACKS that takes it.
+    Returns (llm_alias, inputs, prompt_text) to send; the returned alias
+    differs from the requested one when the prompt was moved.
+    """
+    estimator = get_token_estimator()
+    prompt_text = prompt.format(**inputs)
+    tokens = estimator.estimate_tokens(prompt_text, model=_model_id(llm_alias), upper_bound=True)
+    if tokens <= prompt_token_limit(llm_alias):
+        return llm_alias, inputs, prompt_text
+
+    inputs = {name: compact_text(value) if isinstance(value, str) else value for name, value in inputs.items()}
+    prompt_text = prompt.format(**inputs)
+    tokens = estimator.estimate_tokens(prompt_text, model=_model_id(llm_alias), upper_bound=True)
+    if tokens <= prompt_token_limit(llm_alias):
+        return llm_alias, inputs, prompt_text
+
+    for fallback in CONTEXT_FALLBACKS.get(llm_alias, []) if reroute else []:
+        try:
+            model_id = _model_id(fallback)
+        except Exception:
+            continue  # not configured, e.g. its API key is missing
+        if estimator.estimate_tokens(prompt_text, model=model_id, upper_bound=True) <= prompt_token_limit(fallback):
+            print(f"Prompt of about {tokens} tokens exceeds the context of {llm_alias}, sending it to {fallback}")
+            return fallback, inputs, prompt_text
+    raise PromptTooLargeError(llm_alias, tokens, prompt_token_limit(llm_alias))
+
+def get_response_cache():
+    """Return the process-wide LLM response cache, or None when LLM_CACHE_DISABLED is set."""
+    global _response_cache
+    if os.environ.get("LLM_CACHE_DISABLED"):
+        return None
+    with _registry_lock:
+        if _response_cache is None:
+            _response_cache = LLMResponseCache(LLM_CACHE_PATH)
+    return _response_cache
+
+class StreamInterrupted(RuntimeError):
+    """A streamed answer that failed after tokens were handed out; it is not retried, as that would repeat them."""
+
+def stream_prompt(llm_alias, prompt_template, inputs, callbacks=None, use_cache=True, reroute=False, on_reroute=None):
+    """
+    Run a prompt template through an LLM and yield the response text as it streams in.
+
+    This is the path every prompt takes. The prompt is checked against the
+    model's context window first (see `preflight`), so an oversized one is
+    compacted, rejected with PromptTooLargeError without a request being
+    made or, with `reroute`, moved to a larger model; `on_reroute(requested,
+    routed)` is then called so the caller can tell the user which model
+    answers. Responses are cached by (model, template,
+    inputs) and a cache hit is yielded as a single chunk. Otherwise the
+    request runs through the model's rate-limit scheduler on a worker
+    thread and each token is yielded as soon as the provider sends it. The
+    worker caches the response and records its usage once the call
+    completes; when the consumer stops early (a Streamlit rerun, a `break`)
+    the worker abandons the request and nothing is cached.
+    """
+    prompt, chain = get_chain(llm_alias, prompt_template)
+    routed_alias, inputs, prompt_text = preflight(llm_alias, prompt, inputs, reroute=reroute)
+    if routed_alias != llm_alias:
+        if on_reroute is not None:
+            on_reroute(llm_alias, routed_alias)
+        llm_alias = routed_alias
+        prompt, chain = get_chain(llm_alias, prompt_template)
+
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        model_id = _model_id(llm_alias)
+        key = cache.make_key(model_id, prompt_template, inputs)
+        response = cache.get(key)
+        if response is not None:
+            yield response
+            return
+
+    estimator = get_token_estimator()
+    estimated_tokens = estimator.estimate_tokens(prompt_text, model=_model_id(llm_alias)) + EXPECTED_OUTPUT_TOKENS
+    usage = UsageCallbackHandler()
+    # Response tokens (str), then one error (or None) when the worker is done.
+    tokens = queue.Queue()
+    stop = threading.Event()
+
+    def call():
+        parts = []
+        stream = chain.stream(inputs, config={'callbacks': (callbacks or []) + [usage]})
+        try:
+            with contextlib.closing(stream):
+                for chunk in stream:
+                    if stop.is_set():
+                        return None, usage.total_tokens
+                    token = chunk_text(chunk)
+                    parts.append(token)
+                    tokens.put(token)
+        except Exception as e:
+            if parts:
+                raise StreamInterrupted(f"{llm_alias} stopped answering: {e}") from e
+            raise
+        return "".join(parts), usage.total_tokens
+
+    def worker():
+        error = None
+        try:
+            response = get_scheduler(llm_alias).run(call, estimated_tokens)
+            if response is not None:
+                if usage.input_tokens and estimator.calibration is not None:
+                    estimator.calibration.record(_model_id(llm_alias), prompt_text, usage.input_tokens)
+                if cache is not None:
+                    cache.put(key, response, model_id, prompt_template)
+        except Exception as e:
+            error = e
+        finally:
+            tokens.put(error)
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            token = tokens.get()
+            if not isinstance(token, str):
+                break
+            yield token
+        if token is not None:
+            raise token
+    finally:
+        stop.set()
+
+async def astream_prompt(llm_alias, prompt_template, inputs, **kwargs):
+    """`stream_prompt` as an async iterator, for callers running an event loop."""
+    loop = asyncio.get_running_loop()
+    tokens = stream_prompt(llm_alias, prompt_template, inputs, **kwargs)
+    while True:
+        token = await loop.run_in_executor(None, next, tokens, None)
+        if token is None:
+            return
+        yield token
+
+def run_prompt(llm_alias, prompt_template, inputs, callbacks=None, container=None, use_cache=True,
+               reroute=False, on_reroute=None):
+    """
+    Run a prompt template through an LLM and return the whole response text.
+
+    With a Streamlit `container`, the answer is drawn into it as it streams.
+    """
+    response = ""
+    for token in stream_prompt(llm_alias, prompt_template, inputs, callbacks=callbacks,
+                               use_cache=use_cache, reroute=reroute, on_reroute=on_reroute):
+        response += token
+        if container is not None:
+            container.markdown(response)
+    return response
+
+class TimedStream:
+    """
+    Token iterator that records the seconds to its first non-empty token
+    and to its end, counted from `started_at` (default: when it is created).
+    """
+
+    def __init__(self, tokens, label="", started_at=None):
+        self.tokens = tokens
+        self.label = label
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_token_seconds = None
+        self.total_seconds = None
+
+    def __iter__(self):
+        for token in self.tokens:
+            if self.first_token_seconds is None and token:
+                self.first_token_seconds = time.perf_counter() - self.started_at
+            yield token
+        self.total_seconds = time.perf_counter() - self.started_at
+        print(f"{self.label}: {self.summary()}")
+
+    def summary(self):
+        if self.first_token_seconds is None:
+            return "No answer"
+        summary = f"First token after {self.first_token_seconds:.2f}s"
+        if self.total_seconds is not None:
+            summary += f", complete after {self.total_seconds:.1f}s"
+        return summary
+
+def run_prompts(llm_alias, prompt_template, inputs_list, max_concurrency=4, use_cache=True):
+    """Run one prompt template over many inputs in parallel, keeping their order."""
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return list(executor.map(
+            lambda inputs: run_prompt(llm_alias, prompt_template, inputs, use_cache=use_cache),
+            inputs_list
+        ))
+
+def generate_gene_description(llm_alias, prompt_template, phenotype, molecular_genetics):
+    """Stream a gene description; returns an iterator of response tokens."""
+    return stream_prompt(
+        llm_alias,
+        prompt_template,
         {
             'phenotype': phenotype,
             'molecular_genetics': molecular_genetics
-        },
-        config={'callbacks': [StreamingStdOutCallbackHandler()]}
+        }
     )
-    
-    return response
 
-def generate_acmg_intepretation(llm_alias, prompt_template, article_content, variant_name):
-    """Generate description using specified LLM with streaming response."""
- 
-    # Initialize LLM
-    llm = get_llm(llm_alias)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    
-    # Create chain with streaming
-    chain = prompt | llm | StrOutputParser()
-    
-    # Generate response with streaming
-    response = chain.invoke(
+def generate_acmg_intepretation(llm_alias, prompt_template, article_content, variant_name,
+                                chunked=False, chunk_token_budget=None, max_concurrency=4,
+                                reroute=False, on_reroute=None):
+    """
+    Stream the ACMG evidence found in an article; returns an iterator of response tokens.
+
+    `article_content` is the article text or a list of its sections. With
+    `chunked`, an article larger than `chunk_token_budget` tokens is split at
+    section boundaries, the chunks are read in parallel (before this returns)
+    and the merge of their partial evidence is streamed. `reroute` and
+    `on_reroute` are passed to `stream_prompt`.
+    """
+    if not isinstance(article_content, str):
+        pieces = list(article_content)
+        article_content = "".join(pieces)
+    else:
+        pieces = [article_content]
+
+    if chunked:
+        token_budget = chunk_token_budget or CHUNK_TOKEN_BUDGETS.get(llm_alias, 20000)
+        chunks = split_by_token_budget(pieces, token_budget)
+        if len(chunks) > 1:
+            return _map_reduce_acmg_intepretation(llm_alias, chunks, variant_name, max_concurrency)
+
+    return stream_prompt(
+        llm_alias,
+        prompt_template,
         {
             'pubmed_article': article_content,
             'genetic_variant': variant_name
         },
-        config={'callbacks': [StreamingStdOutCallbackHandler()]}
+        reroute=reroute,
+        on_reroute=on_reroute
+    )
+
+def _map_reduce_acmg_intepretation(llm_alias, chunks, variant_name, max_concurrency):
+    """Read article chunks in parallel, then stream the merge of their partial evidence."""
+    partial_findings = run_prompts(
+        llm_alias,
+        PUBMED_ACMG_CHUNK_READER_TEMPLATE,
+        [
+            {
+                'pubmed_article': chunk,
+                'genetic_variant': variant_name,
+                'chunk_index': index + 1,
+                'chunk_count': len(chunks)
+            }
+            for index, chunk in enumerate(chunks)
+        ],
+        max_concurrency=max_concurrency
+    )
+
+    return stream_prompt(
+        llm_alias,
+        PUBMED_ACMG_REDUCE_TEMPLATE,
+        {
+            'partial_findings': "\n\n".join(
+                f"Part {index + 1}:\n{finding}" for index, finding in enumerate(partial_findings)
+            ),
+            'genetic_variant': variant_name
+        }
     )
-    
-    return response
 
 def generate_acmg_classification(llm_alias, prompt_template, annotation_data, variant_name):
-    """Generate ACMG interpretation using specified LLM with streaming response."""
- 
-    # Initialize LLM
-    llm = get_llm(llm_alias)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    
-    # Create chain with streaming
-    chain = prompt | llm | StrOutputParser()
-    import streamlit as st
-    streaming_container = st.empty()
-    # Generate response with streaming
-    response = chain.invoke(
+    """Stream an ACMG classification of annotated variant; returns an iterator of response tokens."""
+    return stream_prompt(
+        llm_alias,
+        prompt_template,
         {
             'annotation': annotation_data, 
             'genetic_variant': variant_name
-        },
-        config={'callbacks': [StreamlitCallbackHandler(streaming_container)]}
+        }
     )
-    
-    return response
 
 
 def generate_pvs1_justification(llm_alias, prompt_template, variant_annotation, gene_annotation, transcript_annotation):
-    """Generate ACMG interpretation using specified LLM with streaming response."""
- 
-    # Initialize LLM
-    llm = get_llm(llm_alias)
-    
-    # Create prompt
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    
-    # Create chain with streaming
-    chain = prompt | llm | StrOutputParser()
-    import streamlit as st
-    streaming_container = st.empty()
-    # Generate response with streaming
-    response = chain.invoke(
+    """Stream a PVS1 assessment; returns an iterator of response tokens."""
+    return stream_prompt(
+        llm_alias,
+        prompt_template,
         {
             'variant_annotation': variant_annotation, 
             'gene_annotation': gene_annotation,
             'transcript_annotation': transcript_annotation,
-        },
-        config={'callbacks': [StreamlitCallbackHandler(streaming_container)]}
+        }
     )
-    
-    return response
+
+
+def generate_fanout(llm_aliases, prompt_template, inputs, containers=None, use_cache=True):
+    """
+    Send the same prompt to several models at once.
+
+    Each answer streams into containers[llm_alias] when given. Returns
+    {llm_alias: response}; a model that fails gets an "Error: ..." response
+    without affecting the others. The wait is that of the slowest model.
+    """
+    containers = containers or {}
+    script_run_ctx = None
+    if containers:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        script_run_ctx = get_script_run_ctx()
+
+    def run(llm_alias):
+        if script_run_ctx is not None:
+            # Worker threads need the session context to draw into the page.
+            add_script_run_ctx(threading.current_thread(), script_run_ctx)
+        container = containers.get(llm_alias)
+        try:
+            return run_prompt(
+                llm_alias,
+                prompt_template,
+                inputs,
+                container=container,
+                use_cache=use_cache  # not rerouted: each column must be the model it is labelled with
+            )
+        except Exception as e:
+            response = f"Error: {e}"
+            if container is not None:
+                container.error(response)
+            return response
+
+    with ThreadPoolExecutor(max_workers=len(llm_aliases)) as executor:
+        return dict(zip(llm_aliases, executor.map(run, llm_aliases)))
+
+# Checked in order, so the more specific labels come first.
+ACMG_CLASSES = [
+    ("likely pathogenic", "likely pathogenic"),
+    ("pathogenic", "pathogenic"),
+    ("uncertain significance", "variant of uncertain significance"),
+    ("vus", "variant of uncertain significance"),
+    ("likely benign", "likely benign"),
+    ("benign", "benign"),
+]
+PVS1_CLASSES = [
+    ("pvs1_strong", "PVS1_Strong"),
+    ("pvs1_moderate", "PVS1_Moderate"),
+    ("pvs1_supp", "PVS1_Supporting"),
+    ("not met", "Not met"),
+    ("n/a", "Not met"),
+    ("pvs1", "PVS1"),
+]
+
+# Ben-style answers have no **classification** marker; their call follows the
+# last heading or line that mentions a classification.
+_CLASSIFICATION_LINE = re.compile(r"^[^\n]*classification[^\n]*$", re.IGNORECASE | re.MULTILINE)
+_MARKDOWN_HEADING = re.compile(r"^\s*#", re.MULTILINE)
+
+def _match_label(section, classes, first_mentioned=False):
+    """Label of the first needle of `classes` in `section`, or with `first_mentioned` of the earliest one."""
+    section = section.lower()
+    found = []
+    for needle, label in classes:
+        match = re.search(rf"(?<![a-z_]){re.escape(needle)}(?![a-z_])", section)
+        if match:
+            if not first_mentioned:
+                return label
+            found.append((match.start(), label))
+    return min(found)[1] if found else None
+
+def extract_classification(response):
+    """Pull the final ACMG or PVS1 call out of a model answer, or None."""
+    marked = False
+    for marker, classes in (("**pvs1_assessment**", PVS1_CLASSES), ("**classification**", ACMG_CLASSES)):
+        start = response.lower().find(marker)
+        if start == -1:
+            continue
+        marked = True
+        section = response[start + len(marker):]
+        end = section.find("**")
+        label = _match_label(section[:end] if end != -1 else section, classes)
+        if label is not None:
+            return label
+    if marked:
+        return None
+
+    lines = list(_CLASSIFICATION_LINE.finditer(response))
+    if not lines:
+        return None
+    section = response[lines[-1].start():]
+    # Up to the next heading after the classification line itself.
+    end = _MARKDOWN_HEADING.search(section, len(lines[-1].group(0)))
+    # The call comes first there; later labels are usually conditions ("could become likely pathogenic").
+    return _match_label(section[:end.start() if end else 600], ACMG_CLASSES, first_mentioned=True)
+
+def summarize_consensus(responses):
+    """
+    Majority view over fan-out answers: {"votes": {alias: label},
+    "consensus": label or None, "agreement": "3/4", "unparsed": [alias]}.
+    Answers whose classification could not be read are listed in
+    "unparsed" and left out of the agreement count, so they do not count
+    as disagreement.
+    """
+    votes = {llm_alias: extract_classification(response) for llm_alias, response in responses.items()}
+    unparsed = [llm_alias for llm_alias, label in votes.items() if label is None]
+    counts = {}
+    for label in votes.values():
+        if label is not None:
+            counts[label] = counts.get(label, 0) + 1
+    consensus = max(counts, key=counts.get) if counts else None
+    if consensus is not None and list(counts.values()).count(counts[consensus]) > 1:
+        consensus = None  # tie
+    agreement = f"{counts.get(consensus, 0)}/{len(votes) - len(unparsed)}"
+    return {"votes": votes, "consensus": consensus, "agreement": agreement, "unparsed": unparsed}
+
+
+def generate_fanout_comparison(llm_aliases, prompt_template, inputs):
+    """Stream several models side by side in Streamlit columns, then show their consensus."""
+    import streamlit as st
+    containers = {}
+    for llm_alias, column in zip(llm_aliases, st.columns(len(llm_aliases))):
+        column.markdown(f"#### {llm_alias}")
+        containers[llm_alias] = column.empty()
+
+    responses = generate_fanout(llm_aliases, prompt_template, inputs, containers=containers)
+    consensus = summarize_consensus(responses)
+
+    st.markdown("### Consensus")
+    st.table([
+        {"model": llm_alias, "classification": label or "not found"}
+        for llm_alias, label in consensus["votes"].items()
+    ])
+    if consensus["consensus"]:
+        st.markdown(f"**{consensus['consensus']}** ({consensus['agreement']} models agree)")
+    elif len(consensus["unparsed"]) == len(consensus["votes"]):
+        st.markdown("No classification could be read from the answers.")
+    else:
+        st.markdown("The models do not agree on a classification.")
+    if consensus["unparsed"] and len(consensus["unparsed"]) < len(consensus["votes"]):
+        st.caption(f"No classification could be read from: {', '.join(consensus['unparsed'])}")
+    return responses, consensus
 
 
 # Example usage:
@@ -0,0 +1,291 @@
+"""
+Local mirror of the OMIM bulk download files.
+
+Import genemap2.txt and mim2gene.txt (from https://omim.org/downloads) with:
+    python -m backend.omim_mirror genemap2.txt mim2gene.txt
+
+Phenotype maps are then built locally from the mirror, and text sections
+fetched from the API are kept in it for `text_ttl_seconds`, so the API is
+only asked for text sections the mirror has not seen lately.
+"""
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from backend.omim_utils import OmimClient, OmimResponse, get_omim_client
+
+OMIM_MIRROR_PATH = Path(os.environ.get(
+    "OMIM_MIRROR_PATH",
+    Path(__file__).resolve().parent.parent / "data/omim_mirror.sqlite"
+))
+
+# "Breast-ovarian cancer, familial, 1, 604370 (3), Autosomal dominant"
+_PHENOTYPE_RE = re.compile(r"^(?P<phenotype>.*?)(?:,\s*(?P<mim>\d{6}))?\s*\((?P<key>\d)\)(?:,\s*(?P<inheritance>.*))?$")
+_NO_SECTION = ""
+
+
+def parse_genemap_phenotypes(mim_number: str, phenotypes: str) -> List[Dict]:
+    """Phenotype map entries of a genemap2 Phenotypes column, keyed like the API's phenotypeMap."""
+    entries = []
+    for phenotype in phenotypes.split(";"):
+        phenotype = phenotype.strip()
+        match = _PHENOTYPE_RE.match(phenotype)
+        if not phenotype or match is None:
+            continue
+        inheritance = match.group("inheritance")
+        entries.append({
+            'mimNumber': mim_number,
+            'phenotype': match.group("phenotype").strip(),
+            'phenotypeMimNumber': match.group("mim"),
+            'phenotypeMappingKey': match.group("key"),
+            # The API joins several modes of inheritance with "; ".
+            'phenotypeInheritance': inheritance.replace(", ", "; ") if inheritance else None
+        })
+    return entries
+
+
+def _read_tsv(path: Union[str, Path]) -> Iterator[Dict[str, str]]:
+    """Rows of an OMIM download file, whose header is the last comment line before the data."""
+    header = None
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if line.startswith("#"):
+                columns = line.lstrip("#").strip().split("\t")
+                if len(columns) > 1:
+                    header = [column.strip() for column in columns]
+                continue
+            if header and line.strip():
+                yield dict(zip(header, line.split("\t")))
+
+
+def _column(row: Dict[str, str], *names: str) -> Optional[str]:
+    """Value of the first column named, or starting with, one of `names` (headers carry notes like "(NCBI)")."""
+    for name in names:
+        for column, value in row.items():
+            if column.startswith(name):
+                return value.strip() or None
+    return None
+
+
+class OmimMirror:
+    """SQLite store of genemap2, mim2gene and cached text sections."""
+
+    def __init__(self, path: Union[str, Path] = OMIM_MIRROR_PATH, text_ttl_seconds: float = 30 * 24 * 3600):
+        self.path = Path(path)
+        self.text_ttl_seconds = text_ttl_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS genemap (
+                mim_number TEXT PRIMARY KEY,
+                chromosome TEXT,
+                genomic_start INTEGER,
+                genomic_end INTEGER,
+                cyto_location TEXT,
+                gene_symbols TEXT,
+                gene_name TEXT,
+                approved_symbol TEXT,
+                entrez_gene_id TEXT,
+                ensembl_gene_id TEXT,
+                phenotypes TEXT
+            );
+            CREATE TABLE IF NOT EXISTS phenotype_map (
+                mim_number TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                phenotype TEXT,
+                phenotype_mim_number TEXT,
+                mapping_key TEXT,
+                inheritance TEXT,
+                PRIMARY KEY (mim_number, position)
+            );
+            CREATE TABLE IF NOT EXISTS mim2gene (
+                mim_number TEXT PRIMARY KEY,
+                entry_type TEXT,
+                entrez_gene_id TEXT,
+                approved_symbol TEXT,
+                ensembl_gene_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_mim2gene_entrez ON mim2gene (entrez_gene_id);
+            CREATE TABLE IF NOT EXISTS text_sections (
+                mim_number TEXT NOT NULL,
+                section_name TEXT NOT NULL,
+                content TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (mim_number, section_name)
+            );
+        """)
+        self._conn.commit()
+
+    def import_genemap2(self, path: Union[str, Path]) -> int:
+        """Replace the gene map with the rows of genemap2.txt; returns the number of genes."""
+        genes, phenotypes = [], []
+        for row in _read_tsv(path):
+            mim_number = row.get("MIM Number", "").strip()
+            if not mim_number:
+                continue
+            genes.append((
+                mim_number, _column(row, "Chromosome"), _to_int(_column(row, "Genomic Position Start")),
+                _to_int(_column(row, "Genomic Position End")), _column(row, "Cyto Location"),
+                _column(row, "Gene/Locus And Other Related Symbols", "Gene Symbols"),
+                _column(row, "Gene Name"), _column(row, "Approved Gene Symbol", "Approved Symbol"),
+                _column(row, "Entrez Gene ID"), _column(row, "Ensembl Gene ID"), _column(row, "Phenotypes"),
+            ))
+            for position, entry in enumerate(parse_genemap_phenotypes(mim_number, _column(row, "Phenotypes") or "")):
+                phenotypes.append((mim_number, position, entry['phenotype'], entry['phenotypeMimNumber'],
+                                   entry['phenotypeMappingKey'], entry['phenotypeInheritance']))
+        with self._lock:
+            self._conn.execute("DELETE FROM genemap")
+            self._conn.execute("DELETE FROM phenotype_map")
+            self._conn.executemany("INSERT OR REPLACE INTO genemap VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", genes)
+            self._conn.executemany("INSERT OR REPLACE INTO phenotype_map VALUES (?, ?, ?, ?, ?, ?)", phenotypes)
+            self._conn.commit()
+        return len(genes)
+
+    def import_mim2gene(self, path: Union[str, Path]) -> int:
+        """Replace the MIM to gene table with the rows of mim2gene.txt; returns the number of rows."""
+        rows = [
+            (row.get("MIM Number", "").strip(), _column(row, "MIM Entry Type"), _column(row, "Entrez Gene ID"),
+             _column(row, "Approved Gene Symbol"), _column(row, "Ensembl Gene ID"))
+            for row in _read_tsv(path)
+        ]
+        rows = [row for row in rows if row[0]]
+        with self._lock:
+            self._conn.execute("DELETE FROM mim2gene")
+            self._conn.executemany("INSERT OR REPLACE INTO mim2gene VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def has_gene(self, mim_number: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM genemap WHERE mim_number = ?", (str(mim_number).strip(),)
+            ).fetchone() is not None
+
+    def phenotype_map(self, mim_number: str) -> Optional[List[Dict]]:
+        """Phenotype map of a gene entry, or None when the gene is not in the mirror."""
+        mim_number = str(mim_number).strip()
+        if not self.has_gene(mim_number):
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT phenotype, phenotype_mim_number, mapping_key, inheritance FROM phenotype_map "
+                "WHERE mim_number = ? ORDER BY position", (mim_number,)
+            ).fetchall()
+        return [
+            {'mimNumber': mim_number, 'phenotype': phenotype, 'phenotypeMimNumber': phenotype_mim_number,
+             'phenotypeMappingKey': mapping_key, 'phenotypeInheritance': inheritance}
+            for phenotype, phenotype_mim_number, mapping_key, inheritance in rows
+        ]
+
+    def gene(self, mim_number: str) -> Optional[Dict]:
+        """mim2gene row of a MIM number: entry type, Entrez and Ensembl ids and HGNC symbol."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mim_number, entry_type, entrez_gene_id, approved_symbol, ensembl_gene_id "
+                "FROM mim2gene WHERE mim_number = ?", (str(mim_number).strip(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("mim_number", "entry_type", "entrez_gene_id", "approved_symbol", "ensembl_gene_id"), row))
+
+    def text_section(self, mim_number: str, section_name: str, client: Optional[OmimClient] = None) -> Optional[str]:
+        """
+        A text section of an entry, e.g. "molecularGenetics", from the mirror,
+        fetched from the API (and stored) when it is missing or expired.
+        """
+        mim_number = str(mim_number).strip()
+        found, content = self._stored_section(mim_number, section_name)
+        if found:
+            return content
+
+        entry = (client or get_omim_client()).get_entry(mim_number, f"text:{section_name}")
+        if entry is None:
+            return None  # API failure: ask again next time
+        content = OmimResponse(entry).text_section(section_name)
+        self._store_section(mim_number, section_name, content)
+        return content
+
+    def text_section_and_phenotype_map(self,
+                                       mim_number: str,
+                                       section_name: str,
+                                       client: Optional[OmimClient] = None) -> Tuple[Optional[str], List[Dict]]:
+        """
+        A text section and the phenotype map of an entry, with at most one API
+        request: whatever the mirror lacks is fetched together.
+        """
+        mim_number = str(mim_number).strip()
+        found, content = self._stored_section(mim_number, section_name)
+        phenotype_maps = self.phenotype_map(mim_number)
+        includes = ([] if found else [f"text:{section_name}"]) + (["geneMap"] if phenotype_maps is None else [])
+        if not includes:
+            return content, phenotype_maps
+
+        entry = (client or get_omim_client()).get_entry(mim_number, includes)
+        if entry is None:
+            return content, phenotype_maps or []  # API failure: ask again next time
+        response = OmimResponse(entry)
+        if not found:
+            content = response.text_section(section_name)
+            self._store_section(mim_number, section_name, content)
+        if phenotype_maps is None:
+            phenotype_maps = response.phenotype_map()
+        return content, phenotype_maps
+
+    def _stored_section(self, mim_number: str, section_name: str) -> Tuple[bool, Optional[str]]:
+        """(found, content) of a text section stored within the TTL; content is None for a known-missing section."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM text_sections WHERE mim_number = ? AND section_name = ? AND fetched_at >= ?",
+                (mim_number, section_name, time.time() - self.text_ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, (row[0] if row[0] != _NO_SECTION else None)
+
+    def _store_section(self, mim_number: str, section_name: str, content: Optional[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO text_sections VALUES (?, ?, ?, ?)",
+                (mim_number, section_name, content if content is not None else _NO_SECTION, time.time())
+            )
+            self._conn.commit()
+
+
+def get_phenotype_map(mim_number: str, mirror: OmimMirror, client: Optional[OmimClient] = None) -> List[Dict]:
+    """Phenotype map from the mirror, or from the API's geneMap for genes the mirror lacks."""
+    phenotype_maps = mirror.phenotype_map(mim_number)
+    if phenotype_maps is not None:
+        return phenotype_maps
+    entry = (client or get_omim_client()).get_entry(mim_number, "geneMap")
+    return OmimResponse(entry).phenotype_map() if entry else []
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m backend.omim_mirror genemap2.txt [mim2gene.txt]")
+        sys.exit(1)
+    mirror = OmimMirror()
+    for path in sys.argv[1:]:
+        if "mim2gene" in Path(path).name:
+            print(f"Imported {mirror.import_mim2gene(path)} MIM numbers from {path}")
+        else:
+            print(f"Imported {mirror.import_genemap2(path)} genes from {path}")
+
+
+if __name__ == "__main__":
+    main()
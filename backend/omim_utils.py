@@ -1,40 +1,323 @@
+import io
+import json
 import os
+import sqlite3
+import threading
+import time
+from collections import deque
 import requests
 import xml.etree.ElementTree as ET
 import textwrap
-from typing import Dict, List
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
-def query_omim(mim_number: str, section_name: str) -> bytes:
-    omim_api_key = os.getenv("OMIM_API_KEY")
-    url = f"https://api.omim.org/api/entry?mimNumber={mim_number}&include={section_name}&apiKey={omim_api_key}"
-    
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.content
-    else:
-        print(f"Failed to retrieve data: {response.status_code}")
-        return None
+OMIM_API_URL = "https://api.omim.org/api/entry"
+# The entry endpoint accepts at most 20 MIM numbers per request.
+OMIM_MAX_ENTRIES_PER_REQUEST = 20
+OMIM_CACHE_PATH = Path(os.environ.get(
+    "OMIM_CACHE_PATH",
+    Path(__file__).resolve().parent.parent / "data/cache/omim.sqlite"
+))
+
+PHENOTYPE_MAP_FIELDS = ['mimNumber', 'phenotype', 'phenotypeMimNumber', 'phenotypeMappingKey', 'phenotypeInheritance']
+TEXT_SECTION_FIELDS = ['textSectionName', 'textSectionTitle', 'textSectionContent']
+
+class OmimResponse:
+    """
+    An OMIM entry API response in XML or JSON (`format=json`), parsed once.
+
+    `iter_entries` streams the entries as plain dicts with mimNumber,
+    textSections and phenotypeMap and keeps none of them: XML is read with
+    iterparse and each entry element is freed once it has been converted;
+    JSON is decoded whole, and each entry is released once it has been
+    converted. `text_section` and `phenotype_map` share one pass that keeps
+    only what they return: the first content of each section name and the
+    phenotype map rows.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.format = "json" if data.lstrip()[:1] in (b"{", b"[") else "xml"
+        self._sections = None  # section name -> first content, with None -> first section of any name
+        self._phenotypes = None
+
+    def iter_entries(self) -> Iterator[Dict]:
+        if self.format == "json":
+            return (_json_entry(entry) for entry in _iter_json_entries(self.data))
+        return (_xml_entry(element) for element in _iter_xml_entries(self.data))
+
+    @property
+    def entries(self) -> List[Dict]:
+        """Every entry, all held in memory; prefer `iter_entries` for large responses."""
+        return list(self.iter_entries())
+
+    def _scan(self):
+        if self._sections is not None:
+            return
+        sections, phenotypes = {}, []
+        for entry in self.iter_entries():
+            for section in entry['textSections']:
+                sections.setdefault(None, section['textSectionContent'])
+                sections.setdefault(section['textSectionName'], section['textSectionContent'])
+            phenotypes.extend(entry['phenotypeMap'])
+        self._sections, self._phenotypes = sections, phenotypes
+
+    def text_section(self, section_name: Optional[str] = None) -> Optional[str]:
+        """Content of the first text section (named `section_name`, if given)."""
+        self._scan()
+        return self._sections.get(section_name)
+
+    def phenotype_map(self) -> List[Dict]:
+        self._scan()
+        return list(self._phenotypes)
 
-def omim_xml_extract(data: bytes, content_title: str) -> str:
-    root = ET.fromstring(data)
-    text_section_content = root.find(f'.//{content_title}')
-    if text_section_content is None:
+    def find_text(self, tag: str) -> Optional[str]:
+        """Text of the first element (or JSON value) named `tag`, stopping as soon as it is found."""
+        if tag == 'textSectionContent':
+            return self.text_section()
+        if self.format == "json":
+            return _find_json_value(json.loads(self.data), tag)
+        for _, element in ET.iterparse(io.BytesIO(self.data)):
+            if element.tag == tag:
+                return element.text
         return None
-    return text_section_content.text
-
-def omim_xml_to_phenotype_map(data: bytes) -> List[Dict]:
-    root = ET.fromstring(data)
-    phenotype_maps = []
-    for phenotype_map in root.findall('.//phenotypeMap'):
-        phenotype_dict = {
-            'mimNumber': phenotype_map.find('mimNumber').text,
-            'phenotype': phenotype_map.find('phenotype').text,
-            'phenotypeMimNumber': phenotype_map.find('phenotypeMimNumber').text,
-            'phenotypeMappingKey': phenotype_map.find('phenotypeMappingKey').text,
-            'phenotypeInheritance': phenotype_map.find('phenotypeInheritance').text
+
+    def split(self) -> Dict[str, bytes]:
+        """One single-entry document per MIM number, in the response's format."""
+        documents = {}
+        if self.format == "json":
+            for entry in _iter_json_entries(self.data):
+                document = json.dumps({"omim": {"entryList": [{"entry": entry}]}}, ensure_ascii=False)
+                documents[str(entry.get("mimNumber"))] = document.encode("utf-8")
+        else:
+            for element in _iter_xml_entries(self.data):
+                mim_number = (element.findtext("mimNumber") or "").strip()
+                document = f"<omim><entryList>{ET.tostring(element, encoding='unicode')}</entryList></omim>"
+                documents[mim_number] = document.encode("utf-8")
+        documents.pop("", None)
+        documents.pop("None", None)
+        return documents
+
+
+def _iter_xml_entries(data: bytes) -> Iterator[ET.Element]:
+    """Complete <entry> elements of an XML response, each freed after it has been consumed."""
+    parents = []
+    for event, element in ET.iterparse(io.BytesIO(data), events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == "entry":
+            yield element
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+
+def _xml_entry(element: ET.Element) -> Dict:
+    return {
+        'mimNumber': (element.findtext('mimNumber') or '').strip() or None,
+        'textSections': [
+            {field: section.findtext(field) for field in TEXT_SECTION_FIELDS}
+            for section in element.iter('textSection')
+        ],
+        'phenotypeMap': [
+            {field: phenotype.findtext(field) for field in PHENOTYPE_MAP_FIELDS}
+            for phenotype in element.iter('phenotypeMap')
+        ],
+    }
+
+
+def _iter_json_entries(data: bytes) -> Iterator[Dict]:
+    entry_list = json.loads(data).get("omim", {}).get("entryList", [])
+    pending = deque(entry_list)
+    entry_list.clear()
+    # Drop each entry from the decoded document once it has been handed out.
+    while pending:
+        yield pending.popleft().get("entry", {})
+
+
+def _json_entry(entry: Dict) -> Dict:
+    phenotype_maps = entry.get("phenotypeMapList") or (entry.get("geneMap") or {}).get("phenotypeMapList") or []
+    return {
+        'mimNumber': _json_text(entry.get("mimNumber")),
+        'textSections': [
+            {field: _json_text(item.get("textSection", {}).get(field)) for field in TEXT_SECTION_FIELDS}
+            for item in entry.get("textSectionList") or []
+        ],
+        'phenotypeMap': [
+            {field: _json_text(item.get("phenotypeMap", {}).get(field)) for field in PHENOTYPE_MAP_FIELDS}
+            for item in phenotype_maps
+        ],
+    }
+
+
+def _json_text(value) -> Optional[str]:
+    # The JSON format returns numbers where the XML has text.
+    return None if value is None else str(value)
+
+
+def _find_json_value(data, key: str):
+    if isinstance(data, dict):
+        if key in data and not isinstance(data[key], (dict, list)):
+            return _json_text(data[key])
+        data = list(data.values())
+    if isinstance(data, list):
+        for item in data:
+            found = _find_json_value(item, key)
+            if found is not None:
+                return found
+    return None
+
+
+class OmimCache:
+    """On-disk cache of OMIM entries keyed by MIM number and requested include sections."""
+
+    def __init__(self, path: Union[str, Path], ttl_seconds: float = 30 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                mim_number TEXT NOT NULL,
+                include TEXT NOT NULL,
+                content BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (mim_number, include)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, mim_number: str, include: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM entries WHERE mim_number = ? AND include = ?",
+                (mim_number, include)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return row[0]
+
+    def put_many(self, include: str, entries: Dict[str, bytes]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (mim_number, include, content, created_at) VALUES (?, ?, ?, ?)",
+                ((mim_number, include, content, now) for mim_number, content in entries.items())
+            )
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+class OmimClient:
+    """
+    OMIM entry API client.
+
+    One request fetches several include sections for up to 20 MIM numbers,
+    over a pooled keep-alive session. Each entry is cached on disk as its
+    own single-entry document (XML, or JSON with format="json"), which
+    OmimResponse and the existing helpers read.
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 cache: Optional[OmimCache] = None,
+                 timeout=(5.0, 30.0),
+                 batch_size: int = OMIM_MAX_ENTRIES_PER_REQUEST,
+                 url: str = OMIM_API_URL,
+                 format: str = "xml"):
+        self.api_key = api_key
+        self.format = format
+        self.cache = cache
+        self.timeout = timeout
+        self.batch_size = min(batch_size, OMIM_MAX_ENTRIES_PER_REQUEST)
+        self.url = url
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4))
+
+    def get_entries(self, mim_numbers: Iterable[str], includes: Union[str, Iterable[str]]) -> Dict[str, bytes]:
+        """
+        Document of each MIM number with the `includes` sections, in the
+        client's format (XML, or JSON with format="json"); failed ones are left out.
+        """
+        include = includes if isinstance(includes, str) else ",".join(includes)
+        include = ",".join(sorted(part.strip() for part in include.split(",") if part.strip()))
+        entries = {}
+        missing = []
+        for mim_number in dict.fromkeys(str(number).strip() for number in mim_numbers):
+            cached = self.cache.get(mim_number, include) if self.cache is not None else None
+            if cached is not None:
+                entries[mim_number] = cached
+            else:
+                missing.append(mim_number)
+
+        for i in range(0, len(missing), self.batch_size):
+            fetched = self._fetch(missing[i:i + self.batch_size], include)
+            if self.cache is not None and fetched:
+                self.cache.put_many(include, fetched)
+            entries.update(fetched)
+        return entries
+
+    def get_entry(self, mim_number: str, includes: Union[str, Iterable[str]]) -> Optional[bytes]:
+        return self.get_entries([mim_number], includes).get(str(mim_number).strip())
+
+    def iter_entries(self, mim_numbers: Iterable[str], includes: Union[str, Iterable[str]]) -> Iterator[Dict]:
+        """Parsed entries, one batch of at most 20 in memory at a time."""
+        mim_numbers = list(mim_numbers)
+        for i in range(0, len(mim_numbers), self.batch_size):
+            for document in self.get_entries(mim_numbers[i:i + self.batch_size], includes).values():
+                yield from OmimResponse(document).iter_entries()
+
+    def _fetch(self, mim_numbers: List[str], include: str) -> Dict[str, bytes]:
+        params = {
+            "mimNumber": ",".join(mim_numbers),
+            "include": include,
+            "format": self.format,
+            "apiKey": self.api_key or os.getenv("OMIM_API_KEY"),
         }
-        phenotype_maps.append(phenotype_dict)
-    return phenotype_maps
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to retrieve data: {e}")
+            return {}
+        if response.status_code != 200:
+            print(f"Failed to retrieve data: {response.status_code}")
+            return {}
+        return OmimResponse(response.content).split()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_omim_client() -> OmimClient:
+    """Process-wide OMIM client with the on-disk cache (disabled by OMIM_CACHE_DISABLED)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = None if os.environ.get("OMIM_CACHE_DISABLED") else OmimCache(OMIM_CACHE_PATH)
+            _client = OmimClient(cache=cache)
+        return _client
+
+def query_omim(mim_number: str, section_name: str) -> bytes:
+    """XML of one entry with `section_name` (comma-separate several), or None on failure."""
+    return get_omim_client().get_entry(mim_number, section_name)
+
+def omim_xml_extract(data: Union[bytes, OmimResponse], content_title: str) -> str:
+    response = data if isinstance(data, OmimResponse) else OmimResponse(data)
+    return response.find_text(content_title)
+
+def omim_xml_to_phenotype_map(data: Union[bytes, OmimResponse]) -> List[Dict]:
+    response = data if isinstance(data, OmimResponse) else OmimResponse(data)
+    return response.phenotype_map()
 
 def list_of_dicts_to_markdown_table(data: List[Dict]) -> str:
     if not data:
@@ -0,0 +1,82 @@
+"""
+Benchmark the single-pass article parser against the legacy multi-pass one.
+
+Usage:
+    python -m backend.parser_benchmark saved_pages/*.html [--repeat 5]
+
+Each file is a saved PMC article page; its PMCID is taken from the file name.
+tests/data/PMC0000001.html is a small one, checked by tests/test_article_parser.py.
+For every page the legacy parser (html.parser), the single-pass parser with
+html.parser and, when installed, the single-pass parser with lxml are timed,
+and their article_data is checked against the legacy output.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from backend.article_parser import parse_article_html
+from backend.publication_extractor import PubMedExtractor
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+
+def time_parser(parse: Callable[[str, str], Dict], html: str, pmcid: str, repeat: int):
+    """Return (best seconds, article_data) over `repeat` runs."""
+    best = float("inf")
+    article_data = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        article_data = parse(html, pmcid)
+        best = min(best, time.perf_counter() - start)
+    return best, article_data
+
+
+def diff_fields(expected: Dict, actual: Dict) -> List[str]:
+    """Names of the article_data fields that differ."""
+    return [key for key in expected if expected[key] != actual.get(key)]
+
+
+def run_benchmark(paths: List[Path], repeat: int = 5) -> bool:
+    extractor = PubMedExtractor()
+    parsers = {"single-pass/html.parser": lambda html, pmcid: parse_article_html(html, pmcid, 'html.parser')}
+    if HAS_LXML:
+        parsers["single-pass/lxml"] = lambda html, pmcid: parse_article_html(html, pmcid, 'lxml')
+
+    all_match = True
+    totals = {"legacy": 0.0, **{name: 0.0 for name in parsers}}
+    for path in paths:
+        html = path.read_text(encoding="utf-8")
+        pmcid = extractor.extract_pmcid(path.name) or path.stem
+        legacy_time, expected = time_parser(extractor.parse_html_legacy, html, pmcid, repeat)
+        totals["legacy"] += legacy_time
+        print(f"{path.name}: {len(expected['sections'])} sections, legacy {legacy_time * 1000:.1f} ms")
+        for name, parse in parsers.items():
+            elapsed, actual = time_parser(parse, html, pmcid, repeat)
+            totals[name] += elapsed
+            mismatched = diff_fields(expected, actual)
+            all_match = all_match and not mismatched
+            status = "identical" if not mismatched else f"DIFFERS in {', '.join(mismatched)}"
+            print(f"    {name:<24} {elapsed * 1000:8.1f} ms  x{legacy_time / elapsed:5.1f}  {status}")
+
+    print("\nTotal:")
+    for name, elapsed in totals.items():
+        print(f"    {name:<24} {elapsed * 1000:8.1f} ms  x{totals['legacy'] / elapsed:5.1f}")
+    return all_match
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="+", type=Path, help="Saved PMC article HTML files")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per parser, the best one is reported")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.pages, args.repeat) else 1)
+
+
+if __name__ == "__main__":
+    main()
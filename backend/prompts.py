@@ -1,3 +1,20 @@
+from typing import List, Optional, Tuple
+
+# Templates whose static guidance is sent as its own system message ahead of
+# the per-request part, so providers can cache it as a prompt prefix:
+# {template: (system, human)}. The template itself stays a plain string that
+# can be formatted, estimated and used as a cache key like any other.
+PROMPT_PARTS = {}
+# Anthropic cache_control and OpenAI's automatic caching both ignore prefixes
+# shorter than this, so a registered system part must be at least this long.
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+def register_prompt_parts(system: str, human: str) -> str:
+    """Register a template split into static guidance and a variable part; returns the whole template."""
+    template = system.rstrip("\n") + "\n\n" + human
+    PROMPT_PARTS[template] = (system, human)
+    return template
+
 
 TEST_TEMPLATE = """Hello AI, You will be provided with a research article and a genetic variant to analyze. The article is:
 <RESEARCH_ARTICLE>
@@ -19,19 +36,11 @@ GENE_EXPLAINATION_TEMPLATE = """作为遗传学专家，你的职责是阅读基
 <<表型关系/phenotype map>>: {phenotype}
 <<基因信息/molecular genetics>>:{molecular_genetics}"""
 
-PUBMED_ACMG_READER_TEMPLATE = """You are an AI agent tasked with classifying inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines.
+PUBMED_ACMG_READER_SYSTEM = """You are an AI agent tasked with classifying inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines.
 You are tasked with analyzing a scientific article to determine if certain conditions exist regarding a specific genetic variant. 
 Follow these steps carefully:
 
-1. You will be provided with a research article and a genetic variant to analyze. The article is:
-<RESEARCH_ARTICLE>
-{pubmed_article}
-</RESEARCH_ARTICLE>
-
-The genetic variant to analyze is:
-<GENETIC_VARIANT>
-{genetic_variant}
-</GENETIC_VARIANT>
+1. You will be provided with a research article and a genetic variant to analyze, after these instructions.
 
 2. Read the full text of the article associated with the provided PubMed ID. Pay close attention to any information related to the specified genetic variant.
 
@@ -63,6 +72,17 @@ f) Trans or cis occurrence:
 g) Alternative molecular basis:
    - Variant found in a case with an alternate molecular basis for disease.
 
+   Evidence to look for under each condition (the related ACMG criteria are given for reference only; report what the article shows and do not assign criteria or a final classification):
+   - De novo occurrence (PS2 when parentage is confirmed, PM6 when assumed): how maternity and paternity were established (trio sequencing, marker analysis or not at all), whether the phenotype fits the disease of the gene, and how many unrelated patients carry a de novo occurrence.
+   - Functional studies (PS3 supportive, BS3 not supportive): the assay (enzyme activity, protein expression or localisation, minigene or patient RNA splicing assay, cell or animal model), whether wild-type and known pathogenic or benign variants were tested alongside, the number of replicates, and whether the assay reflects the disease mechanism. Results from patient-derived material weigh more than overexpression systems.
+   - Prevalence and observation (PS4, PM2, BS1): the number of affected carriers and controls, odds ratios with confidence intervals, the ancestry of the cohorts, and any allele frequency the article cites from population databases such as gnomAD.
+   - Cosegregation (PP1 supportive, BS4 not supportive): the number of affected carriers, unaffected carriers and affected non-carriers, and the number of informative meioses in each family. Say whether the pedigree is shown.
+   - Phenotype specificity (PP4): the clinical findings and any biochemical or imaging markers specific to the disease, such as enzyme or metabolite levels.
+   - Trans or cis occurrence (PM3, BP2): the other variant and how it is classified, whether the phase was determined by parental testing or by sequencing reads, and whether the patient is homozygous. Note consanguinity when reported.
+   - Alternative molecular basis (BP5): the other variant or diagnosis that explains the disease in the patient.
+
+   Keep the specified variant apart from other variants in the same gene or at the same amino acid residue: a different nucleotide change giving the same amino acid change, or a different amino acid change at the same residue, is worth noting but is not the specified variant. Articles may use legacy nomenclature, such as numbering from the mature protein or old cDNA reference sequences, so check that positions and residues agree with the specified variant before attributing findings to it. Quote the numbers the article reports and name the table or figure they come from.
+
 4. For each condition, provide a brief explanation of your findings. If the information is not available or not applicable, state so clearly.
 
 5. Present your analysis in the following markdown format:
@@ -96,6 +116,87 @@ g) Alternative molecular basis:
 Remember to base your analysis solely on the information provided in the article associated with the given PubMed ID. Do not make assumptions or include information from external sources.
 """
 
+PUBMED_ACMG_READER_HUMAN = """The article is:
+<RESEARCH_ARTICLE>
+{pubmed_article}
+</RESEARCH_ARTICLE>
+
+The genetic variant to analyze is:
+<GENETIC_VARIANT>
+{genetic_variant}
+</GENETIC_VARIANT>
+"""
+
+PUBMED_ACMG_READER_TEMPLATE = register_prompt_parts(PUBMED_ACMG_READER_SYSTEM, PUBMED_ACMG_READER_HUMAN)
+
+PUBMED_ACMG_CHUNK_READER_TEMPLATE = """You are an AI agent helping to classify inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines.
+You will be given one part of a longer scientific article. Other parts are analyzed separately and all findings will be merged later, so only report what this part says.
+
+This is part {chunk_index} of {chunk_count} of the article:
+<ARTICLE_PART>
+{pubmed_article}
+</ARTICLE_PART>
+
+The genetic variant to analyze is:
+<GENETIC_VARIANT>
+{genetic_variant}
+</GENETIC_VARIANT>
+
+For each of the following conditions, quote or closely paraphrase the evidence in this part that concerns the genetic variant, including patient or family identifiers and numbers. Write "No evidence in this part." when there is none. Do not draw conclusions that need the rest of the article.
+
+**de_novo_occurrence**:
+**functional_studies**:
+**prevalence_and_observation**:
+**cosegregation**:
+**phenotype_specificity**:
+**trans_cis_occurrence**:
+**alternative_molecular_basis**:
+"""
+
+PUBMED_ACMG_REDUCE_TEMPLATE = """You are an AI agent tasked with classifying inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines.
+A long scientific article was split into parts, and the evidence each part contains about a genetic variant was extracted separately. Merge these partial findings into one analysis of the whole article.
+
+The genetic variant is:
+<GENETIC_VARIANT>
+{genetic_variant}
+</GENETIC_VARIANT>
+
+The partial findings, in article order, are:
+<PARTIAL_FINDINGS>
+{partial_findings}
+</PARTIAL_FINDINGS>
+
+Combine the evidence for each condition, removing duplicates (the same patient or family may be described in several parts) and resolving parts that only make sense together. If no part has evidence for a condition, state so clearly.
+
+Present your analysis in the following markdown format:
+
+### Analysis
+**de_novo_occurrence**:
+[Your findings for de novo occurrence]
+
+**functional_studies**:
+[Your findings for functional studies]
+
+**prevalence_and_observation**:
+[Your findings for prevalence and observation]
+
+**cosegregation**:
+[Your findings for cosegregation]
+
+**phenotype_specificity**:
+[Your findings for phenotype specificity]
+
+**trans_cis_occurrence**:
+[Your findings for trans or cis occurrence]
+
+**alternative_molecular_basis**:
+[Your findings for alternative molecular basis]
+
+After presenting your analysis, provide a brief summary of the most significant findings regarding the genetic variant in relation to the conditions analyzed in Chinese. Present this summary below a H3 header "Summary".
+
+Base your analysis solely on the partial findings. Do not make assumptions or include information from external sources.
+"""
+
 ACMG_CLASSIFIER_TEMPLATE = """You are an AI agent tasked with analyzing genetic variant annotations and providing ACMG classification insights.
 
 The variant to analyze is:
@@ -127,64 +228,7 @@ Please analyze the annotation data and provide:
 Present your analysis in markdown format with appropriate headers and bullet points.
 """
 
-ACMG_CLASSIFIER_COMPLETE_TEMPLATE = """
-You are an AI agent tasked with classifying inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines. Your goal is to analyze the provided variant information and determine its pathogenicity classification.
-
-First, familiarize yourself with the ACMG guidelines for variant classification:
-
-<ACMG_GUIDELINES>
-| Category | Code | Description/Criteria |
-|----------|------|-------------------|
-| Very Strong | PVS1 | Null variant (nonsense, frameshift, canonical ±1/2 splice sites, initiation codon, single/multiexon deletions) in gene where LOF is known disease mechanism |
-| Strong | PS1 | Same amino acid change as previously established pathogenic variant regardless of nucleotide change |
-| | PS2 | De novo (both maternity and paternity confirmed) in patient with disease and no family history |
-| | PS3 | Well-established functional studies show damaging effect |
-| | PS4 | Variant prevalence in affected individuals significantly increased vs controls |
-| Moderate | PM1 | Located in mutational hot spot and/or critical functional domain |
-| | PM2 | Absent from controls or at extremely low frequency if recessive |
-| | PM3 | For recessive disorders, detected in trans with pathogenic variant |
-| | PM4 | Protein length changes due to in-frame deletions/insertions or stop-loss variants |
-| | PM5 | Novel missense change at amino acid where different missense change is known to be pathogenic |
-| | PM6 | Assumed de novo, but without confirmation of paternity and maternity |
-| Supporting | PP1 | Cosegregation with disease in multiple affected family members |
-| | PP2 | Missense variant in gene with low rate of benign missense variation |
-| | PP3 | Multiple lines of computational evidence support deleterious effect |
-| | PP4 | Patient's phenotype/family history specific for disease with single genetic etiology |
-| | PP5 | Reputable source reports variant as pathogenic |
-
-Important Caveats and Notes:
-1. Beware of genes where LOF is not a known disease mechanism
-2. Use caution with splice variants at extreme 3' end of gene
-3. For statistical information (PS4), relative risk should be >5.0
-4. Population data for insertions/deletions may be poorly called by next-generation sequencing
-5. Multiple computational algorithms should not be counted as independent criteria
-6. Functional studies should be validated and reproducible in clinical diagnostic laboratory settings
-
-| Category | Code | Description/Criteria |
-|----------|------|-------------------|
-| Stand-alone | BA1 | Allele frequency is >5% in Exome Sequencing Project, 1000 Genomes Project, or Exome Aggregation Consortium |
-| Strong | BS1 | Allele frequency is greater than expected for disorder |
-| | BS2 | Observed in healthy adult for recessive (homozygous), dominant (heterozygous), or X-linked (hemizygous) disorder with full penetrance expected at early age |
-| | BS3 | Well-established functional studies show no damaging effect on protein function or splicing |
-| | BS4 | Lack of segregation in affected members of a family |
-| Supporting | BP1 | Missense variant in gene for which primarily truncating variants cause disease |
-| | BP2 | Observed in trans with pathogenic variant for fully penetrant dominant gene/disorder or observed cis with a pathogenic variant in any inheritance pattern |
-| | BP3 | In-frame insertions/deletions in repetitive region without known function |
-| | BP4 | Multiple lines of computational evidence suggest no impact on gene or product |
-| | BP5 | Variant found in case with alternate molecular basis for disease |
-| | BP6 | Reputable source reports variant as benign |
-| | BP7 | A synonymous/silent variant for which splicing prediction algorithms predict no impact |
-
-Important Caveats:
-1. For common phenotypes (e.g., cancer, epilepsy), lack of segregation among affected individuals should be interpreted with caution
-2. Families may have more than one pathogenic variant contributing to autosomal dominant disease
-3. For computational evidence (BP4), because many algorithms use similar input, each algorithm cannot be counted independently
-4. Evidence from reputable sources should be available to the laboratory to perform independent evaluation
-</ACMG_GUIDELINES>
-
-Now, you will be presented with information about a genetic variant in json format to classify:
-
-The variant to analyze is:
+ACMG_CLASSIFIER_COMPLETE_HUMAN = """The variant to analyze is:
 <VARIANT>
 {genetic_variant}
 </VARIANT>
@@ -194,11 +238,66 @@ The variant annotation data is:
 {annotation}
 </ANNOTATION>
 
-To classify the variant, follow these steps:
+Classify this variant following the steps above.
+"""
+
+# The ACMG classifier guidance, split into modules so a prompt only carries the
+# criteria that can apply to the variant (see compose_acmg_classifier_template).
+ACMG_CLASSIFIER_INTRODUCTION = """You are an AI agent tasked with classifying inherited genetic variants based on the American College of Medical Genetics and Genomics (ACMG) guidelines. Your goal is to analyze the provided variant information and determine its pathogenicity classification.
 
-1. Carefully analyze the variant information against each ACMG criterion.
-1.1 Follow the decision trees for PVS1 criteria.
-<PVS1_decision_tree>
+First, familiarize yourself with the ACMG guidelines for variant classification:
+"""
+
+# (code, category, criterion), in guideline order.
+ACMG_PATHOGENIC_CRITERIA = [
+    ("PVS1", "Very Strong", "Null variant (nonsense, frameshift, canonical ±1/2 splice sites, initiation codon, single/multiexon deletions) in gene where LOF is known disease mechanism"),
+    ("PS1", "Strong", "Same amino acid change as previously established pathogenic variant regardless of nucleotide change"),
+    ("PS2", "Strong", "De novo (both maternity and paternity confirmed) in patient with disease and no family history"),
+    ("PS3", "Strong", "Well-established functional studies show damaging effect"),
+    ("PS4", "Strong", "Variant prevalence in affected individuals significantly increased vs controls"),
+    ("PM1", "Moderate", "Located in mutational hot spot and/or critical functional domain"),
+    ("PM2", "Moderate", "Absent from controls or at extremely low frequency if recessive"),
+    ("PM3", "Moderate", "For recessive disorders, detected in trans with pathogenic variant"),
+    ("PM4", "Moderate", "Protein length changes due to in-frame deletions/insertions or stop-loss variants"),
+    ("PM5", "Moderate", "Novel missense change at amino acid where different missense change is known to be pathogenic"),
+    ("PM6", "Moderate", "Assumed de novo, but without confirmation of paternity and maternity"),
+    ("PP1", "Supporting", "Cosegregation with disease in multiple affected family members"),
+    ("PP2", "Supporting", "Missense variant in gene with low rate of benign missense variation"),
+    ("PP3", "Supporting", "Multiple lines of computational evidence support deleterious effect"),
+    ("PP4", "Supporting", "Patient's phenotype/family history specific for disease with single genetic etiology"),
+    ("PP5", "Supporting", "Reputable source reports variant as pathogenic"),
+]
+ACMG_BENIGN_CRITERIA = [
+    ("BA1", "Stand-alone", "Allele frequency is >5% in Exome Sequencing Project, 1000 Genomes Project, or Exome Aggregation Consortium"),
+    ("BS1", "Strong", "Allele frequency is greater than expected for disorder"),
+    ("BS2", "Strong", "Observed in healthy adult for recessive (homozygous), dominant (heterozygous), or X-linked (hemizygous) disorder with full penetrance expected at early age"),
+    ("BS3", "Strong", "Well-established functional studies show no damaging effect on protein function or splicing"),
+    ("BS4", "Strong", "Lack of segregation in affected members of a family"),
+    ("BP1", "Supporting", "Missense variant in gene for which primarily truncating variants cause disease"),
+    ("BP2", "Supporting", "Observed in trans with pathogenic variant for fully penetrant dominant gene/disorder or observed cis with a pathogenic variant in any inheritance pattern"),
+    ("BP3", "Supporting", "In-frame insertions/deletions in repetitive region without known function"),
+    ("BP4", "Supporting", "Multiple lines of computational evidence suggest no impact on gene or product"),
+    ("BP5", "Supporting", "Variant found in case with alternate molecular basis for disease"),
+    ("BP6", "Supporting", "Reputable source reports variant as benign"),
+    ("BP7", "Supporting", "A synonymous/silent variant for which splicing prediction algorithms predict no impact"),
+]
+# (criterion the caveat is about, caveat).
+ACMG_PATHOGENIC_CAVEATS = [
+    ("PVS1", "Beware of genes where LOF is not a known disease mechanism"),
+    ("PVS1", "Use caution with splice variants at extreme 3' end of gene"),
+    ("PS4", "For statistical information (PS4), relative risk should be >5.0"),
+    ("PM2", "Population data for insertions/deletions may be poorly called by next-generation sequencing"),
+    ("PP3", "Multiple computational algorithms should not be counted as independent criteria"),
+    ("PS3", "Functional studies should be validated and reproducible in clinical diagnostic laboratory settings"),
+]
+ACMG_BENIGN_CAVEATS = [
+    ("BS4", "For common phenotypes (e.g., cancer, epilepsy), lack of segregation among affected individuals should be interpreted with caution"),
+    ("BS4", "Families may have more than one pathogenic variant contributing to autosomal dominant disease"),
+    ("BP4", "For computational evidence (BP4), because many algorithms use similar input, each algorithm cannot be counted independently"),
+    ("BP6", "Evidence from reputable sources should be available to the laboratory to perform independent evaluation"),
+]
+
+PVS1_DECISION_TREE = """<PVS1_decision_tree>
 Nonsense or Frameshift:
 If predicted to undergo NMD (Nonsense-Mediated Decay):
 If exon is present in biologically-relevant transcripts → PVS1
@@ -224,11 +323,9 @@ No known alternative start codon:
 ≥1 pathogenic variant(s) upstream → PVS1_Moderate
 No pathogenic variant(s) upstream → PVS1_Supp
 Different functional transcript uses alternative start codon → N/A
-</PVS1_decision_tree>
+</PVS1_decision_tree>"""
 
-1.2 Do not use criteria PP5 and BP6.
-1.3 Do not use any information from ClinVar.
-2. Use a scratchpad to document your thought process and evidence for each criterion.
+ACMG_CLASSIFIER_OUTPUT = """2. Use a scratchpad to document your thought process and evidence for each criterion.
 3. Determine which criteria are met and their strength (very strong, strong, moderate, or supporting).
 4. Based on the combination of criteria met, determine the final classification (pathogenic, likely pathogenic, variant of uncertain significance, likely benign, or benign).
 5. Provide a justification for your classification.
@@ -251,6 +348,99 @@ After completing your analysis, provide your final classification and justificat
 Remember to be thorough in your analysis and clear in your explanation. If there is insufficient information to classify the variant confidently, state this in your justification and classify it as a variant of uncertain significance.
 """
 
+# Criteria that cannot apply to a variant of a consequence class (see
+# annotation_projection.consequence_class); "other" keeps all of them. A
+# synonymous variant also skips de novo (PS2) and case-control (PS4) evidence,
+# which in practice is only reported for coding changes; PS3 stays for RNA
+# studies of splicing, and the benign strong criteria are how most synonymous
+# variants are classified.
+ACMG_CRITERIA_NOT_APPLICABLE = {
+    "null": ["PS1", "PM4", "PM5", "PP2", "BP1", "BP3", "BP7"],
+    "missense": ["PVS1", "PM4", "BP3", "BP7"],
+    "inframe": ["PVS1", "PS1", "PM5", "PP2", "BP1", "BP7"],
+    "synonymous": ["PVS1", "PS1", "PS2", "PS4", "PM1", "PM4", "PM5", "PP2", "BP1", "BP3"],
+    "other": [],
+}
+CONSEQUENCE_CLASS_NAMES = {
+    "null": "a null (nonsense, frameshift, canonical splice site or initiation codon)",
+    "missense": "a missense",
+    "inframe": "an in-frame insertion/deletion or stop-loss",
+    "synonymous": "a synonymous",
+}
+
+
+def _criteria_table(criteria: List[Tuple[str, str, str]]) -> str:
+    rows = ["| Category | Code | Description/Criteria |", "|----------|------|-------------------|"]
+    previous_category = None
+    for code, category, criterion in criteria:
+        label = f" {category} " if category != previous_category else " "
+        rows.append(f"|{label}| {code} | {criterion} |")
+        previous_category = category
+    return "\n".join(rows)
+
+
+def _caveat_list(caveats: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{number}. {caveat}" for number, (_, caveat) in enumerate(caveats, 1))
+
+
+def _compose_acmg_classifier_system(consequence_class: str = "other", inheritance: Optional[str] = None) -> str:
+    skipped = list(ACMG_CRITERIA_NOT_APPLICABLE.get(consequence_class, []))
+    if inheritance == "dominant":
+        skipped.append("PM3")  # only for recessive disorders
+    pathogenic = [criterion for criterion in ACMG_PATHOGENIC_CRITERIA if criterion[0] not in skipped]
+    benign = [criterion for criterion in ACMG_BENIGN_CRITERIA if criterion[0] not in skipped]
+    pathogenic_caveats = [caveat for caveat in ACMG_PATHOGENIC_CAVEATS if caveat[0] not in skipped]
+    benign_caveats = [caveat for caveat in ACMG_BENIGN_CAVEATS if caveat[0] not in skipped]
+
+    sections = [ACMG_CLASSIFIER_INTRODUCTION, "<ACMG_GUIDELINES>", _criteria_table(pathogenic), ""]
+    if pathogenic_caveats:
+        sections += ["Important Caveats and Notes:", _caveat_list(pathogenic_caveats), ""]
+    sections += [_criteria_table(benign), ""]
+    if benign_caveats:
+        sections += ["Important Caveats:", _caveat_list(benign_caveats)]
+    sections += ["</ACMG_GUIDELINES>", ""]
+    if skipped:
+        reasons = []
+        if consequence_class in CONSEQUENCE_CLASS_NAMES:
+            reasons.append(f"the variant is {CONSEQUENCE_CLASS_NAMES[consequence_class]} variant")
+        if inheritance == "dominant":
+            reasons.append("the gene is associated with dominant disorders only")
+        sections += [f"Criteria {', '.join(skipped)} are left out because {' and '.join(reasons)}; do not apply them.", ""]
+    sections += [
+        "You will be presented with information about a genetic variant in json format to classify, after these instructions.",
+        "",
+        "To classify the variant, follow these steps:",
+        "",
+        "1. Carefully analyze the variant information against each ACMG criterion.",
+    ]
+    rules = ["Do not use criteria PP5 and BP6.", "Do not use any information from ClinVar."]
+    if "PVS1" not in skipped:
+        rules.insert(0, f"Follow the decision trees for PVS1 criteria.\n{PVS1_DECISION_TREE}\n")
+    sections += [f"1.{number} {rule}" for number, rule in enumerate(rules, 1)]
+    return "\n".join(sections) + "\n" + ACMG_CLASSIFIER_OUTPUT
+
+
+def compose_acmg_classifier_template(consequence_class: str = "other", inheritance: Optional[str] = None) -> str:
+    """
+    ACMG classifier template with only the guideline modules that can apply.
+
+    `consequence_class` is one of ACMG_CRITERIA_NOT_APPLICABLE ("null",
+    "missense", "inframe", "synonymous" or "other", which keeps everything);
+    an `inheritance` of "dominant" also drops PM3. Each combination is a
+    stable system prefix of its own, so it is prompt-cached like the full one.
+    A composition that is not shorter than the full guidance, such as "other"
+    with a dominant gene, returns ACMG_CLASSIFIER_COMPLETE_TEMPLATE instead.
+    """
+    system = _compose_acmg_classifier_system(consequence_class, inheritance)
+    if len(system) >= len(ACMG_CLASSIFIER_COMPLETE_SYSTEM):
+        return ACMG_CLASSIFIER_COMPLETE_TEMPLATE
+    return register_prompt_parts(system, ACMG_CLASSIFIER_COMPLETE_HUMAN)
+
+
+ACMG_CLASSIFIER_COMPLETE_SYSTEM = _compose_acmg_classifier_system()
+
+ACMG_CLASSIFIER_COMPLETE_TEMPLATE = register_prompt_parts(ACMG_CLASSIFIER_COMPLETE_SYSTEM, ACMG_CLASSIFIER_COMPLETE_HUMAN)
+
 PVS1_EXPERT_TEMPLATE = """You are tasked with performing a comprehensive ACMG PVS1 rule assessment based on the PVS1 decision tree. You will be provided with variant annotation, gene annotation, and transcript annotation data. Your goal is to analyze this information and determine the appropriate PVS1 classification.
 
 First, review the provided information:
@@ -1,13 +1,53 @@
+import asyncio
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import re
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.article_parser import parse_article_html, table_to_markdown
+
+# Bump whenever the extracted article_data changes so cached parses are redone.
+PARSER_VERSION = 2
+
+class HostRateLimiter:
+    """Space out request start times per host to at most `requests_per_second`."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+def _parse_payload(payload: Tuple[str, str, Optional[str]]) -> Tuple[str, Dict]:
+    """Process-pool worker: parse one (pmcid, html, features) payload into article data."""
+    pmcid, html, features = payload
+    try:
+        return pmcid, parse_article_html(html, pmcid, features)
+    except Exception as e:
+        return pmcid, {"error": f"Failed to parse article: {str(e)}"}
 
 class PubMedExtractor:
-    def __init__(self):
+    def __init__(self, cache=None, features=None):
         self.base_url = "https://www.ncbi.nlm.nih.gov/pmc/articles/"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # Optional ArticleCache; when set, repeat lookups skip the download and the parse.
+        self.cache = cache
+        # BeautifulSoup tree builder for parse_html; defaults to lxml when installed.
+        self.features = features
 
     def extract_pmcid(self, url):
         """Extract PMCID from URL."""
@@ -20,73 +60,237 @@ class PubMedExtractor:
         if not pmcid:
             return {"error": "Invalid PMC URL"}
 
+        html = None
+        if self.cache is not None:
+            html, article_data = self.cache.lookup(pmcid, PARSER_VERSION)
+            if article_data is not None:
+                return article_data
+
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Extract article metadata
-            article_data = {
-                "pmcid": pmcid,
-                "pmid": self._get_pmid(soup),
-                "title": self._get_title(soup),
-                "abstract": self._get_abstract(soup),
-                "keywords": self._get_keywords(soup),
-                "sections": self._get_sections(soup),
-                "figures": self._get_figures(soup),
-                "tables": self._get_tables(soup),
-                "references": self._get_references(soup),
-                "acknowledgments": self._get_acknowledgments(soup)
-            }
+            if html is None:
+                html = self._fetch_html(url)
+        except requests.exceptions.RequestException as e:
+            return {"error": f"Failed to retrieve article: {str(e)}"}
+
+        article_data = self.parse_html(html, pmcid)
+        if self.cache is not None:
+            self.cache.put(pmcid, html, article_data, PARSER_VERSION)
+        return article_data
+
+    def _fetch_html(self, url, session=None, timeout=None):
+        """Download the raw HTML of an article page."""
+        response = (session or requests).get(url, headers=self.headers, timeout=timeout)
+        response.raise_for_status()
+        return response.text
+
+    async def get_articles(self,
+                           urls: Iterable[str],
+                           max_concurrency: int = 8,
+                           requests_per_second: float = 3.0,
+                           timeout: float = 30.0,
+                           executor: Optional[Executor] = None,
+                           max_in_flight: Optional[int] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Fetch and parse many PMC articles concurrently.
+
+        Yields (url, article_data) pairs in completion order. At most
+        `max_concurrency` downloads run at once, and requests to the same host
+        start no more than `requests_per_second` apart (NCBI allows 3/s without
+        an API key). A failing URL yields an {"error": ...} dict like
+        get_article_content and does not affect the rest of the batch.
+
+        Parsing runs in a worker thread, or in `executor` when one is given
+        (e.g. the ProcessPoolExecutor from make_parse_pool) so that it overlaps
+        with the downloads on all cores. At most `max_in_flight` pages
+        (default twice `max_concurrency`) are held between download and parse.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        in_flight = asyncio.Semaphore(max_in_flight or 2 * max_concurrency)
+        limiter = HostRateLimiter(requests_per_second)
+        with requests.Session() as session:
+            adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
 
-            return article_data
+            tasks = [
+                asyncio.ensure_future(
+                    self._get_article_async(url, session, semaphore, in_flight, limiter, timeout, executor)
+                )
+                for url in urls
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
 
+    def fetch_articles(self, urls: Iterable[str], **kwargs) -> Dict[str, Dict]:
+        """Blocking wrapper around get_articles returning {url: article_data}."""
+        async def collect():
+            return {url: article_data async for url, article_data in self.get_articles(urls, **kwargs)}
+        return asyncio.run(collect())
+
+    async def _get_article_async(self, url, session, semaphore, in_flight, limiter, timeout, executor):
+        pmcid = self.extract_pmcid(url)
+        if not pmcid:
+            return url, {"error": "Invalid PMC URL"}
+
+        try:
+            html = None
+            if self.cache is not None:
+                html, article_data = await asyncio.to_thread(self.cache.lookup, pmcid, PARSER_VERSION)
+                if article_data is not None:
+                    return url, article_data
+
+            async with in_flight:
+                if html is None:
+                    async with semaphore:
+                        await limiter.wait(urlparse(url).netloc)
+                        html = await asyncio.to_thread(self._fetch_html, url, session, timeout)
+
+                if executor is None:
+                    article_data = await asyncio.to_thread(self.parse_html, html, pmcid)
+                else:
+                    loop = asyncio.get_running_loop()
+                    _, article_data = await loop.run_in_executor(executor, _parse_payload, (pmcid, html, self.features))
+                    if "error" in article_data:
+                        return url, article_data
+
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, pmcid, html, article_data, PARSER_VERSION)
+            return url, article_data
         except requests.exceptions.RequestException as e:
-            return {"error": f"Failed to retrieve article: {str(e)}"}
+            return url, {"error": f"Failed to retrieve article: {str(e)}"}
+        except Exception as e:
+            return url, {"error": f"Failed to parse article: {str(e)}"}
+
+    @staticmethod
+    def make_parse_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+        """Process pool for parse_articles/get_articles; one worker per core by default."""
+        return ProcessPoolExecutor(max_workers=max_workers)
+
+    def parse_articles(self,
+                       payloads: Iterable[Tuple[str, str]],
+                       executor: Optional[Executor] = None,
+                       max_workers: Optional[int] = None,
+                       max_in_flight: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Parse already-fetched (pmcid, html) payloads across a process pool.
+
+        Yields (pmcid, article_data) in completion order. `payloads` is consumed
+        lazily and at most `max_in_flight` pages (default twice `max_workers`,
+        or twice the core count) are submitted at once, so memory stays bounded
+        even for a generator fed by a running download. Pass `executor` to
+        reuse a pool across calls, with `max_workers` set to its size.
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        own_executor = executor is None
+        if own_executor:
+            executor = self.make_parse_pool(max_workers)
+        if max_in_flight is None:
+            max_in_flight = 2 * max_workers
+
+        pending = set()
+        # HTML of in-flight pages, kept only when it has to be written to the cache.
+        cached_html = {}
+        try:
+            for pmcid, html in payloads:
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._collect_parsed(done, cached_html)
+                future = executor.submit(_parse_payload, (pmcid, html, self.features))
+                if self.cache is not None:
+                    cached_html[future] = html
+                pending.add(future)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._collect_parsed(done, cached_html)
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _collect_parsed(self, futures, cached_html):
+        for future in futures:
+            pmcid, article_data = future.result()
+            html = cached_html.pop(future, None)
+            if html is not None and "error" not in article_data:
+                self.cache.put(pmcid, html, article_data, PARSER_VERSION)
+            yield pmcid, article_data
+
+    def parse_html(self, html, pmcid):
+        """Parse the HTML of a PMC article page into article data."""
+        return parse_article_html(html, pmcid, self.features)
+
+    def parse_html_legacy(self, html, pmcid):
+        """
+        Multi-pass reference parser, kept to check parse_html against.
+        See backend/parser_benchmark.py.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Extract article metadata
+        article_data = {
+            "pmcid": pmcid,
+            "pmid": self._get_pmid(soup),
+            "title": self._get_title(soup),
+            "abstract": self._get_abstract(soup),
+            "keywords": self._get_keywords(soup),
+            "sections": self._get_sections(soup),
+            "figures": self._get_figures(soup),
+            "tables": self._get_tables(soup),
+            "references": self._get_references(soup),
+            "acknowledgments": self._get_acknowledgments(soup)
+        }
+
+        return article_data
 
     def get_article_content_plain_text(self, url):
-        content = ""
         article_data = self.get_article_content(url)
-        if "error" not in article_data:
-            content += "Title:"
-            content += f"{article_data['title']}\n"
+        if "error" in article_data:
+            return ""
+        return "".join(self.iter_article_plain_text(article_data))
 
-            content += f"PMCID: {article_data['pmcid']}\n"
-            content += f"PMID: {article_data['pmid']}\n"
-            
-            content += "Abstract:"
-            content += f"{article_data['abstract']}\n"
-            
-            content += "Keywords:"
-            content += article_data['keywords'] + "\n"
-            
-            content += "Sections:"
-            for section in article_data['sections']:
-                content += f"\n{section['title']}:"
-                content += section['content']
-
-            content += "\nTables:"
-            for table in article_data.get('tables', []):
-                content += f"\nTitle: {table['title']}"
-                content += f"Caption: {table['caption']}"
-                content += "Markdown Table:"
-                content += table['markdown']
-
-            content += "\nFigures:"
-            for figure in article_data['figures']:
-                content += f"\n{figure['title']}:"
-                content += f"Caption: {figure['caption']}"
-            
-            if article_data['acknowledgments']:
-                content += "\nAcknowledgments:"
-                content += article_data['acknowledgments']
-            
-            if article_data['references']:
-                content += "\nReferences:"
-                for reference in article_data['references']:
-                    content += reference + "\n"
+    def iter_article_plain_text(self, article_data) -> Iterator[str]:
+        """
+        Render article data as plain text, one chunk per section, table, figure
+        and reference, so consumers can start before the whole article is built.
+        """
+        yield (
+            f"Title:{article_data['title']}\n"
+            f"PMCID: {article_data['pmcid']}\n"
+            f"PMID: {article_data['pmid']}\n"
+            f"Abstract:{article_data['abstract']}\n"
+            f"Keywords:{article_data['keywords']}\n"
+            "Sections:"
+        )
+        for section in article_data['sections']:
+            yield f"\n{section['title']}:{section['content']}"
+
+        yield "\nTables:"
+        for table in article_data.get('tables', []):
+            yield f"\nTitle: {table['title']}Caption: {table['caption']}Markdown Table:{table['markdown']}"
 
-        return content
+        yield "\nFigures:"
+        for figure in article_data['figures']:
+            yield f"\n{figure['title']}:Caption: {figure['caption']}"
+
+        if article_data['acknowledgments']:
+            yield f"\nAcknowledgments:{article_data['acknowledgments']}"
+
+        if article_data['references']:
+            yield "\nReferences:"
+            for reference in article_data['references']:
+                yield reference + "\n"
+
+    def write_article_plain_text(self, article_data, buffer) -> int:
+        """Write the plain-text rendering into a file-like `buffer`; returns characters written."""
+        written = 0
+        for chunk in self.iter_article_plain_text(article_data):
+            written += buffer.write(chunk)
+        return written
 
     def _get_pmid(self, soup):
         """Extract PMID."""
@@ -182,49 +386,7 @@ class PubMedExtractor:
 
     def _table_to_markdown(self, table_elem):
         """Convert HTML table to Markdown format."""
-        rows = []
-        header_row = []
-        
-        # Extract headers
-        thead = table_elem.find('thead')
-        if thead:
-            header_row = [cell.get_text(strip=True) for cell in thead.find_all('td')]
-        
-        # Extract body rows
-        tbody = table_elem.find('tbody')
-        if tbody:
-            for tr in tbody.find_all('tr'):
-                row = [cell.get_text(strip=True) for cell in tr.find_all('td')]
-                rows.append(row)
-        
-        # Determine max width of each column
-        col_widths = [max(len(str(cell)) for cell in column) 
-                      for column in zip(header_row, *rows)]
-        
-        # Create Markdown table
-        md_lines = []
-        
-        # Header row
-        if header_row:
-            header_line = "| " + " | ".join(
-                f"{header:{width}}" for header, width in zip(header_row, col_widths)
-            ) + " |"
-            md_lines.append(header_line)
-            
-            # Separator line
-            separator_line = "| " + " | ".join(
-                "-" * width for width in col_widths
-            ) + " |"
-            md_lines.append(separator_line)
-        
-        # Data rows
-        for row in rows:
-            row_line = "| " + " | ".join(
-                f"{str(cell):{width}}" for cell, width in zip(row, col_widths)
-            ) + " |"
-            md_lines.append(row_line)
-        
-        return "\n".join(md_lines)
+        return table_to_markdown(table_elem)
 
     def _get_figures(self, soup):
         """Extract figures and their captions."""
@@ -273,10 +435,10 @@ class PubMedExtractor:
     def _get_acknowledgments(self, soup):
         """Extract acknowledgments section."""
         ack_section = soup.find('section', class_='ack')
-        heading = ack_section.find(['h2', 'h3'], class_='pmc_sec_title')
-        if heading:
-            heading.decompose()  # Remove heading from content
         if ack_section:
+            heading = ack_section.find(['h2', 'h3'], class_='pmc_sec_title')
+            if heading:
+                heading.decompose()  # Remove heading from content
             return ack_section.get_text(strip=True)
         return ""
 
@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: rate limited, overloaded or transient server errors.
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """A budget of `per_minute` units that refills continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` units now, going into debt if needed, and return how many
+        seconds to wait until the debt is paid off. Callers hold the scheduler lock.
+        """
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.available -= min(amount, self.capacity)
+        return max(0.0, -self.available / self.rate)
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) units after the fact."""
+        self.available = min(self.capacity, self.available - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on in-flight requests that grows by one slot per window of
+    successful calls and halves on every rate-limit error (AIMD).
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class RateLimitScheduler:
+    """
+    Per-provider scheduler for LLM calls.
+
+    Calls wait for room in a requests-per-minute and a tokens-per-minute
+    bucket (charged with an up-front token estimate, corrected with the
+    usage the provider reports) and for a free concurrency slot. Rate-limit
+    and transient errors are retried with jittered exponential backoff,
+    honouring the provider's Retry-After header.
+    """
+
+    def __init__(self,
+                 name: str,
+                 requests_per_minute: float,
+                 tokens_per_minute: float,
+                 max_concurrency: int,
+                 initial_concurrency: Optional[int] = None,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency or max(1, max_concurrency // 2), max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+
+    def run(self, call: Callable[[], Tuple[T, Optional[int]]], estimated_tokens: int) -> T:
+        """
+        Run `call`, which returns (result, tokens actually used or None),
+        within the provider's budgets, retrying retryable failures.
+        """
+        attempt = 0
+        while True:
+            self._wait_for_budget(estimated_tokens)
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                result, used_tokens = call()
+                if used_tokens:
+                    with self._lock:
+                        self.tokens.adjust(used_tokens - estimated_tokens)
+                return result
+            except Exception as e:
+                status = _status_code(e)
+                throttled = status == 429
+                if attempt >= self.max_retries or not _is_retryable(e, status):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                    delay = random.uniform(delay / 2, delay)
+                print(f"{self.name}: {type(e).__name__} ({status}), retrying in {delay:.1f}s")
+                attempt += 1
+            finally:
+                self.concurrency.release(throttled=throttled)
+            time.sleep(delay)
+
+    def _wait_for_budget(self, estimated_tokens: int):
+        with self._lock:
+            delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _is_retryable(error: Exception, status: Optional[int]) -> bool:
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection resets and timeouts carry no status code.
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+    return None
@@ -0,0 +1,91 @@
+"""
+Benchmark the vectorised token estimator against the legacy multi-pass one,
+and report how well the per-model calibration fits the recorded usage.
+
+Usage:
+    python -m backend.token_benchmark texts/*.txt [--repeat 5]
+    python -m backend.token_benchmark --calibration
+
+Each file is one document (e.g. a saved article or prompt). The legacy
+estimate is timed per document, the new one per document and as one batch,
+and the largest difference between the two estimates is reported.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+from backend.token_estimator import FEATURES, TOKEN_CALIBRATION_PATH, TokenCalibration, TokenEstimator
+
+
+def best_time(run: Callable[[], object], repeat: int):
+    """Return (best seconds, result) over `repeat` runs."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(paths: List[Path], repeat: int = 5):
+    estimator = TokenEstimator()
+    texts = [path.read_text(encoding="utf-8") for path in paths]
+    estimator.estimate_tokens("warm up")
+
+    legacy_time, legacy = best_time(lambda: [estimator.estimate_tokens_legacy(text) for text in texts], repeat)
+    single_time, single = best_time(lambda: [estimator.estimate_tokens(text) for text in texts], repeat)
+    batch_time, batch = best_time(lambda: estimator.estimate_batch(texts), repeat)
+
+    print(f"{len(texts)} documents, {sum(len(text) for text in texts)} characters")
+    print(f"    {'legacy':<16} {legacy_time * 1000:8.1f} ms")
+    print(f"    {'single-pass':<16} {single_time * 1000:8.1f} ms  x{legacy_time / single_time:5.1f}")
+    print(f"    {'batch':<16} {batch_time * 1000:8.1f} ms  x{legacy_time / batch_time:5.1f}")
+    print(f"Largest difference from the legacy estimate: "
+          f"{max(abs(int(a) - int(b)) for a, b in zip(legacy, batch))} tokens")
+
+
+def report_calibration(path: Path = TOKEN_CALIBRATION_PATH):
+    calibration = TokenCalibration(path)
+    estimator = TokenEstimator(calibration=calibration)
+    models = [row[0] for row in calibration._conn.execute("SELECT DISTINCT model FROM token_samples")]
+    if not models:
+        print(f"No usage recorded in {path} yet")
+        return
+    prior = estimator.default_weights()
+    for model in models:
+        features, tokens = calibration.samples(model)
+        default_error = np.abs(features @ prior - tokens) / tokens
+        print(f"{model}: {len(tokens)} samples, default estimate off by {np.median(default_error):.1%} (median)")
+        fit = calibration.fit(model, prior)
+        if fit is None:
+            print(f"    needs {calibration.min_samples} samples to calibrate")
+            continue
+        weights, margin = fit
+        error = np.abs(features @ weights - tokens) / tokens
+        print(f"    calibrated: off by {np.median(error):.1%} (median), {error.max():.1%} (max), "
+              f"safety margin x{margin:.2f}")
+        print("    weights: " + ", ".join(f"{name}={weight:.3f}" for name, weight in zip(FEATURES, weights)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts", nargs="*", type=Path, help="Text files, one document each")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per estimator, the best one is reported")
+    parser.add_argument("--calibration", action="store_true", help="Report the per-model calibration instead")
+    args = parser.parse_args()
+    if args.calibration:
+        report_calibration()
+    elif args.texts:
+        run_benchmark(args.texts, args.repeat)
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
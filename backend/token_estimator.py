@@ -1,8 +1,161 @@
+import json
+import os
 import re
-from typing import Union, List, Dict
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Union, List, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Per-text counts the estimate is a linear function of.
+FEATURES = ('constant', 'chars', 'cjk_chars', 'whitespace_runs', 'newlines', 'capitals', 'periods', 'special_tokens')
+DEFAULT_SAFETY_MARGIN = 1.25
+TOKEN_CALIBRATION_PATH = Path(os.environ.get(
+    "TOKEN_CALIBRATION_PATH",
+    Path(__file__).resolve().parent.parent / "data/cache/token_usage.sqlite"
+))
+
+_space_table = None
+
+def _is_space_table() -> np.ndarray:
+    """Whether each BMP code point is whitespace (as `\\s` matches it)."""
+    global _space_table
+    if _space_table is None:
+        _space_table = np.array([chr(code).isspace() for code in range(0x10000)], dtype=bool)
+    return _space_table
+
+def text_features(texts: Sequence[str]) -> np.ndarray:
+    """
+    FEATURES of each text as a (len(texts), len(FEATURES)) array.
+
+    All texts are encoded into one array of code points and every count is a
+    vectorised pass over it, summed per text with reduceat; no match lists
+    or per-character Python loops.
+    """
+    features = np.zeros((len(texts), len(FEATURES)))
+    features[:, 0] = 1
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    features[:, 1] = lengths
+    if not lengths.sum():
+        return features
+    joined = "".join(texts)
+    if joined.isascii():
+        codes = np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+    else:
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+
+    nonempty = lengths > 0
+    offsets = (np.cumsum(lengths) - lengths)[nonempty]
+
+    def per_text(mask):
+        counts = np.zeros(len(texts))
+        counts[nonempty] = np.add.reduceat(mask.astype(np.int64), offsets)
+        return counts
+
+    space = _is_space_table()[codes if codes.dtype == np.uint8 else np.minimum(codes, 0xFFFF)]
+    run_starts = space.copy()
+    run_starts[1:] &= ~space[:-1]
+    run_starts[offsets] = space[offsets]  # a run cannot continue from the previous text
+    special = np.zeros(len(codes), dtype=bool)
+    special[:-1] = (codes[:-1] == ord('<')) & (codes[1:] == ord('|'))
+
+    features[:, 3] = per_text(run_starts)
+    features[:, 4] = per_text(codes == ord('\n'))
+    features[:, 5] = per_text((codes >= ord('A')) & (codes <= ord('Z')))
+    features[:, 6] = per_text(codes == ord('.'))
+    features[:, 7] = per_text(special)
+    if codes.dtype == np.uint32:
+        cjk = ((codes >= 0x3000) & (codes <= 0x303F)) | ((codes >= 0x3400) & (codes <= 0x9FFF)) \
+            | ((codes >= 0xAC00) & (codes <= 0xD7AF)) | ((codes >= 0xF900) & (codes <= 0xFAFF)) \
+            | ((codes >= 0xFF00) & (codes <= 0xFFEF))
+        features[:, 2] = per_text(cjk)
+    return features
+
+
+class TokenCalibration:
+    """
+    Token usage reported by the providers, and per-model estimate weights fitted to it.
+
+    Each sample pairs the features of a prompt with the input tokens the
+    provider billed for it. The fit is a ridge regression pulled towards the
+    default weights, so a handful of samples already corrects the scale
+    without overfitting, and the safety margin is the 95th percentile of
+    actual / estimated tokens over the samples.
+    """
+
+    def __init__(self, path: Union[str, Path], min_samples: int = 20, max_samples: int = 2000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._fits = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS token_samples (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                features TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_token_samples_model ON token_samples (model, id)")
+        self._conn.commit()
+
+    def record(self, model: str, text: str, tokens: int):
+        """Store the billed input `tokens` of a prompt `text` sent to `model`."""
+        features = json.dumps(text_features([text])[0].tolist())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO token_samples (model, features, tokens, created_at) VALUES (?, ?, ?, ?)",
+                (model, features, int(tokens), time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM token_samples WHERE model = ? AND id NOT IN "
+                "(SELECT id FROM token_samples WHERE model = ? ORDER BY id DESC LIMIT ?)",
+                (model, model, self.max_samples)
+            )
+            self._conn.commit()
+            # Refit lazily once enough new samples have arrived.
+            fit = self._fits.get(model)
+            if fit is not None and fit[2] + max(10, fit[2] // 10) <= self._count_locked(model):
+                del self._fits[model]
+
+    def samples(self, model: str) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT features, tokens FROM token_samples WHERE model = ?", (model,)
+            ).fetchall()
+        features = np.array([json.loads(row[0]) for row in rows]).reshape(-1, len(FEATURES))
+        return features, np.array([row[1] for row in rows], dtype=float)
+
+    def fit(self, model: str, prior: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+        """(weights, safety margin) for `model`, or None until there are enough samples."""
+        with self._lock:
+            if model in self._fits:
+                return self._fits[model][:2]
+        features, tokens = self.samples(model)
+        if len(tokens) < self.min_samples:
+            return None
+        gram = features.T @ features
+        strength = 1e-3 * np.trace(gram) / len(FEATURES)
+        weights = np.linalg.solve(gram + strength * np.eye(len(FEATURES)), features.T @ tokens + strength * prior)
+        predicted = np.maximum(features @ weights, 1.0)
+        margin = max(1.0, float(np.quantile(tokens / predicted, 0.95)))
+        with self._lock:
+            self._fits[model] = (weights, margin, len(tokens))
+        return weights, margin
+
+    def _count_locked(self, model: str) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM token_samples WHERE model = ?", (model,)).fetchone()[0]
+
 
 class TokenEstimator:
-    def __init__(self):
+    def __init__(self, calibration: Optional[TokenCalibration] = None):
         # Approximate ratios for different languages and content types
         self.ratios = {
             'english': 0.75,  # ~4 characters per token for English
@@ -18,11 +171,68 @@ class TokenEstimator:
             '<|im_end|>': 1,
             '\n': 1,
         }
+        self.calibration = calibration
+
+    def default_weights(self, language: str = 'english', include_special_tokens: bool = True) -> np.ndarray:
+        """
+        Weights of FEATURES reproducing the heuristic: characters times the
+        language ratio less half a character per whitespace run, plus special
+        tokens and newlines, half a token per period and 0.2 per capital.
+        """
+        ratio = self.ratios.get(language.lower(), self.ratios['english'])
+        special = 1.0 if include_special_tokens else 0.0
+        return np.array([0.0, ratio, 0.0, -0.5 * ratio, special, 0.2, 0.5, special])
+
+    def _weights(self, language: str, include_special_tokens: bool, model: Optional[str]) -> Tuple[np.ndarray, Optional[float]]:
+        prior = self.default_weights(language, include_special_tokens)
+        if model is not None and self.calibration is not None:
+            fit = self.calibration.fit(model, self.default_weights('english'))
+            if fit is not None:
+                return fit
+        return prior, None
+
+    def estimate_batch(self,
+                       texts: Sequence[Union[str, List, Dict]],
+                       language: str = 'english',
+                       include_special_tokens: bool = True,
+                       model: Optional[str] = None,
+                       upper_bound: bool = False) -> np.ndarray:
+        """
+        Estimated token counts of many texts in one vectorised pass.
+
+        With a `model` whose usage has been calibrated, its fitted weights
+        are used and `language` is ignored (the fit covers English and CJK
+        text alike). `upper_bound` multiplies by the safety margin, for hard
+        context-window checks.
+        """
+        languages = [language] * len(texts)
+        prepared = []
+        for i, text in enumerate(texts):
+            if isinstance(text, (list, dict)):
+                text = json.dumps(text, ensure_ascii=False)
+                languages[i] = 'json'
+            prepared.append(str(text))
+        features = text_features(prepared)
+
+        weights, margin = self._weights(language, include_special_tokens, model)
+        if margin is None:
+            # Uncalibrated: per-text language (JSON for dicts and lists).
+            table = {lang: self.default_weights(lang, include_special_tokens) for lang in set(languages)}
+            weights = np.stack([table[lang] for lang in languages]) if len(table) > 1 else table[languages[0]]
+            estimates = (features * weights).sum(axis=1)
+            margin = DEFAULT_SAFETY_MARGIN
+        else:
+            estimates = features @ weights
+        if upper_bound:
+            estimates = np.ceil(estimates * margin)
+        return np.maximum(1, estimates.astype(np.int64))
 
     def estimate_tokens(self, 
                        text: Union[str, List, Dict], 
                        language: str = 'english',
-                       include_special_tokens: bool = True) -> int:
+                       include_special_tokens: bool = True,
+                       model: Optional[str] = None,
+                       upper_bound: bool = False) -> int:
         """
         Estimate the number of tokens in a given text.
         
@@ -30,10 +240,19 @@ class TokenEstimator:
             text: Input text, list, or dictionary
             language: Language of the text ('english', 'chinese', 'code', 'json')
             include_special_tokens: Whether to count special tokens
+            model: Use the weights calibrated for this model, when available
+            upper_bound: Add the safety margin for hard limit checks
             
         Returns:
             Estimated token count
         """
+        return int(self.estimate_batch([text], language, include_special_tokens, model, upper_bound)[0])
+
+    def estimate_tokens_legacy(self,
+                               text: Union[str, List, Dict],
+                               language: str = 'english',
+                               include_special_tokens: bool = True) -> int:
+        """The original multi-pass estimate, kept for the benchmark."""
         if isinstance(text, (list, dict)):
             text = str(text)
             language = 'json'
@@ -92,6 +311,43 @@ class TokenEstimator:
         
         return prompt_tokens, completion_tokens
 
+def split_by_token_budget(pieces: Iterable[str],
+                          token_budget: int,
+                          estimator: Optional[TokenEstimator] = None,
+                          language: str = 'english') -> List[str]:
+    """
+    Pack consecutive text pieces (e.g. article sections) into chunks that each
+    fit within `token_budget` estimated tokens, breaking only between pieces.
+    A piece that is larger than the budget on its own is split between lines.
+    """
+    estimator = estimator or TokenEstimator()
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def units(piece, tokens):
+        if tokens <= token_budget or "\n" not in piece.strip("\n"):
+            return [(piece, tokens)]
+        lines = piece.split("\n")
+        line_tokens = estimator.estimate_batch(lines, language=language) + 1
+        return [
+            (line if index == len(lines) - 1 else line + "\n", int(line_tokens[index]))
+            for index, line in enumerate(lines)
+        ]
+
+    pieces = list(pieces)
+    for piece, piece_tokens in zip(pieces, estimator.estimate_batch(pieces, language=language)):
+        for text, tokens in units(piece, int(piece_tokens)):
+            if current and current_tokens + tokens > token_budget:
+                chunks.append("".join(current))
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
 def token_estimation_from_text(full_text):
     estimator = TokenEstimator()
 
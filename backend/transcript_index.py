@@ -0,0 +1,313 @@
+"""
+Genomic interval index over the transcript_db records.
+
+    index = TranscriptIndex.from_records(transcript_db.items())
+    index.query("chr17-43045712")          # one variant
+    index.lookup(chroms, positions)        # NumPy arrays, thousands at once
+
+For every transcript overlapping a position it reports the exon (or intron)
+number in transcript orientation, the distance to the NMD boundary and the
+relative position in the CDS, without calling the annotation service.
+
+transcript_db holds the coordinates of one assembly, TRANSCRIPT_DB_GENOME_VERSION
+(hg38 unless set in the environment); positions of the other build must not
+be looked up in it.
+
+transcript_db records are read tolerantly since their layout differs between
+builds. The assumptions are:
+- coordinates are 1-based and inclusive, except the UCSC-style names
+  (txStart, cdsStart, exonStarts) whose starts are 0-based;
+- the chromosome is in chrom/chr/chromosome, or in a "chr17:100-200" location;
+- the span is start/end (tx_start/tx_end, txStart/txEnd) or the location;
+- exons are a list of [start, end] pairs, {"start", "end"} dicts or
+  "start-end" strings under exons/exon_locations, or exonStarts/exonEnds;
+  transcripts without exons get no exon, intron, NMD or CDS position, since
+  inventing a single exon would report every position as exon 1;
+- the CDS is cds_start/cds_end (cdsStart/cdsEnd);
+- strand is "+"/"-" or 1/-1;
+- an optional genomic NMD boundary is in nmd_location/NMD_location/nmd_boundary,
+  otherwise the 50-nt rule is applied: the boundary lies 50 nt upstream of
+  the last exon-exon junction.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from backend.annotation_utils import normalize_variant
+
+# Positions are packed with a chromosome code (or transcript number) into one
+# int64 key so a single searchsorted covers the whole genome.
+SCALE = 1 << 28
+NMD_RULE_DISTANCE = 50
+TRANSCRIPT_DB_GENOME_VERSION = os.environ.get("TRANSCRIPT_DB_GENOME_VERSION", "hg38")
+
+_LOCATION_RE = re.compile(r"(?:chr)?([0-9XYMT]+)\s*:\s*([\d,]+)\s*-\s*([\d,]+)", re.IGNORECASE)
+_POSITION_RE = re.compile(r"^(?:chr)?([0-9XYMT]+)[-:_\s]+(\d+)$", re.IGNORECASE)
+
+
+def normalize_chrom(chrom) -> str:
+    chrom = str(chrom).strip()
+    if chrom.lower().startswith("chr"):
+        chrom = chrom[3:]
+    chrom = chrom.upper()
+    return "MT" if chrom == "M" else chrom
+
+
+def _first(record: Dict, *keys):
+    for key in keys:
+        if record.get(key) not in (None, ""):
+            return record[key]
+    return None
+
+
+def _to_int(value) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _parse_exons(record: Dict) -> List[Tuple[int, int]]:
+    exons = _first(record, "exons", "exon_locations", "exon_coordinates")
+    if exons:
+        parsed = []
+        for exon in exons:
+            if isinstance(exon, dict):
+                start, end = _first(exon, "start", "exon_start"), _first(exon, "end", "exon_end")
+            elif isinstance(exon, str):
+                start, end = exon.rsplit(":", 1)[-1].split("-")
+            else:
+                start, end = exon[0], exon[1]
+            parsed.append((_to_int(start), _to_int(end)))
+        return sorted(parsed)
+    starts, ends = record.get("exonStarts"), record.get("exonEnds")
+    if starts and ends:
+        if isinstance(starts, str):
+            starts = [s for s in starts.split(",") if s]
+            ends = [e for e in ends.split(",") if e]
+        return sorted((_to_int(s) + 1, _to_int(e)) for s, e in zip(starts, ends))
+    return []
+
+
+def parse_transcript(transcript_id: str, record: Dict) -> Optional[Dict]:
+    """Normalise one transcript_db record, or None when it has no usable location."""
+    chrom = _first(record, "chrom", "chr", "chromosome")
+    start = _to_int(_first(record, "start", "tx_start"))
+    end = _to_int(_first(record, "end", "tx_end", "txEnd"))
+    if start is None and record.get("txStart") is not None:
+        start = _to_int(record["txStart"]) + 1
+    location = record.get("location")
+    if isinstance(location, str):
+        match = _LOCATION_RE.search(location)
+        if match:
+            chrom = chrom or match.group(1)
+            start = start or _to_int(match.group(2))
+            end = end or _to_int(match.group(3))
+    exons = _parse_exons(record)
+    if exons:
+        start = start or exons[0][0]
+        end = end or exons[-1][1]
+    if chrom is None or start is None or end is None:
+        return None
+
+    cds_start = _to_int(_first(record, "cds_start"))
+    if cds_start is None and record.get("cdsStart") is not None:
+        cds_start = _to_int(record["cdsStart"]) + 1
+    cds_end = _to_int(_first(record, "cds_end", "cdsEnd"))
+    if cds_start is not None and cds_end is not None and cds_end < cds_start:
+        cds_start = cds_end = None  # non-coding (UCSC stores cdsStart == cdsEnd)
+
+    strand = str(record.get("strand", "+")).strip()
+    return {
+        "transcript_id": transcript_id,
+        "chrom": normalize_chrom(chrom),
+        "start": start,
+        "end": end,
+        "minus": strand in ("-", "-1"),
+        "exons": exons,  # empty when the record has no exon coordinates
+        "cds": (cds_start, cds_end) if cds_start is not None and cds_end is not None else None,
+        "nmd_location": _to_int(_first(record, "nmd_location", "NMD_location", "nmd_boundary")),
+    }
+
+
+def _genomic_to_transcript(exons: Sequence[Tuple[int, int]], minus: bool, position: int) -> Optional[int]:
+    """0-based offset of an exonic position in the spliced transcript, in transcript orientation."""
+    offset = 0
+    for start, end in exons:
+        if start <= position <= end:
+            offset += position - start
+            total = sum(e - s + 1 for s, e in exons)
+            return total - 1 - offset if minus else offset
+        offset += end - start + 1
+    return None
+
+
+class TranscriptIndex:
+    """Sorted-array interval index of transcripts and their exons."""
+
+    def __init__(self, transcripts: List[Dict], genome_version: str = TRANSCRIPT_DB_GENOME_VERSION):
+        self.genome_version = genome_version
+        chrom_names = sorted({t["chrom"] for t in transcripts})
+        self.chrom_codes = {name: code for code, name in enumerate(chrom_names)}
+
+        transcripts = sorted(transcripts, key=lambda t: (self.chrom_codes[t["chrom"]], t["start"]))
+        count = len(transcripts)
+        self.transcript_ids = np.array([t["transcript_id"] for t in transcripts], dtype=object)
+        codes = np.array([self.chrom_codes[t["chrom"]] for t in transcripts], dtype=np.int64)
+        self.start_keys = codes * SCALE + np.array([t["start"] for t in transcripts], dtype=np.int64)
+        self.end_keys = codes * SCALE + np.array([t["end"] for t in transcripts], dtype=np.int64)
+        # Running maximum of the ends: everything before the first entry
+        # reaching a position ends before it.
+        self.max_end_keys = np.maximum.accumulate(self.end_keys) if count else self.end_keys
+
+        self.minus = np.array([t["minus"] for t in transcripts], dtype=bool)
+        self.exon_count = np.array([len(t["exons"]) for t in transcripts], dtype=np.int64)
+        self.exons_known = self.exon_count > 0
+        self.transcript_length = np.zeros(count, dtype=np.int64)
+        self.cds_begin = np.full(count, -1, dtype=np.int64)
+        self.cds_length = np.zeros(count, dtype=np.int64)
+        self.nmd_boundary = np.full(count, np.nan)
+
+        exon_keys, exon_ends, exon_offsets, exon_transcripts = [], [], [], []
+        for number, t in enumerate(transcripts):
+            # Transcripts without exon coordinates still need one block so the
+            # lookup arrays line up; lookup reports nothing exon-based for them.
+            exons = t["exons"] or [(t["start"], t["end"])]
+            offset = 0
+            for start, end in exons:
+                exon_keys.append(number * SCALE + start)
+                exon_ends.append(end)
+                exon_offsets.append(offset)
+                exon_transcripts.append(number)
+                offset += end - start + 1
+            self.transcript_length[number] = offset
+
+            if not t["exons"]:
+                continue
+            if t["cds"] is not None:
+                first = _genomic_to_transcript(exons, t["minus"], t["cds"][0])
+                last = _genomic_to_transcript(exons, t["minus"], t["cds"][1])
+                if first is not None and last is not None:
+                    self.cds_begin[number] = min(first, last)
+                    self.cds_length[number] = abs(last - first) + 1
+
+            if t["nmd_location"] is not None:
+                boundary = _genomic_to_transcript(exons, t["minus"], t["nmd_location"])
+                if boundary is not None:
+                    self.nmd_boundary[number] = boundary
+            elif len(exons) > 1:
+                last_exon = exons[0] if t["minus"] else exons[-1]
+                last_junction = offset - (last_exon[1] - last_exon[0] + 1)
+                self.nmd_boundary[number] = last_junction - NMD_RULE_DISTANCE
+
+        self.exon_keys = np.array(exon_keys, dtype=np.int64)
+        self.exon_ends = np.array(exon_ends, dtype=np.int64)
+        self.exon_offsets = np.array(exon_offsets, dtype=np.int64)
+        self.exon_transcripts = np.array(exon_transcripts, dtype=np.int64)
+        self.first_exon = np.searchsorted(self.exon_transcripts, np.arange(count))
+
+    @classmethod
+    def from_records(cls,
+                     records: Iterable[Tuple[str, Dict]],
+                     genome_version: str = TRANSCRIPT_DB_GENOME_VERSION) -> "TranscriptIndex":
+        """Build from (transcript id, record) pairs of one assembly, e.g. `transcript_db.items()`."""
+        transcripts = [parse_transcript(transcript_id, record) for transcript_id, record in records]
+        return cls([t for t in transcripts if t is not None], genome_version)
+
+    def __len__(self):
+        return len(self.transcript_ids)
+
+    def lookup(self, chroms: Union[str, Sequence[str], np.ndarray], positions) -> Dict[str, np.ndarray]:
+        """
+        Annotate positions against every overlapping transcript.
+
+        `chroms` is one chromosome or one per position. Returns parallel arrays
+        with a row per (position, overlapping transcript):
+        - query: index of the position in the input
+        - transcript_id
+        - exon / intron: 1-based number in transcript orientation, 0 when not
+          in one, -1 when the transcript has no exon coordinates (unknown)
+        - nmd_distance: nt from the variant to the NMD boundary in the spliced
+          transcript, positive when upstream of it (NMD expected); NaN for
+          intronic positions, single-exon transcripts and unknown exons
+        - cds_position: relative position in the CDS (0 = first coding base,
+          1 = stop codon), NaN outside the CDS and for unknown exons
+        """
+        positions = np.asarray(positions, dtype=np.int64).ravel()
+        if isinstance(chroms, str):
+            chroms = [chroms] * len(positions)
+        codes = np.array([self.chrom_codes.get(normalize_chrom(c), -1) for c in chroms], dtype=np.int64)
+        query_keys = codes * SCALE + positions
+
+        # Candidates are the transcripts starting at or before the position
+        # whose running maximum end reaches it.
+        low = np.searchsorted(self.max_end_keys, query_keys, side="left")
+        high = np.searchsorted(self.start_keys, query_keys, side="right")
+        counts = np.where(codes >= 0, np.clip(high - low, 0, None), 0)
+        query = np.repeat(np.arange(len(positions)), counts)
+        starts = np.repeat(low - (np.cumsum(counts) - counts), counts)
+        transcripts = starts + np.arange(counts.sum())
+        overlaps = self.end_keys[transcripts] >= query_keys[query]
+        query, transcripts = query[overlaps], transcripts[overlaps]
+        pos = positions[query]
+
+        # The exon starting at or before the position, within its transcript.
+        exon = np.searchsorted(self.exon_keys, transcripts * SCALE + pos, side="right") - 1
+        exon = np.maximum(exon, self.first_exon[transcripts])
+        exon_start = self.exon_keys[exon] - transcripts * SCALE
+        in_exon = (pos >= exon_start) & (pos <= self.exon_ends[exon])
+        rank = exon - self.first_exon[transcripts]
+        exon_count = self.exon_count[transcripts]
+        minus = self.minus[transcripts]
+        exon_number = np.where(minus, exon_count - rank, rank + 1)
+        intron_number = np.where(minus, exon_count - rank - 1, rank + 1)
+
+        offset = self.exon_offsets[exon] + pos - exon_start
+        offset = np.where(minus, self.transcript_length[transcripts] - 1 - offset, offset).astype(float)
+        known = self.exons_known[transcripts]
+        offset[~in_exon | ~known] = np.nan
+
+        cds_length = self.cds_length[transcripts]
+        cds_offset = offset - self.cds_begin[transcripts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cds_position = cds_offset / np.maximum(cds_length - 1, 1)
+            cds_position[(cds_length == 0) | (cds_offset < 0) | (cds_offset >= cds_length)] = np.nan
+
+        return {
+            "query": query,
+            "transcript_id": self.transcript_ids[transcripts],
+            "exon": np.where(known, np.where(in_exon, exon_number, 0), -1),
+            "intron": np.where(known, np.where(in_exon, 0, intron_number), -1),
+            "nmd_distance": self.nmd_boundary[transcripts] - offset,
+            "cds_position": cds_position,
+        }
+
+    def query(self, variant: str) -> List[Dict]:
+        """
+        Overlapping transcripts of a variant as a list of dicts; exon and
+        intron are both None when the exons are unknown. The variant is read
+        like the annotation client reads it ("chr17-43045712-G-A",
+        "17:43045712 g>a"), or is a bare "chr17:43045712" position; raises
+        ValueError otherwise.
+        """
+        match = _POSITION_RE.match(variant.strip())
+        if match is not None:
+            chrom, position = match.groups()
+        else:
+            chrom, position = normalize_variant(variant).split("-")[:2]
+        result = self.lookup(chrom, [int(position)])
+        rows = []
+        for i in range(len(result["query"])):
+            row = {name: values[i] for name, values in result.items() if name != "query"}
+            rows.append({
+                "transcript_id": row["transcript_id"],
+                "exon": int(row["exon"]) if row["exon"] > 0 else None,
+                "intron": int(row["intron"]) if row["intron"] > 0 else None,
+                "nmd_distance": None if np.isnan(row["nmd_distance"]) else int(row["nmd_distance"]),
+                "cds_position": None if np.isnan(row["cds_position"]) else round(float(row["cds_position"]), 4),
+            })
+        return rows
@@ -0,0 +1,269 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+AMINO_ACIDS = {
+    'Ala': 'A', 'Arg': 'R', 'Asn': 'N', 'Asp': 'D', 'Cys': 'C',
+    'Gln': 'Q', 'Glu': 'E', 'Gly': 'G', 'His': 'H', 'Ile': 'I',
+    'Leu': 'L', 'Lys': 'K', 'Met': 'M', 'Phe': 'F', 'Pro': 'P',
+    'Ser': 'S', 'Thr': 'T', 'Trp': 'W', 'Tyr': 'Y', 'Val': 'V',
+    'Sec': 'U', 'Ter': '*',
+}
+ONE_TO_THREE = {one: three for three, one in AMINO_ACIDS.items()}
+
+# Sections always kept whole because they describe how the evidence was obtained.
+METHODS_TITLE = re.compile(r'method|material|patients|subjects|participants', re.IGNORECASE)
+
+_CDNA_SUB = re.compile(r'(?:c\.)?(?P<pos>[-*]?\d+(?:[+-]\d+)?)(?P<ref>[ACGT])\s*(?:>|->|→|&gt;)\s*(?P<alt>[ACGT])', re.IGNORECASE)
+_CDNA_OTHER = re.compile(r'c\.(?P<pos>[-*]?\d+(?:[+-]\d+)?(?:_[-*]?\d+(?:[+-]\d+)?)?)(?P<change>(?:del|dup|ins|inv)[ACGT]*(?:ins[ACGT]+)?)', re.IGNORECASE)
+_PROTEIN_THREE = re.compile(r'p\.\(?(?P<ref>[A-Z][a-z]{2})(?P<pos>\d+)(?P<alt>[A-Z][a-z]{2}|\*|X|=|fs|del|dup)(?P<tail>[A-Za-z*\d]*)\)?')
+# One-letter changes need the p. prefix: bare, they read gene symbols such as G6PD, A2M or E2F1 as changes.
+_PROTEIN_ONE = re.compile(r'(?<![\w.])p\.\(?(?P<ref>[ACDEFGHIKLMNPQRSTVWY])(?P<pos>\d+)(?P<alt>[ACDEFGHIKLMNPQRSTVWYX*]|fs|del|dup)(?P<tail>[A-Za-z*\d]*)\)?')
+
+_WORD_START = r'(?<!\w)'
+
+
+@dataclass
+class Passage:
+    """A paragraph, table row or caption of a parsed article."""
+    kind: str          # 'abstract', 'paragraph', 'table_row' or 'figure'
+    group: int         # index of the section/table/figure within its kind
+    index: int         # index of the passage within its group
+    text: str
+
+
+class VariantLocator:
+    """
+    Find the passages of a parsed article that mention a variant.
+
+    The variant name (e.g. "CYP27A1 c.410G>A p.Arg137Gln") is normalised into
+    the HGVS c. and p. forms an article may use: "c.410G>A", "410G>A" and
+    legacy "G410A"; "p.Arg137Gln", "Arg137Gln", "p.R137Q" and "R137Q". In
+    the variant name itself a one-letter change needs its "p." prefix.
+    Frameshifts match with or without the new residue and stop
+    ("p.Arg137GlyfsTer5", "Arg137fs", "R137Gfs*5") but never the missense
+    change at that residue, and "*", "Ter" and "X" are read as the same stop.
+    When only a c. change is given, any protein change at the affected codon
+    is matched too. `protein_offset` and `cdna_offset` add legacy numberings
+    shifted by that many residues/bases (e.g. mature-protein numbering).
+    """
+
+    def __init__(self,
+                 variant_name: str,
+                 context: int = 1,
+                 protein_offset: Optional[int] = None,
+                 cdna_offset: Optional[int] = None):
+        self.variant_name = variant_name
+        self.context = context
+        self.protein_offset = protein_offset
+        self.cdna_offset = cdna_offset
+        self.patterns = self._build_patterns(variant_name)
+        self._regex = re.compile("|".join(f"(?:{p})" for p in self.patterns)) if self.patterns else None
+
+    def mentions(self, text: str) -> bool:
+        return self._regex is not None and self._regex.search(text) is not None
+
+    def index_passages(self, article_data: Dict) -> Iterator[Passage]:
+        """Split a parsed article into paragraphs, table rows and figure captions."""
+        if article_data.get('abstract'):
+            yield Passage('abstract', 0, 0, article_data['abstract'])
+        for group, section in enumerate(article_data.get('sections', [])):
+            for index, paragraph in enumerate(section['content'].split("\n")):
+                yield Passage('paragraph', group, index, paragraph)
+        for group, table in enumerate(article_data.get('tables', [])):
+            for index, row in enumerate(table['markdown'].split("\n")):
+                yield Passage('table_row', group, index, row)
+        for group, figure in enumerate(article_data.get('figures', [])):
+            yield Passage('figure', group, 0, f"{figure['title']} {figure['caption']}")
+
+    def find_passages(self, article_data: Dict) -> List[Passage]:
+        return [passage for passage in self.index_passages(article_data) if self.mentions(passage.text)]
+
+    def render(self, article_data: Dict) -> Optional[str]:
+        """
+        Plain text holding only the passages that mention the variant, their
+        neighbouring paragraphs, table headers and the methods sections.
+        Returns None when the variant is not mentioned at all.
+        """
+        chunks = self.render_chunks(article_data)
+        return "".join(chunks) if chunks is not None else None
+
+    def render_chunks(self, article_data: Dict) -> Optional[List[str]]:
+        """Like render, but split into one chunk per section, table and figure."""
+        matches = self.find_passages(article_data)
+        if not matches:
+            return None
+
+        paragraph_hits: Dict[int, set] = {}
+        table_hits: Dict[int, set] = {}
+        figure_hits = set()
+        for passage in matches:
+            if passage.kind == 'paragraph':
+                paragraph_hits.setdefault(passage.group, set()).add(passage.index)
+            elif passage.kind == 'table_row':
+                table_hits.setdefault(passage.group, set()).add(passage.index)
+            elif passage.kind == 'figure':
+                figure_hits.add(passage.group)
+
+        parts = [
+            f"Title:{article_data['title']}\n"
+            f"PMCID: {article_data['pmcid']}\n"
+            f"PMID: {article_data['pmid']}\n"
+            f"Abstract:{article_data['abstract']}\n"
+            f"Keywords:{article_data['keywords']}\n"
+            f"Passages mentioning {self.variant_name}:\n"
+            "Sections:"
+        ]
+        for group, section in enumerate(article_data['sections']):
+            paragraphs = section['content'].split("\n")
+            if METHODS_TITLE.search(section['title']):
+                keep = range(len(paragraphs))
+            elif group in paragraph_hits:
+                keep = sorted({
+                    neighbour
+                    for index in paragraph_hits[group]
+                    for neighbour in range(index - self.context, index + self.context + 1)
+                    if 0 <= neighbour < len(paragraphs)
+                })
+            else:
+                continue
+            parts.append(f"\n{section['title']}:{self._join_with_gaps(paragraphs, keep)}")
+
+        parts.append("\nTables:")
+        for group, table in enumerate(article_data.get('tables', [])):
+            if group not in table_hits:
+                continue
+            rows = table['markdown'].split("\n")
+            # Keep the header and separator lines so matched rows stay readable.
+            keep = sorted({0, 1} | table_hits[group])
+            parts.append(
+                f"\nTitle: {table['title']}Caption: {table['caption']}Markdown Table:"
+                f"{self._join_with_gaps(rows, [index for index in keep if index < len(rows)])}"
+            )
+
+        parts.append("\nFigures:")
+        for group in sorted(figure_hits):
+            figure = article_data['figures'][group]
+            parts.append(f"\n{figure['title']}:Caption: {figure['caption']}")
+
+        return parts
+
+    @staticmethod
+    def _join_with_gaps(lines: List[str], keep) -> str:
+        out = []
+        previous = None
+        for index in keep:
+            if previous is not None and index != previous + 1:
+                out.append("[...]")
+            out.append(lines[index])
+            previous = index
+        return "\n".join(out)
+
+    def _build_patterns(self, variant_name: str) -> List[str]:
+        patterns = []
+        codon_patterns = []
+        protein_given = False
+
+        for match in _CDNA_SUB.finditer(variant_name):
+            ref, alt = match.group('ref').upper(), match.group('alt').upper()
+            for pos in self._shifted(match.group('pos'), self.cdna_offset):
+                patterns.extend(self._cdna_substitution_patterns(pos, ref, alt))
+            codon = self._codon(match.group('pos'))
+            if codon is not None:
+                codon_patterns.append(self._any_protein_change_at(codon))
+
+        for match in _CDNA_OTHER.finditer(variant_name):
+            pos = re.escape(match.group('pos'))
+            change = match.group('change').lower()
+            # "c.123delA" is also written "c.123del" and vice versa.
+            kind = re.match(r'del|dup|ins|inv', change).group(0)
+            patterns.append(
+                rf"{_WORD_START}(?:c\.)?{pos}{kind}(?:[ACGT]*(?:ins[ACGT]+)?)?(?![a-z])"
+            )
+
+        for regex, three_letter in ((_PROTEIN_THREE, True), (_PROTEIN_ONE, False)):
+            for match in regex.finditer(variant_name):
+                ref, alt = match.group('ref'), match.group('alt')
+                # "p.Arg137GlyfsTer5" is a frameshift, not the missense Arg137Gly.
+                if match.group('tail').lower().startswith('fs'):
+                    alt = 'fs'
+                if three_letter:
+                    if alt in ('*', 'X'):
+                        alt = 'Ter'
+                    if ref not in AMINO_ACIDS or (len(alt) == 3 and alt not in AMINO_ACIDS):
+                        continue
+                    ref_three, alt_three = ref, alt
+                else:
+                    ref_three = ONE_TO_THREE.get(ref)
+                    alt_three = ONE_TO_THREE.get(alt, alt)
+                    if alt == 'X':
+                        alt_three = 'Ter'
+                if ref_three is None:
+                    continue
+                protein_given = True
+                for pos in self._shifted(match.group('pos'), self.protein_offset):
+                    patterns.extend(self._protein_patterns(ref_three, pos, alt_three))
+
+        # Only fall back to any change at the codon when no protein change was given.
+        return patterns if protein_given else patterns + codon_patterns
+
+    @staticmethod
+    def _shifted(pos: str, offset: Optional[int]) -> List[str]:
+        positions = [pos]
+        if offset and re.fullmatch(r'\d+', pos):
+            positions.append(str(int(pos) - offset))
+        return positions
+
+    @staticmethod
+    def _codon(pos: str) -> Optional[int]:
+        if not re.fullmatch(r'\d+', pos):
+            return None  # intronic or UTR positions have no codon
+        return (int(pos) + 2) // 3
+
+    @staticmethod
+    def _cdna_substitution_patterns(pos: str, ref: str, alt: str) -> List[str]:
+        pos = re.escape(pos)
+        arrow = r'\s*(?:>|->|→|&gt;|/)\s*'
+        return [
+            rf"{_WORD_START}(?:c\.\s*)?{pos}\s*{ref}{arrow}{alt}(?![A-Za-z])",
+            # Legacy nucleotide notation, e.g. G410A.
+            rf"(?<![\w.]){ref}{pos}{alt}(?![\w])",
+        ]
+
+    @staticmethod
+    def _protein_patterns(ref_three: str, pos: str, alt_three: str) -> List[str]:
+        ref_one = AMINO_ACIDS[ref_three]
+        if alt_three == 'Ter':
+            alt_three_forms = [r'(?:Ter|\*|X|Stop)']
+            alt_one_forms = [r'(?:\*|X)']
+        elif alt_three == 'fs':
+            # With or without the new residue and the stop: Arg137fs, Arg137GlyfsTer5, R137Gfs*5.
+            alt_three_forms = [r'(?:[A-Z][a-z]{2})?fs']
+            alt_one_forms = [r'[A-Z]?fs']
+        elif alt_three in AMINO_ACIDS:
+            # Not followed by "fs": Arg137GlyfsTer5 is a frameshift, not this missense change.
+            alt_three_forms = [rf'{alt_three}(?!fs)']
+            alt_one_forms = [re.escape(AMINO_ACIDS[alt_three])]
+        else:
+            # fs, del, dup and = are written the same way in both notations.
+            alt_three_forms = alt_one_forms = [re.escape(alt_three)]
+        patterns = []
+        for alt in alt_three_forms:
+            patterns.append(rf"(?<![A-Za-z])(?:p\.\s*)?\(?{ref_three}{pos}{alt}")
+        for alt in alt_one_forms:
+            patterns.append(rf"(?<![\w.])(?:p\.\s*)?\(?{re.escape(ref_one)}{pos}{alt}(?![a-z\d])")
+        return patterns
+
+    @staticmethod
+    def _any_protein_change_at(codon: int) -> str:
+        three = "|".join(aa for aa in AMINO_ACIDS if aa != 'Ter')
+        one = "ACDEFGHIKLMNPQRSTVWY"
+        return (
+            rf"(?<![A-Za-z])(?:p\.\s*)?\(?(?:{three}){codon}(?:[A-Z][a-z]{{2}}|\*|fs|del|dup|=)"
+            rf"|(?<![\w.])(?:p\.\s*)?[{one}]{codon}(?:[{one}X*]|fs|del|dup)(?![a-z\d])"
+        )
+
+
+def locate_variant_passages(article_data: Dict, variant_name: str, context: int = 1) -> Optional[List[str]]:
+    """Plain-text chunks of the passages of `article_data` relevant to `variant_name`, or None."""
+    return VariantLocator(variant_name, context=context).render_chunks(article_data)
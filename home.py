@@ -1,4 +1,12 @@
 import streamlit as st
+from dotenv import load_dotenv
+from pathlib import Path
+
+from backend.llm_utils import warm_up_llms_in_background
+
+load_dotenv(Path(__file__).resolve().parent / '.env')
+# Build the LLM clients and open their connections while the user picks a page.
+warm_up_llms_in_background()
 
 st.set_page_config(
     page_title="AI for Genetic Analysis",
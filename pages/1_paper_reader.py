@@ -1,9 +1,12 @@
 import streamlit as st
+import time
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from backend.publication_extractor import PubMedExtractor
-from backend.llm_utils import generate_acmg_intepretation
+from backend.article_cache import ArticleCache
+from backend.variant_locator import locate_variant_passages
+from backend.llm_utils import PromptTooLargeError, TimedStream, generate_acmg_intepretation, warm_up_llms_in_background
 from backend.prompts import PUBMED_ACMG_READER_TEMPLATE, TEST_TEMPLATE
 import xml.etree.ElementTree as ET
 
@@ -11,15 +14,33 @@ import xml.etree.ElementTree as ET
 # Load .env from project root
 root_path = Path(__file__).resolve().parent.parent
 load_dotenv(root_path / '.env')
+warm_up_llms_in_background()
 
-def extract_article(url: str) -> Optional[Dict]:
+@st.cache_resource
+def get_article_cache() -> ArticleCache:
+    """Share one on-disk article cache across sessions and reruns."""
+    return ArticleCache(root_path / 'data/cache/articles.sqlite')
+
+def extract_article(url: str, variant_name: Optional[str] = None) -> List[str]:
     """
     Placeholder for your article extraction function.
     Replace this with your actual implementation.
+
+    The article text is returned as a list of section chunks. When
+    `variant_name` is given, only the passages mentioning the variant (plus
+    their context and the methods sections) are returned; the full text is
+    used if the variant is not found.
     """
-    extractor = PubMedExtractor()
-    article_data = extractor.get_article_content_plain_text(url)
-    return article_data
+    extractor = PubMedExtractor(cache=get_article_cache())
+    article_data = extractor.get_article_content(url)
+    if "error" in article_data:
+        return []
+    if variant_name:
+        passages = locate_variant_passages(article_data, variant_name)
+        if passages is not None:
+            return passages
+        st.info(f"{variant_name} is not mentioned in the article text, sending the full article.")
+    return list(extractor.iter_article_plain_text(article_data))
     
 
 def main():
@@ -34,25 +55,40 @@ def main():
         "Select LLM Model:",
         ["claude", "chatgpt", "kimi", "doubao"], placeholder="choose a LLM model"
     )
+    focus_on_variant = st.checkbox("Only send passages mentioning the variant", value=True)
+    chunked = st.checkbox("Split articles that exceed the model context into parallel chunks", value=True)
+    reroute = st.checkbox("Send articles that exceed the model context to a model with a larger one", value=False)
 
     if st.button("Submit"):
         # Show spinner while processing
         with st.spinner("Extracting article content..."):
-            article_content = extract_article(url)
+            article_content = extract_article(url, variant_name if focus_on_variant else None)
             
-        with st.spinner("Interact with AI..."):
-            intepretation = generate_acmg_intepretation(
-                model_alias, 
-                PUBMED_ACMG_READER_TEMPLATE, 
-                article_content,
-                #TEST_TEMPLATE,
-                #article_content[:500],
-                variant_name
-                )
-
         # Display article content in an expandable container
         with st.expander("Extracted Content", expanded=True):
-            st.write(f"{intepretation}")
+            started_at = time.perf_counter()
+            try:
+                # Chunked articles are read before the merged answer starts streaming.
+                with st.spinner("Interact with AI..."):
+                    tokens = generate_acmg_intepretation(
+                        model_alias, 
+                        PUBMED_ACMG_READER_TEMPLATE, 
+                        article_content,
+                        #TEST_TEMPLATE,
+                        #article_content[:500],
+                        variant_name,
+                        chunked=chunked,
+                        reroute=reroute,
+                        on_reroute=lambda requested, routed: st.info(
+                            f"The prompt is too large for {requested}, so {routed} answers instead."
+                        )
+                        )
+                stream = TimedStream(tokens, "Paper reader", started_at=started_at)
+                st.write_stream(stream)
+            except PromptTooLargeError as e:
+                st.error(f"{e} Splitting the article into chunks also avoids this.")
+                st.stop()
+            st.caption(stream.summary())
                 
 
 if __name__ == "__main__":
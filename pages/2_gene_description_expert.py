@@ -2,12 +2,19 @@ import streamlit as st
 from dotenv import load_dotenv
 from pathlib import Path
 
-from backend.omim_utils import query_omim, omim_xml_extract, omim_xml_to_phenotype_map, list_of_dicts_to_markdown_table
+from backend.omim_mirror import OmimMirror
+from backend.omim_utils import list_of_dicts_to_markdown_table
 from backend.prompts import GENE_EXPLAINATION_TEMPLATE
-from backend.llm_utils import generate_gene_description
+from backend.llm_utils import PromptTooLargeError, TimedStream, generate_gene_description, warm_up_llms_in_background
 
 root_path = Path(__file__).resolve().parent.parent
 load_dotenv(root_path / '.env')
+warm_up_llms_in_background()
+
+@st.cache_resource
+def get_omim_mirror():
+    """Local OMIM mirror shared by every session."""
+    return OmimMirror()
 
 def main():
     st.set_page_config(page_title="Gene Description Expert", page_icon="📈")
@@ -22,31 +29,32 @@ def main():
 
     if st.button("Submit"):
         with st.spinner("Extracting article content..."):
-            mg = query_omim(gene_omim_id, "text:molecularGenetics")
-            molecular_genetics = omim_xml_extract(mg, "textSectionContent")
+            molecular_genetics, phenotype_maps = get_omim_mirror().text_section_and_phenotype_map(
+                gene_omim_id, "molecularGenetics"
+            )
             if molecular_genetics is None:
-                st.error("No molecular genetics section is found for f{gene_omim_id}, please try a different OMIM ID.")
+                st.error(f"No molecular genetics section is found for {gene_omim_id}, please try a different OMIM ID.")
                 st.stop()
-            gene_map_raw = query_omim(gene_omim_id, "geneMap")
-            phenotype_maps = omim_xml_to_phenotype_map(gene_map_raw)
             phenotype_markdown_table = list_of_dicts_to_markdown_table(phenotype_maps)
         
-        with st.spinner("Interact with AI..."):
-            gene_description = generate_gene_description(
-                model_alias, 
-                GENE_EXPLAINATION_TEMPLATE,
-                phenotype_markdown_table,
-                molecular_genetics
-                )
-
         with st.expander("Extracted OMIM information", expanded=False):
             st.write(molecular_genetics)
             import pandas as pd
             st.write(pd.DataFrame(phenotype_maps).reset_index(drop=True))
 
         with st.expander("Gene Description by AI", expanded=True):
-            if gene_description:
-                st.write(f"{gene_description}")
+            stream = TimedStream(generate_gene_description(
+                model_alias, 
+                GENE_EXPLAINATION_TEMPLATE,
+                phenotype_markdown_table,
+                molecular_genetics
+                ), "Gene description")
+            try:
+                st.write_stream(stream)
+            except PromptTooLargeError as e:
+                st.error(str(e))
+                st.stop()
+            st.caption(stream.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,31 +1,29 @@
 import streamlit as st
 import requests
-import json
 from dotenv import load_dotenv
 from pathlib import Path
 
-from backend.llm_utils import generate_acmg_classification
-from backend.prompts import ACMG_CLASSIFIER_TEMPLATE, ACMG_CLASSIFIER_COMPLETE_TEMPLATE
+from backend.annotation_projection import consequence_class, inheritance_mode, serialize_annotation
+from backend.annotation_utils import get_annotation_client
+from backend.llm_utils import PromptTooLargeError, TimedStream, generate_acmg_classification, generate_fanout_comparison, warm_up_llms_in_background
+from backend.prompts import ACMG_CLASSIFIER_TEMPLATE, compose_acmg_classifier_template
 
 root_path = Path(__file__).resolve().parent.parent
 load_dotenv(root_path / '.env')
+warm_up_llms_in_background()
 
 def get_variant_annotation(genome_version, position):
-    """Query the annotation API."""
-    url = "http://localhost:5001/annotate"
-    payload = {
-        "genome_version": genome_version,
-        "position": position
-    }
-    
+    """Query the annotation API through the shared client."""
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return json.loads(response.json()["result"])
-    except requests.exceptions.RequestException as e:
+        return get_annotation_client().annotate(genome_version, position)
+    except (requests.exceptions.RequestException, ValueError) as e:
         st.error(f"Error querying annotation API: {str(e)}")
         return None
 
+def get_kavin_template(annotation_data):
+    """Complete ACMG template reduced to the criteria that can apply to the variant."""
+    return compose_acmg_classifier_template(consequence_class(annotation_data), inheritance_mode(annotation_data))
+
 def main():
     st.set_page_config(page_title="Variant Classification Expert", page_icon="🤖")
     st.title("Variant Classification Expert")
@@ -52,6 +50,11 @@ def main():
         placeholder="choose an agent"
     )
 
+    compare_models = st.multiselect(
+        "Compare models side by side (optional):",
+        ["claude", "chatgpt", "kimi", "doubao"]
+    )
+
     if st.button("Submit"):
         with st.spinner("Retrieving variant annotation..."):
             annotation_data = get_variant_annotation(genome_version, variant_position)
@@ -62,25 +65,41 @@ def main():
         with st.expander("Variant Annotation", expanded=False):
             st.json(annotation_data)
 
-        with st.spinner("Analyzing with AI..."):
+        if len(compare_models) > 1:
+            with st.spinner("Analyzing with several models..."):
+                generate_fanout_comparison(
+                    compare_models,
+                    ACMG_CLASSIFIER_TEMPLATE if prompt_type == "Ben" else get_kavin_template(annotation_data),
+                    {
+                        'annotation': serialize_annotation(annotation_data, "acmg"),
+                        'genetic_variant': variant_position
+                    }
+                )
+            st.stop()
+
+        with st.expander("ACMG Classification by AI", expanded=True):
+            st.markdown("### Final Classification")
             if prompt_type == "Ben":
-                acmg_interpretation = generate_acmg_classification(
+                tokens = generate_acmg_classification(
                     model_alias,
                     ACMG_CLASSIFIER_TEMPLATE,
-                    json.dumps(annotation_data, indent=2),
+                    serialize_annotation(annotation_data, "acmg"),
                     variant_position
                 )
             elif prompt_type == "Kavin":
-                acmg_interpretation = generate_acmg_classification(
+                tokens = generate_acmg_classification(
                     model_alias,
-                    ACMG_CLASSIFIER_COMPLETE_TEMPLATE,
-                    json.dumps(annotation_data, indent=2),
+                    get_kavin_template(annotation_data),
+                    serialize_annotation(annotation_data, "acmg"),
                     variant_position
                 )
-
-        with st.expander("ACMG Classification by AI", expanded=True):
-            st.markdown("### Final Classification")
-            st.markdown(acmg_interpretation)
+            stream = TimedStream(tokens, "Variant classification")
+            try:
+                acmg_interpretation = st.write_stream(stream)
+            except PromptTooLargeError as e:
+                st.error(str(e))
+                st.stop()
+            st.caption(stream.summary())
         #    if acmg_interpretation:
         #        st.write(acmg_interpretation)
 
@@ -1,31 +1,45 @@
 import streamlit as st
 import requests
-import json
 from dotenv import load_dotenv
 from pathlib import Path
 
-from backend.llm_utils import generate_pvs1_justification
+from backend.annotation_projection import compact_json, serialize_annotation
+from backend.annotation_utils import get_annotation_client
+from backend.annotation_db import open_annotation_store
+from backend.gene_metrics import open_gene_metric_table
+from backend.transcript_index import TranscriptIndex
+from backend.llm_utils import PromptTooLargeError, TimedStream, generate_pvs1_justification, generate_fanout_comparison, warm_up_llms_in_background
 from backend.prompts import PVS1_EXPERT_TEMPLATE
 
 root_path = Path(__file__).resolve().parent.parent
 load_dotenv(root_path / '.env')
+warm_up_llms_in_background()
 
 def get_variant_annotation(genome_version, position):
-    """Query the annotation API."""
-    url = "http://localhost:5001/annotate"
-    payload = {
-        "genome_version": genome_version,
-        "position": position
-    }
-    
+    """Query the annotation API through the shared client."""
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return json.loads(response.json()["result"])
-    except requests.exceptions.RequestException as e:
+        return get_annotation_client().annotate(genome_version, position)
+    except (requests.exceptions.RequestException, ValueError) as e:
         st.error(f"Error querying annotation API: {str(e)}")
         return None
 
+@st.cache_resource
+def get_annotation_stores():
+    """Gene and transcript stores shared by every session, compiled from the JSON files on first use."""
+    data_dir = root_path / 'data'
+    return open_annotation_store(data_dir, 'gene_db'), open_annotation_store(data_dir, 'transcript_db')
+
+@st.cache_resource
+def get_transcript_index():
+    """Interval index over transcript_db for position-based exon and NMD lookups."""
+    _, transcript_db = get_annotation_stores()
+    return TranscriptIndex.from_records(transcript_db.items())
+
+@st.cache_resource
+def get_gene_metric_table():
+    """Columnar constraint metrics of every gene in gene_db."""
+    return open_gene_metric_table(root_path / 'data')
+
 def main():
     st.set_page_config(page_title="Variant Classification Expert", page_icon="🤖")
     st.title("Variant Classification Expert")
@@ -46,12 +60,12 @@ def main():
         placeholder="choose a LLM model"
     )
 
-    gene_annotation_file = root_path / 'data/gene_db.json'
-    transcript_annotaton_file = root_path / 'data/transcript_db.json'
-    with open(gene_annotation_file, "r") as file:
-        gene_db = json.load(file)
-    with open(transcript_annotaton_file, "r") as file:
-        transcript_db = json.load(file)
+    compare_models = st.multiselect(
+        "Compare models side by side (optional):",
+        ["claude", "chatgpt", "kimi", "doubao"]
+    )
+
+    gene_db, transcript_db = get_annotation_stores()
 
     if st.button("Submit"):
         with st.spinner("Retrieving variant annotation..."):
@@ -62,36 +76,69 @@ def main():
 
         with st.spinner("Retrieving gene annotation..."):
             gene_annotation_data = {}
+            gene_id = None
             transcript_annotaton_data = {}
 
             for variant in annotation_data["transcript_consequences"]:
                 print(variant)
                 if "pick" in variant and variant["pick"] == 1:
-                    if "gene_id" in variant and variant["gene_id"] in gene_db:
-                        gene_annotation_data = gene_db[variant["gene_id"]]
+                    if "gene_id" in variant:
+                        gene_id = str(variant["gene_id"])
+                        gene_annotation_data = gene_db.get(gene_id, {})
                     if "transcript_id" in variant:
                         transcript_base = variant["transcript_id"].split(".")[0]
-                        if transcript_base in transcript_db:
-                            transcript_annotaton_data = transcript_db[transcript_base]
+                        transcript_annotaton_data = transcript_db.get(transcript_base, {})
 
         with st.expander("Variant Annotation", expanded=False):
             st.json(annotation_data)
             st.write(gene_annotation_data)
+            if gene_id:
+                metrics = get_gene_metric_table()
+                row = metrics.indices([gene_id])
+                if row[0] >= 0:
+                    st.write({
+                        "LoF mechanism (PVS1 precondition)": bool(metrics.pvs1_mask()[row][0]),
+                        "Missense constrained (PP2 precondition)": bool(metrics.pp2_mask()[row][0]),
+                        "Truncating mechanism (BP1 precondition)": bool(metrics.bp1_mask()[row][0]),
+                    })
             st.write(transcript_annotaton_data)
+            transcript_index = get_transcript_index()
+            if transcript_index.genome_version == genome_version:
+                st.write("Overlapping transcripts:")
+                st.dataframe(transcript_index.query(variant_position))
+            else:
+                st.warning(f"The transcript database holds {transcript_index.genome_version} coordinates, "
+                           f"so overlapping transcripts are not shown for {genome_version} positions.")
 
 
-        with st.spinner("Analyzing with AI..."):
-            acmg_interpretation = generate_pvs1_justification(
-                model_alias,
-                PVS1_EXPERT_TEMPLATE,
-                annotation_data,
-                gene_annotation_data,
-                transcript_annotaton_data
-            )
+        if len(compare_models) > 1:
+            with st.spinner("Analyzing with several models..."):
+                generate_fanout_comparison(
+                    compare_models,
+                    PVS1_EXPERT_TEMPLATE,
+                    {
+                        'variant_annotation': serialize_annotation(annotation_data, "pvs1"),
+                        'gene_annotation': compact_json(gene_annotation_data),
+                        'transcript_annotation': compact_json(transcript_annotaton_data),
+                    }
+                )
+            st.stop()
 
         with st.expander("ACMG Classification by AI", expanded=True):
             st.markdown("### Final Classification")
-            st.markdown(acmg_interpretation)
+            stream = TimedStream(generate_pvs1_justification(
+                model_alias,
+                PVS1_EXPERT_TEMPLATE,
+                serialize_annotation(annotation_data, "pvs1"),
+                compact_json(gene_annotation_data),
+                compact_json(transcript_annotaton_data)
+            ), "PVS1 expert")
+            try:
+                acmg_interpretation = st.write_stream(stream)
+            except PromptTooLargeError as e:
+                st.error(str(e))
+                st.stop()
+            st.caption(stream.summary())
         #    if acmg_interpretation:
         #        st.write(acmg_interpretation)
 
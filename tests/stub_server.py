@@ -0,0 +1,16 @@
+"""Local stand-in HTTP servers for the tests."""
+from http.server import BaseHTTPRequestHandler
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler for local stand-in servers; subclasses implement do_GET/do_POST."""
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,106 @@
+import json
+
+from backend.annotation_utils import AnnotationCache, AnnotationClient
+from stub_server import StubHandler
+
+
+def make_handler(batch=True):
+    calls = {"batch": [], "single": []}
+
+    class Handler(StubHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/annotate_batch":
+                if not batch:
+                    self.send_body(404, b"not found", "text/plain")
+                    return
+                calls["batch"].append(body["positions"])
+                results = {variant: {"variant": variant} for variant in body["positions"] if "-999-" not in variant}
+                self.send_body(200, json.dumps({"results": results}).encode())
+            elif self.path == "/annotate":
+                calls["single"].append(body["position"])
+                if "-999-" in body["position"]:
+                    self.send_body(500, b"server error", "text/plain")
+                else:
+                    # The single-variant endpoint returns the annotation as a JSON string.
+                    result = json.dumps({"variant": body["position"]})
+                    self.send_body(200, json.dumps({"result": result}).encode())
+
+    return Handler, calls
+
+
+def make_client(base, tmp_path, **kwargs):
+    return AnnotationClient(url=f"{base}/annotate", batch_url=f"{base}/annotate_batch", batch_size=2,
+                            cache=AnnotationCache(tmp_path / "annotations.sqlite"), **kwargs)
+
+
+def test_batch_endpoint(serve, tmp_path):
+    handler, calls = make_handler()
+    client = make_client(serve(handler), tmp_path)
+
+    results, errors = client.annotate_many("hg38", ["1-100-A-G", "chr1:200 c>t", "chr1-999-A-G", "bad"])
+
+    # The service gets the variants as they were typed.
+    assert results == {"1-100-A-G": {"variant": "1-100-A-G"}, "chr1:200 c>t": {"variant": "chr1:200 c>t"}}
+    assert set(errors) == {"chr1-999-A-G", "bad"}
+    # Batches of batch_size; a batch left with one variant uses the single-variant endpoint.
+    assert calls["batch"] == [["1-100-A-G", "chr1:200 c>t"]]
+    assert calls["single"] == ["chr1-999-A-G"]
+
+
+def test_falls_back_to_single_requests(serve, tmp_path):
+    handler, calls = make_handler(batch=False)
+    client = make_client(serve(handler), tmp_path)
+
+    results, errors = client.annotate_many("hg38", ["chr1-100-A-G", "chr1-200-C-T", "chr1-999-A-G"])
+
+    assert results == {"chr1-100-A-G": {"variant": "chr1-100-A-G"}, "chr1-200-C-T": {"variant": "chr1-200-C-T"}}
+    assert list(errors) == ["chr1-999-A-G"]
+    assert sorted(calls["single"]) == ["chr1-100-A-G", "chr1-200-C-T", "chr1-999-A-G"]
+    assert client.batch_url is None
+
+
+def test_spellings_of_one_variant_share_a_request(serve, tmp_path):
+    handler, calls = make_handler()
+    client = make_client(serve(handler), tmp_path)
+
+    results, errors = client.annotate_many("hg38", ["chr1-100-A-G", "1:100 a>g"])
+
+    assert not errors
+    assert results == {"chr1-100-A-G": {"variant": "chr1-100-A-G"}, "1:100 a>g": {"variant": "chr1-100-A-G"}}
+    assert calls["single"] == ["chr1-100-A-G"] and calls["batch"] == []
+
+    # The normalised form is the cache key, so another spelling is a cache hit.
+    assert make_client(serve(handler), tmp_path).annotate("hg38", "CHR1_100_A_G") == {"variant": "chr1-100-A-G"}
+    assert calls["single"] == ["chr1-100-A-G"]
+
+
+def test_cache_hits(serve, tmp_path):
+    handler, calls = make_handler()
+    base = serve(handler)
+    variants = ["chr1-100-A-G", "chr1-200-C-T"]
+
+    client = make_client(base, tmp_path)
+    first, _ = client.annotate_many("hg38", variants)
+    # Served from memory by the same client.
+    assert client.annotate_many("hg38", variants)[0] == first
+    assert len(calls["batch"]) == 1
+
+    # Served from the on-disk cache by a new client; another genome version is not.
+    fresh = make_client(base, tmp_path)
+    assert fresh.annotate_many("hg38", variants)[0] == first
+    assert len(calls["batch"]) == 1
+    fresh.annotate_many("hg19", variants)
+    assert len(calls["batch"]) == 2
+
+
+def test_expired_cache_entries_are_refetched(serve, tmp_path):
+    handler, calls = make_handler()
+    base = serve(handler)
+    make_client(base, tmp_path).annotate("hg38", "chr1-100-A-G")
+
+    client = AnnotationClient(url=f"{base}/annotate", batch_url=f"{base}/annotate_batch",
+                              cache=AnnotationCache(tmp_path / "annotations.sqlite", max_age_seconds=-1))
+    assert client.annotate("hg38", "chr1-100-A-G") == {"variant": "chr1-100-A-G"}
+    # A single variant goes to the single-variant endpoint, and the expired entry is fetched again.
+    assert calls["single"] == ["chr1-100-A-G", "chr1-100-A-G"]
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from backend.article_parser import parse_article_html
+from backend.publication_extractor import PubMedExtractor
+
+# A trimmed page in the layout of pmc.ncbi.nlm.nih.gov article pages, with made-up content.
+PAGE = Path(__file__).parent / "data" / "PMC0000001.html"
+
+
+@pytest.mark.parametrize("features", ["html.parser", "lxml"])
+def test_single_pass_parser_matches_legacy(features):
+    if features == "lxml":
+        pytest.importorskip("lxml")
+    html = PAGE.read_text(encoding="utf-8")
+    expected = PubMedExtractor().parse_html_legacy(html, "PMC0000001")
+
+    assert parse_article_html(html, "PMC0000001", features) == expected
+
+
+def test_fixture_covers_every_field():
+    article_data = PubMedExtractor().parse_html_legacy(PAGE.read_text(encoding="utf-8"), "PMC0000001")
+    assert article_data["pmid"] == "29700001"
+    assert len(article_data["sections"]) == 6
+    assert article_data["tables"] and article_data["figures"] and article_data["references"]
+    assert article_data["keywords"] and article_data["abstract"] and article_data["acknowledgments"]
@@ -0,0 +1,71 @@
+import json
+
+from backend.batch_classifier import ResultWriter, read_variants
+
+
+def record(variant, status="ok"):
+    return {"genome_version": "hg38", "variant": variant, "model": "claude", "template": "Ben",
+            "status": status, "classification": "", "response": "", "error": ""}
+
+
+def test_resume_after_a_truncated_last_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    lines = [json.dumps(record("chr1-10-A-G")), json.dumps(record("chr1-20-C-T"))]
+    output.write_text(lines[0] + "\n" + lines[1][:25])
+
+    writer = ResultWriter(output)
+    assert writer.completed() == {("hg38", "chr1-10-A-G", "claude", "Ben")}
+    writer.write(record("chr1-20-C-T"))
+    writer.close()
+
+    assert [json.loads(line)["variant"] for line in output.read_text().splitlines()] == ["chr1-10-A-G", "chr1-20-C-T"]
+
+
+def test_complete_last_line_without_newline_is_kept(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(json.dumps(record("chr1-10-A-G")))
+
+    writer = ResultWriter(output)
+    writer.write(record("chr1-20-C-T", status="error"))
+    writer.close()
+
+    assert len(output.read_text().splitlines()) == 2
+    assert ResultWriter(output).completed() == {("hg38", "chr1-10-A-G", "claude", "Ben")}
+
+
+def test_resume_after_a_truncated_tsv_row(tmp_path):
+    output = tmp_path / "results.tsv"
+    writer = ResultWriter(output)
+    writer.write(record("chr1-10-A-G"))
+    writer.close()
+    complete = output.read_text()
+    for partial in ("hg38\tchr1-20-C-T\tclaude\tBen\tok\t", 'hg38\tchr1-20-C-T\tclaude\tBen\tok\tbenign\t"line one\r\nline'):
+        output.write_text(complete + partial, newline="")
+
+        writer = ResultWriter(output)
+        assert output.read_text() == complete
+        assert writer.completed() == {("hg38", "chr1-10-A-G", "claude", "Ben")}
+        writer.write(record("chr1-20-C-T"))
+        writer.close()
+
+        assert ResultWriter(output).completed() == {("hg38", "chr1-10-A-G", "claude", "Ben"),
+                                                   ("hg38", "chr1-20-C-T", "claude", "Ben")}
+        output.write_text(complete, newline="")
+
+
+def test_multiline_tsv_response_is_kept(tmp_path):
+    output = tmp_path / "results.tsv"
+    writer = ResultWriter(output)
+    writer.write(dict(record("chr1-10-A-G"), response="line one\nline two"))
+    writer.close()
+    before = output.read_text()
+
+    ResultWriter(output).close()
+    assert output.read_text() == before
+
+
+def test_malformed_rows_are_passed_on_as_they_are(tmp_path):
+    variants = tmp_path / "variants.tsv"
+    variants.write_text("variant\nchr1-10-A-G\nchr1-20-C\n1:30:G:T\n")
+
+    assert read_variants(variants) == ["chr1-10-A-G", "chr1-20-C", "chr1-30-G-T"]
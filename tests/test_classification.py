@@ -0,0 +1,53 @@
+from backend.llm_utils import extract_classification, summarize_consensus
+
+KAVIN_ANSWER = """NM_000784.4:c.410G>A
+
+**scratchpad**
+PM2 met, PP3 met.
+
+**classification**
+Likely pathogenic
+
+**justification**
+Two moderate and one supporting criterion; benign evidence absent.
+"""
+
+BEN_ANSWER = """## Variant Summary
+- Gene: CYP27A1, missense
+- Clinical significance from databases: pathogenic (ClinVar)
+
+## Relevant ACMG Criteria
+- PM2: absent from gnomAD
+- PP3: REVEL 0.93
+
+## Preliminary Classification
+Based on the available evidence the variant is a **Variant of Uncertain Significance (VUS)**,
+which could become likely pathogenic with segregation data.
+"""
+
+BEN_INLINE_ANSWER = """1. Summary: a synonymous change.
+2. Criteria: BP4, BP7.
+3. Preliminary classification: Likely benign.
+"""
+
+
+def test_marker_answers():
+    assert extract_classification(KAVIN_ANSWER) == "likely pathogenic"
+    assert extract_classification("**pvs1_assessment**\nPVS1_Strong\n") == "PVS1_Strong"
+
+
+def test_ben_answers_use_the_last_classification_section():
+    assert extract_classification(BEN_ANSWER) == "variant of uncertain significance"
+    assert extract_classification(BEN_INLINE_ANSWER) == "likely benign"
+
+
+def test_unreadable_answers_are_not_disagreement():
+    consensus = summarize_consensus({
+        "claude": BEN_ANSWER,
+        "chatgpt": BEN_ANSWER,
+        "doubao": "Error: timed out",
+    })
+
+    assert consensus["consensus"] == "variant of uncertain significance"
+    assert consensus["agreement"] == "2/2"
+    assert consensus["unparsed"] == ["doubao"]
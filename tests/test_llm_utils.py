@@ -0,0 +1,103 @@
+import time
+from typing import List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+
+from backend import llm_utils
+from backend.llm_cache import LLMResponseCache
+from backend.token_estimator import TokenCalibration, TokenEstimator
+
+
+@pytest.fixture
+def small_doubao(monkeypatch):
+    """doubao with a context of 3000 tokens, kimi with the usual one, no API keys needed."""
+    monkeypatch.setattr(llm_utils, "_model_id", lambda llm_alias: llm_alias)
+    monkeypatch.setattr(llm_utils, "_token_estimator", TokenEstimator())
+    monkeypatch.setitem(llm_utils.MODEL_LIMITS, "doubao", {"context_tokens": 3000, "output_tokens": 1000})
+    return ChatPromptTemplate.from_template("Read this: {text}")
+
+
+def test_preflight_rejects_oversized_prompts_by_default(small_doubao):
+    inputs = {"text": "word " * 5000}
+    with pytest.raises(llm_utils.PromptTooLargeError):
+        llm_utils.preflight("doubao", small_doubao, inputs)
+
+    routed_alias, _, _ = llm_utils.preflight("doubao", small_doubao, inputs, reroute=True)
+    assert routed_alias == "kimi"
+
+
+def test_preflight_keeps_prompts_that_fit(small_doubao):
+    assert llm_utils.preflight("doubao", small_doubao, {"text": "short"})[0] == "doubao"
+
+
+class UsageReportingModel(BaseChatModel):
+    """Streams one token per chunk, reporting usage on the last one like the OpenAI API does."""
+    tokens: List[str]
+    delay: float = 0.0
+    pulled: int = 0
+
+    @property
+    def _llm_type(self):
+        return "usage-reporting"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, token in enumerate(self.tokens):
+            time.sleep(self.delay)
+            self.pulled += 1
+            usage = {"input_tokens": 42, "output_tokens": len(self.tokens), "total_tokens": 42 + len(self.tokens)}
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=token, usage_metadata=usage if index == len(self.tokens) - 1 else None
+            ))
+
+
+@pytest.fixture
+def fake_doubao(monkeypatch, tmp_path):
+    """Route doubao to a UsageReportingModel, with a temporary response cache and calibration."""
+    def use(model):
+        prompt = ChatPromptTemplate.from_template("{question}")
+        monkeypatch.setattr(llm_utils, "get_chain", lambda llm_alias, template: (prompt, prompt | model))
+        monkeypatch.setattr(llm_utils, "_model_id", lambda llm_alias: llm_alias)
+        calibration = TokenCalibration(tmp_path / "calibration.sqlite")
+        monkeypatch.setattr(llm_utils, "_token_estimator", TokenEstimator(calibration=calibration))
+        cache = LLMResponseCache(tmp_path / "responses.sqlite")
+        monkeypatch.delenv("LLM_CACHE_DISABLED", raising=False)
+        monkeypatch.setattr(llm_utils, "_response_cache", cache)
+        return cache, calibration
+
+    return use
+
+
+def test_ark_models_stream_usage(monkeypatch):
+    monkeypatch.setenv("ARK_API_KEY", "test")
+    for llm_alias in ("doubao", "kimi"):
+        assert llm_utils._build_llm(llm_alias)._should_stream_usage()
+
+
+def test_stream_caches_and_calibrates_from_streamed_usage(fake_doubao):
+    model = UsageReportingModel(tokens=["The ", "answer", "."])
+    cache, calibration = fake_doubao(model)
+
+    assert list(llm_utils.stream_prompt("doubao", "{question}", {"question": "Why?"})) == ["The ", "answer", "."]
+    assert len(cache) == 1
+    assert calibration.samples("doubao")[1].tolist() == [42]
+
+    assert list(llm_utils.stream_prompt("doubao", "{question}", {"question": "Why?"})) == ["The answer."]
+    assert model.pulled == 3
+
+
+def test_stopping_early_abandons_the_request(fake_doubao):
+    model = UsageReportingModel(tokens=["token "] * 20, delay=0.02)
+    cache, calibration = fake_doubao(model)
+
+    for token in llm_utils.stream_prompt("doubao", "{question}", {"question": "Why?"}):
+        break
+    time.sleep(0.6)  # long enough for all 20 tokens had the request gone on
+    assert model.pulled < 10
+    assert len(cache) == 0
@@ -0,0 +1,56 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+from backend.omim_mirror import OmimMirror
+from backend.omim_utils import OmimClient
+from stub_server import StubHandler
+
+ENTRY_XML = (
+    "<omim><entryList><entry><mimNumber>{mim}</mimNumber>"
+    "<textSectionList><textSection><textSectionName>molecularGenetics</textSectionName>"
+    "<textSectionTitle>Molecular Genetics</textSectionTitle>"
+    "<textSectionContent>Variants of {mim}.</textSectionContent></textSection></textSectionList>"
+    "<geneMap><phenotypeMapList><phenotypeMap><mimNumber>{mim}</mimNumber><phenotype>Disease</phenotype>"
+    "<phenotypeMimNumber>600001</phenotypeMimNumber><phenotypeMappingKey>3</phenotypeMappingKey>"
+    "<phenotypeInheritance>Autosomal dominant</phenotypeInheritance></phenotypeMap></phenotypeMapList></geneMap>"
+    "</entry></entryList></omim>"
+)
+
+
+def make_handler():
+    requests = []
+
+    class Handler(StubHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            requests.append(query["include"][0])
+            self.send_body(200, ENTRY_XML.format(mim=query["mimNumber"][0]).encode(), "application/xml")
+
+    return Handler, requests
+
+
+def test_mirror_miss_costs_one_request(serve, tmp_path):
+    handler, requests = make_handler()
+    client = OmimClient(url=serve(handler) + "/api/entry")
+    mirror = OmimMirror(tmp_path / "mirror.sqlite")
+
+    content, phenotype_maps = mirror.text_section_and_phenotype_map("100100", "molecularGenetics", client)
+
+    assert content == "Variants of 100100."
+    assert [p["phenotype"] for p in phenotype_maps] == ["Disease"]
+    assert requests == ["geneMap,text:molecularGenetics"]
+
+
+def test_stored_text_section_expires(serve, tmp_path):
+    handler, requests = make_handler()
+    client = OmimClient(url=serve(handler) + "/api/entry")
+    mirror = OmimMirror(tmp_path / "mirror.sqlite")
+
+    assert mirror.text_section("100100", "molecularGenetics", client) == "Variants of 100100."
+    assert mirror.text_section("100100", "molecularGenetics", client) == "Variants of 100100."
+    assert len(requests) == 1
+
+    mirror.text_ttl_seconds = 0
+    time.sleep(0.01)
+    mirror.text_section("100100", "molecularGenetics", client)
+    assert len(requests) == 2
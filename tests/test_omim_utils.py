@@ -0,0 +1,92 @@
+import json
+import tracemalloc
+
+import pytest
+
+from backend import omim_utils
+from backend.omim_utils import OmimResponse
+
+XML = (
+    "<omim><entryList>"
+    + "".join(
+        f"<entry><mimNumber>{mim}</mimNumber><textSectionList><textSection>"
+        f"<textSectionName>molecularGenetics</textSectionName><textSectionTitle>MG</textSectionTitle>"
+        f"<textSectionContent>Text {mim}</textSectionContent></textSection></textSectionList>"
+        f"<geneMap><phenotypeMapList><phenotypeMap><mimNumber>{mim}</mimNumber><phenotype>P{mim}</phenotype>"
+        f"</phenotypeMap></phenotypeMapList></geneMap></entry>"
+        for mim in ("100100", "100200")
+    )
+    + "</entryList></omim>"
+).encode()
+
+JSON = json.dumps({"omim": {"entryList": [
+    {"entry": {"mimNumber": 100100,
+               "textSectionList": [{"textSection": {"textSectionName": "molecularGenetics",
+                                                    "textSectionContent": "Text 100100"}}],
+               "geneMap": {"phenotypeMapList": [{"phenotypeMap": {"phenotype": "P100100"}}]}}},
+]}}).encode()
+
+
+def count_parses(monkeypatch):
+    calls = []
+    for name in ("_iter_xml_entries", "_iter_json_entries"):
+        original = getattr(omim_utils, name)
+
+        def counted(data, original=original):
+            calls.append(1)
+            return original(data)
+
+        monkeypatch.setattr(omim_utils, name, counted)
+    return calls
+
+
+def test_text_section_and_phenotype_map_parse_once(monkeypatch):
+    calls = count_parses(monkeypatch)
+    for data in (XML, JSON):
+        response = OmimResponse(data)
+        assert response.text_section("molecularGenetics") == "Text 100100"
+        assert response.phenotype_map()[0]["phenotype"] == "P100100"
+        assert response.text_section() == "Text 100100"
+        assert response.text_section("clinicalFeatures") is None
+    assert len(calls) == 2
+
+
+def test_entries_are_streamed_in_order():
+    response = OmimResponse(XML)
+    assert next(response.iter_entries())["mimNumber"] == "100100"
+    assert [entry["mimNumber"] for entry in response.iter_entries()] == ["100100", "100200"]
+    assert [p["phenotype"] for p in response.phenotype_map()] == ["P100100", "P100200"]
+
+
+@pytest.mark.parametrize("format", ["xml", "json"])
+def test_memory_stays_flat_for_large_responses(format):
+    text = "x" * 2000
+    if format == "xml":
+        data = ("<omim><entryList>" + "".join(
+            f"<entry><mimNumber>{mim}</mimNumber><textSectionList><textSection>"
+            f"<textSectionName>molecularGenetics</textSectionName><textSectionContent>{text}{mim}"
+            f"</textSectionContent></textSection></textSectionList></entry>"
+            for mim in range(100000, 101000)
+        ) + "</entryList></omim>").encode()
+    else:
+        data = json.dumps({"omim": {"entryList": [
+            {"entry": {"mimNumber": mim, "textSectionList": [
+                {"textSection": {"textSectionName": "molecularGenetics", "textSectionContent": f"{text}{mim}"}}
+            ]}} for mim in range(100000, 101000)
+        ]}}).encode()
+    response = OmimResponse(data)
+
+    tracemalloc.start()
+    try:
+        content = response.text_section("molecularGenetics")
+        response.phenotype_map()
+        _, peak = tracemalloc.get_traced_memory()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert content == f"{text}100000"
+    # Only the first section is kept; decoding JSON whole still costs a peak near the document size.
+    assert retained < len(data) / 20
+    if format == "xml":
+        assert peak < len(data) / 4
@@ -0,0 +1,40 @@
+import pytest
+
+from backend.prompts import (
+    ACMG_CLASSIFIER_COMPLETE_TEMPLATE,
+    ACMG_CRITERIA_NOT_APPLICABLE,
+    PROMPT_CACHE_MIN_TOKENS,
+    PROMPT_PARTS,
+    PUBMED_ACMG_READER_TEMPLATE,
+    compose_acmg_classifier_template,
+)
+
+
+def test_registered_prefixes_are_long_enough_to_be_cached():
+    assert PUBMED_ACMG_READER_TEMPLATE in PROMPT_PARTS
+    for system, _ in PROMPT_PARTS.values():
+        # English prose runs at about four characters per token; 4.5 keeps a margin.
+        assert len(system) / 4.5 >= PROMPT_CACHE_MIN_TOKENS
+
+
+@pytest.mark.parametrize("inheritance", [None, "dominant"])
+@pytest.mark.parametrize("consequence_class", list(ACMG_CRITERIA_NOT_APPLICABLE))
+def test_composed_template_is_never_longer_than_the_full_one(consequence_class, inheritance):
+    template = compose_acmg_classifier_template(consequence_class, inheritance)
+
+    assert len(template) <= len(ACMG_CLASSIFIER_COMPLETE_TEMPLATE)
+    assert len(PROMPT_PARTS[template][0]) / 4.5 >= PROMPT_CACHE_MIN_TOKENS
+
+
+def test_other_with_a_dominant_gene_falls_back_to_the_full_template():
+    assert compose_acmg_classifier_template("other", "dominant") is ACMG_CLASSIFIER_COMPLETE_TEMPLATE
+
+
+def test_synonymous_skips_most_strong_criteria():
+    template = compose_acmg_classifier_template("synonymous")
+
+    for code in ("PVS1", "PS1", "PS2", "PS4"):
+        assert f"| {code} |" not in template
+    assert "| PS3 |" in template
+    assert "| BS1 |" in template
+    assert "<PVS1_decision_tree>" not in template
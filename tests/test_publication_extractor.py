@@ -0,0 +1,72 @@
+import threading
+import time
+
+from backend.publication_extractor import PubMedExtractor
+from stub_server import StubHandler
+
+ARTICLE_HTML = (
+    "<html><body><hgroup>{pmcid}</hgroup>"
+    "<section id='sec1'><h2 class='pmc_sec_title'>Results</h2><p>Text of {pmcid}.</p></section>"
+    "</body></html>"
+)
+
+
+def make_handler(delay=0.0, failing=()):
+    state = {"active": 0, "max_active": 0, "starts": []}
+    lock = threading.Lock()
+
+    class Handler(StubHandler):
+        def do_GET(self):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+                state["starts"].append(time.monotonic())
+            try:
+                time.sleep(delay)
+                pmcid = self.path.strip("/").split("/")[-1]
+                if pmcid in failing:
+                    self.send_body(500, b"server error", "text/plain")
+                else:
+                    self.send_body(200, ARTICLE_HTML.format(pmcid=pmcid).encode(), "text/html")
+            finally:
+                with lock:
+                    state["active"] -= 1
+
+    return Handler, state
+
+
+def test_get_articles_limits_concurrency(serve):
+    handler, state = make_handler(delay=0.2)
+    base = serve(handler)
+    urls = [f"{base}/articles/PMC{i}/" for i in range(6)]
+
+    results = PubMedExtractor().fetch_articles(urls, max_concurrency=2, requests_per_second=0)
+
+    assert set(results) == set(urls)
+    assert all(article["title"] == url.split("/")[-2] for url, article in results.items())
+    assert state["max_active"] == 2
+
+
+def test_get_articles_spaces_requests_per_host(serve):
+    handler, state = make_handler()
+    base = serve(handler)
+    urls = [f"{base}/articles/PMC{i}/" for i in range(5)]
+
+    PubMedExtractor().fetch_articles(urls, max_concurrency=5, requests_per_second=10)
+
+    starts = sorted(state["starts"])
+    assert len(starts) == 5
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    assert min(gaps) >= 0.08
+
+
+def test_get_articles_reports_errors_per_article(serve):
+    handler, _ = make_handler(failing={"PMC2"})
+    base = serve(handler)
+    urls = [f"{base}/articles/PMC1/", f"{base}/articles/PMC2/", f"{base}/articles/none/"]
+
+    results = PubMedExtractor().fetch_articles(urls, requests_per_second=0)
+
+    assert results[urls[0]]["sections"] == [{"title": "Results", "content": "Text of PMC1."}]
+    assert results[urls[1]]["error"].startswith("Failed to retrieve article")
+    assert results[urls[2]] == {"error": "Invalid PMC URL"}
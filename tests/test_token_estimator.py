@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+from backend.token_estimator import TokenEstimator
+
+
+@pytest.mark.parametrize("value", [{"a": "b"}, ["a"], {"gene": "BRCA1", "exons": [1, 2, 3]}, []])
+def test_dicts_and_lists_are_estimated_as_json(value):
+    estimator = TokenEstimator()
+    as_json = json.dumps(value, ensure_ascii=False)
+
+    assert estimator.estimate_tokens(value) == estimator.estimate_tokens(as_json, language="json")
+    # The vectorised estimate may round differently from the legacy one.
+    assert abs(estimator.estimate_tokens(value) - estimator.estimate_tokens_legacy(value)) <= 2
+
+
+def test_batch_mixes_text_and_json():
+    estimator = TokenEstimator()
+    texts = ["plain English text", {"a": "b"}, ["a", "b"]]
+
+    assert estimator.estimate_batch(texts).tolist() == [estimator.estimate_tokens(text) for text in texts]
@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+from backend.transcript_index import TranscriptIndex
+
+RECORDS = [
+    ("NM_EXONS", {"chrom": "chr1", "start": 100, "end": 400, "strand": "+",
+                  "exons": [[100, 150], [200, 250], [350, 400]], "cds_start": 120, "cds_end": 380}),
+    ("NM_NO_EXONS", {"chrom": "chr1", "start": 100, "end": 400, "strand": "+", "cds_start": 120, "cds_end": 380}),
+]
+
+
+def rows_by_transcript(position):
+    index = TranscriptIndex.from_records(RECORDS)
+    return {row["transcript_id"]: row for row in index.query(f"chr1-{position}")}
+
+
+def test_exons_are_numbered_from_coordinates():
+    rows = rows_by_transcript(220)
+    assert rows["NM_EXONS"]["exon"] == 2 and rows["NM_EXONS"]["intron"] is None
+    assert rows_by_transcript(300)["NM_EXONS"]["intron"] == 2
+
+
+def test_transcript_without_exons_reports_unknown_exon():
+    for position in (120, 220, 300):
+        row = rows_by_transcript(position)["NM_NO_EXONS"]
+        assert row["exon"] is None and row["intron"] is None
+        assert row["nmd_distance"] is None and row["cds_position"] is None
+
+    index = TranscriptIndex.from_records(RECORDS)
+    result = index.lookup("chr1", [220])
+    unknown = result["transcript_id"] == "NM_NO_EXONS"
+    assert result["exon"][unknown].tolist() == [-1]
+    assert math.isnan(result["cds_position"][unknown][0])
+
+
+@pytest.mark.parametrize("variant", ["chr1-220-A-G", "1:220 a>g", "chr1_220_A_G", "chr1:220", "1-220"])
+def test_query_reads_variants_like_the_annotation_client(variant):
+    index = TranscriptIndex.from_records(RECORDS)
+    assert {row["transcript_id"] for row in index.query(variant)} == {"NM_EXONS", "NM_NO_EXONS"}
+
+
+def test_query_rejects_malformed_variants():
+    with pytest.raises(ValueError):
+        TranscriptIndex.from_records(RECORDS).query("chr1 somewhere")
+
+
+def test_index_records_its_genome_version():
+    assert TranscriptIndex.from_records(RECORDS, genome_version="hg19").genome_version == "hg19"
@@ -0,0 +1,57 @@
+import pytest
+
+from backend.variant_locator import VariantLocator
+
+
+@pytest.mark.parametrize("gene", ["G6PD", "A2M", "C1S", "E2F1"])
+def test_gene_symbol_is_not_read_as_a_protein_change(gene):
+    locator = VariantLocator(f"{gene} c.563C>T")
+
+    assert not locator.mentions(f"{gene} deficiency is common")
+    # The codon fallback of the c. change (codon 188) is kept.
+    assert locator.mentions("carriers of p.Ser188Phe")
+    assert locator.mentions("the 563C>T substitution")
+
+
+def test_protein_change_replaces_the_codon_fallback():
+    locator = VariantLocator("G6PD c.563C>T p.Ser188Phe")
+
+    assert locator.mentions("S188F was found")
+    assert locator.mentions("p.Ser188Phe")
+    assert not locator.mentions("p.Ser188Tyr")
+
+
+def test_one_letter_change_with_prefix():
+    locator = VariantLocator("CYP27A1 p.R137Q")
+
+    assert locator.mentions("homozygous for R137Q")
+    assert locator.mentions("p.Arg137Gln")
+    assert not locator.mentions("CYP27A1 deficiency")
+
+
+@pytest.mark.parametrize("variant", ["p.Arg137GlyfsTer5", "p.R137Gfs*5", "p.Arg137fs"])
+def test_frameshift_is_not_read_as_missense(variant):
+    locator = VariantLocator(f"CYP27A1 {variant}")
+
+    assert locator.mentions("the frameshift p.Arg137GlyfsTer5")
+    assert locator.mentions("R137Gfs*5 carriers")
+    assert locator.mentions("Arg137fs")
+    assert not locator.mentions("the missense p.Arg137Gly")
+    assert not locator.mentions("R137G was benign")
+
+
+def test_missense_does_not_match_a_frameshift():
+    locator = VariantLocator("CYP27A1 p.Arg137Gly")
+
+    assert locator.mentions("the missense p.Arg137Gly")
+    assert not locator.mentions("the frameshift p.Arg137GlyfsTer5")
+    assert not locator.mentions("R137Gfs*5 carriers")
+
+
+@pytest.mark.parametrize("variant", ["p.Arg137*", "p.Arg137Ter", "p.Arg137X", "p.R137*", "p.R137X"])
+def test_stop_notations_are_equivalent(variant):
+    locator = VariantLocator(f"CYP27A1 {variant}")
+
+    for text in ("p.Arg137*", "p.Arg137Ter", "Arg137X", "R137X", "R137*"):
+        assert locator.mentions(text), text
+    assert not locator.mentions("p.Arg137Gln")